@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Class
+from .constants import JoinCodePools
+from .helpers import ClassCodeCache
+from .models import Class, JoinCode
+from students.enrollments import enrollment_cache
 
 
 @admin.register(Class)
@@ -30,7 +33,12 @@ class ClassAdmin(admin.ModelAdmin):
     
     def deactivate_classes(self, request, queryset):
         """Admin action to deactivate selected classes."""
+        active = list(queryset.filter(active=True).values_list('id', 'code'))
         updated = queryset.update(active=False)
+        # Bulk updates skip Class.save, so return the codes to the pool here
+        JoinCode.release(JoinCodePools.CLASS, *[code for _id, code in active])
+        enrollment_cache.forget_class(*[class_id for class_id, _code in active])
+        ClassCodeCache.forget(*[code for _id, code in active])
         self.message_user(
             request,
             f'{updated} class(es) were successfully deactivated.'
@@ -0,0 +1,33 @@
+"""
+Constants and configuration for classes and join codes.
+Values here are defaults; override them through settings.JOIN_CODES.
+"""
+from django.conf import settings
+
+
+# Join code pools; classes and quick polls draw from separate code spaces
+class JoinCodePools:
+    CLASS = 'class'
+    POLL = 'poll'
+
+    CHOICES = [
+        (CLASS, 'Class'),
+        (POLL, 'Quick poll'),
+    ]
+
+
+# Defaults for settings.JOIN_CODES
+class JoinCodeDefaults:
+    MIN_LENGTH = 4                    # digits of the first code space seeded
+    MAX_LENGTH = 6                    # widest code the models can store
+    COOLDOWN_SECONDS = 24 * 60 * 60   # before a released code is handed out again
+    CLAIM_ATTEMPTS = 5                # retries when a claimed code is already held
+    LOOKUP_CACHE_SECONDS = 30         # code -> active class entries used by joins
+
+
+def join_code_setting(name):
+    """Read a join code setting, falling back to JoinCodeDefaults."""
+    overrides = getattr(settings, 'JOIN_CODES', {})
+    if name in overrides:
+        return overrides[name]
+    return getattr(JoinCodeDefaults, name)
@@ -0,0 +1,41 @@
+"""
+Helper functions and utilities for class operations.
+"""
+from django.core.cache import cache
+from django.db.models import F
+
+from .constants import join_code_setting
+from .models import Class
+
+
+class ClassCodeCache:
+    """
+    Active classes by join code, for the student join path.
+
+    Only hits are cached, so a class that just claimed a recycled code is
+    found on its first join. Entries are dropped when the class ends or is
+    deleted; LOOKUP_CACHE_SECONDS bounds anything missed (e.g. a course
+    renamed while its class is live).
+    """
+
+    @staticmethod
+    def key(code):
+        return f"classes:code:{code}"
+
+    @staticmethod
+    def get(code):
+        """{"id", "code", "course_name"} of the active class holding the code, or None."""
+        entry = cache.get(ClassCodeCache.key(code))
+        if entry is not None:
+            return entry
+
+        entry = Class.objects.filter(code=code, active=True).values(
+            "id", "code", course_name=F("course__name")
+        ).first()
+        if entry is not None:
+            cache.set(ClassCodeCache.key(code), entry, join_code_setting('LOOKUP_CACHE_SECONDS'))
+        return entry
+
+    @staticmethod
+    def forget(*codes):
+        cache.delete_many([ClassCodeCache.key(code) for code in codes])
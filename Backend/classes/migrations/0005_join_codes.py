@@ -0,0 +1,92 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:17
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import random
+
+from classes.constants import join_code_setting
+
+
+def seed_pool(JoinCode, pool, in_use, released):
+    """
+    Shuffle every 4-digit code into the pool. Live codes are marked as used;
+    codes of ended sessions cool down first, as JoinCode.release does, so an
+    old code cannot lead straight into a new session. Also used by the quick
+    polls migration that seeds the poll pool.
+    """
+    in_use = set(in_use)
+    released = set(released) - in_use
+    available_at = timezone.now() + timedelta(seconds=join_code_setting('COOLDOWN_SECONDS'))
+    positions = random.sample(range(9000), 9000)
+    JoinCode.objects.bulk_create(
+        (
+            JoinCode(
+                pool=pool,
+                code=str(1000 + i),
+                position=10 ** 4 + position,
+                in_use=str(1000 + i) in in_use,
+                available_at=available_at if str(1000 + i) in released else None,
+            )
+            for i, position in enumerate(positions)
+        ),
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+
+
+def seed_class_codes(apps, schema_editor):
+    Class = apps.get_model('classes', 'Class')
+    JoinCode = apps.get_model('classes', 'JoinCode')
+    seed_pool(
+        JoinCode, 'class',
+        in_use=Class.objects.filter(active=True).values_list('code', flat=True),
+        released=Class.objects.filter(active=False).values_list('code', flat=True),
+    )
+
+
+def clear_class_codes(apps, schema_editor):
+    apps.get_model('classes', 'JoinCode').objects.filter(pool='class').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0004_class_unique_active_class_per_teacher_course'),
+        ('courses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JoinCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pool', models.CharField(choices=[('class', 'Class'), ('poll', 'Quick poll')], max_length=10)),
+                ('code', models.CharField(max_length=6)),
+                ('position', models.PositiveIntegerField()),
+                ('in_use', models.BooleanField(default=False)),
+                ('available_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='class',
+            name='code',
+            field=models.CharField(db_index=True, editable=False, max_length=6),
+        ),
+        migrations.AddConstraint(
+            model_name='class',
+            constraint=models.UniqueConstraint(condition=models.Q(('active', True)), fields=('code',), name='unique_active_class_code'),
+        ),
+        migrations.AddIndex(
+            model_name='joincode',
+            index=models.Index(fields=['pool', 'in_use', 'position'], name='join_code_free_list'),
+        ),
+        migrations.AddConstraint(
+            model_name='joincode',
+            constraint=models.UniqueConstraint(fields=('pool', 'code'), name='unique_join_code_per_pool'),
+        ),
+        migrations.RunPython(seed_class_codes, clear_class_codes),
+    ]
@@ -1,16 +1,150 @@
-from django.db import models, transaction, IntegrityError
+from datetime import timedelta
+
+from django.db import models, transaction, IntegrityError, connection
+from django.db.models import Max
+from django.db.models.functions import Length
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from courses.models import Course
+from .constants import JoinCodePools, join_code_setting
 import random
 
 
+class JoinCode(models.Model):
+    """
+    Pre-shuffled free list of join codes, one pool per kind of session.
+
+    Every code of a given length is inserted once at a random position.
+    Claiming marks the lowest-positioned free row as used in a single
+    UPDATE, so allocation never probes for collisions. Released codes are
+    claimable again after COOLDOWN_SECONDS, and a pool gains the next code
+    length once every shorter code is in use or cooling down.
+    """
+    pool = models.CharField(max_length=10, choices=JoinCodePools.CHOICES)
+    code = models.CharField(max_length=6)
+    position = models.PositiveIntegerField()
+    in_use = models.BooleanField(default=False)
+    available_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pool', 'code'], name='unique_join_code_per_pool'),
+        ]
+        indexes = [
+            models.Index(fields=['pool', 'in_use', 'position'], name='join_code_free_list'),
+        ]
+
+    @classmethod
+    def claim(cls, pool):
+        """Take the next free code from the pool, widening it if none is left."""
+        while True:
+            code = cls._claim_next(pool)
+            if code is not None:
+                return code
+            if cls._claimable(pool).exists():
+                continue  # every free row was locked by concurrent claims
+            if not cls.widen(pool):
+                raise IntegrityError(f"No {pool} join codes left to allocate")
+
+    @classmethod
+    def _claimable(cls, pool):
+        return cls.objects.filter(pool=pool, in_use=False).filter(
+            models.Q(available_at__isnull=True) | models.Q(available_at__lte=timezone.now())
+        )
+
+    @classmethod
+    def _claim_next(cls, pool):
+        table = connection.ops.quote_name(cls._meta.db_table)
+        # Concurrent claims skip each other's rows instead of queueing on them
+        lock = ' FOR UPDATE SKIP LOCKED' if connection.features.has_select_for_update_skip_locked else ''
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET in_use = %s, available_at = NULL
+                WHERE id = (
+                    SELECT id FROM {table}
+                    WHERE pool = %s AND in_use = %s
+                      AND (available_at IS NULL OR available_at <= %s)
+                    ORDER BY position LIMIT 1{lock}
+                ) AND in_use = %s
+                RETURNING code
+                """,
+                [True, pool, False, now, False],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @classmethod
+    def widen(cls, pool):
+        """Seed the next code length. Returns False once MAX_LENGTH is reached."""
+        longest = cls.objects.filter(pool=pool).aggregate(longest=Max(Length('code')))['longest']
+        length = join_code_setting('MIN_LENGTH') if longest is None else longest + 1
+        if length > join_code_setting('MAX_LENGTH'):
+            return False
+        first = 10 ** (length - 1)
+        count = first * 9
+        # Offset by 10**length so shorter codes are always handed out first
+        positions = random.sample(range(count), count)
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                (
+                    cls(pool=pool, code=str(first + i), position=10 ** length + position)
+                    for i, position in enumerate(positions)
+                ),
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+        return True
+
+    @classmethod
+    def release(cls, pool, *codes):
+        """Return codes to the pool once their cool-down has passed."""
+        available_at = timezone.now() + timedelta(seconds=join_code_setting('COOLDOWN_SECONDS'))
+        cls.objects.filter(pool=pool, code__in=codes, in_use=True).update(
+            in_use=False, available_at=available_at
+        )
+
+    @classmethod
+    def reserve(cls, pool, code):
+        """Mark a code as used without claiming it through the free list."""
+        cls.objects.filter(pool=pool, code=code).update(in_use=True, available_at=None)
+
+    @classmethod
+    def save_new(cls, pool, instance, save, taken):
+        """
+        Claim a code for an unsaved instance and insert it in one transaction,
+        so a failed insert gives the code back.
+
+        If the code turns out to be held already (taken is the queryset of
+        rows whose codes must be unique), it is reserved and the next one is
+        tried.
+        """
+        for attempt in range(join_code_setting('CLAIM_ATTEMPTS')):
+            try:
+                with transaction.atomic():
+                    instance.code = cls.claim(pool)
+                    save()
+                return
+            except IntegrityError:
+                code, instance.code = instance.code, ''
+                if not code or not taken.filter(code=code).exists():
+                    raise
+                cls.reserve(pool, code)
+        raise IntegrityError("Failed to generate a unique code after several attempts")
+
+    def __str__(self):
+        status = "in use" if self.in_use else "free"
+        return f"{self.pool} {self.code} ({status})"
+
+
 class Class(models.Model):
     """
     Represents a live session created automatically when a slideshow starts.
     Each Class belongs to a Course and a Teacher.
     """
-    code = models.CharField(max_length=4, unique=True, editable=False)
+    code = models.CharField(max_length=6, editable=False, db_index=True)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_classes')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='classes')
     active = models.BooleanField(default=True)
@@ -22,9 +156,21 @@ class Class(models.Model):
                 fields=['teacher', 'course'],
                 condition=models.Q(active=True),
                 name='unique_active_class_per_teacher_course'
-            )
+            ),
+            # Codes are recycled, so only live classes need distinct ones
+            models.UniqueConstraint(
+                fields=['code'],
+                condition=models.Q(active=True),
+                name='unique_active_class_code'
+            ),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._code_held = instance.__dict__.get('active')
+        return instance
+
     def clean(self):
         """Validate that teacher can't have more than one active class per course."""
         super().clean()
@@ -46,23 +192,25 @@ class Class(models.Model):
     def save(self, *args, **kwargs):
         # Validate the model before saving
         self.clean()
-        
-        if not self.code:
-            self.code = self.generate_unique_code()
 
-        for attempt in range(5):
-            try:
-                with transaction.atomic():
-                    super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                self.code = self.generate_unique_code()
+        held = getattr(self, '_code_held', None)
+        if self.code:
+            super().save(*args, **kwargs)
         else:
-            raise IntegrityError("Failed to generate a unique code after several attempts")
+            JoinCode.save_new(
+                JoinCodePools.CLASS,
+                self,
+                lambda: super(Class, self).save(*args, **kwargs),
+                Class.objects.filter(active=True),
+            )
+            held = True
 
-    def generate_unique_code(self):
-        """Generate a unique 4-digit join code."""
-        return f"{random.randint(1000, 9999)}"
+        # Ending a class hands its code back to the pool
+        if held and not self.active:
+            JoinCode.release(JoinCodePools.CLASS, self.code)
+        elif held is False and self.active:
+            JoinCode.reserve(JoinCodePools.CLASS, self.code)
+        self._code_held = self.active
 
     def __str__(self):
         status = "Active" if self.active else "Inactive"
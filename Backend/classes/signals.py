@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .constants import JoinCodePools
+from .helpers import ClassCodeCache
+from .models import Class, JoinCode
+
+
+@receiver(post_delete, sender=Class)
+def release_class_code(sender, instance, **kwargs):
+    """Deleting a live class (directly or by cascade) frees its join code."""
+    if instance.active:
+        JoinCode.release(JoinCodePools.CLASS, instance.code)
+        ClassCodeCache.forget(instance.code)
+
+
+@receiver(post_save, sender=Class)
+def forget_ended_class(sender, instance, created, **kwargs):
+    """Students can no longer join once a class has ended."""
+    if not created and not instance.active:
+        ClassCodeCache.forget(instance.code)
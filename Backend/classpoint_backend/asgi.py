@@ -2,6 +2,8 @@
 ASGI config for classpoint_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve through this app (e.g. uvicorn or daphne) to use streaming endpoints such
+as the quick poll live results at /api/quickpolls/<code>/results/stream/.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -14,3 +16,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'classpoint_backend.settings')
 
 application = get_asgi_application()
+
+# Close quick polls whose duration has run out (rehydrates from the DB)
+from quickpolls.scheduler import start_close_scheduler  # noqa: E402
+
+start_close_scheduler()
+
+# Write quick poll votes-per-second counts to the timeline table
+from quickpolls.timeline import vote_timeline  # noqa: E402
+
+vote_timeline.start()
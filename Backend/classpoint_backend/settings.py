@@ -68,9 +68,9 @@ MIDDLEWARE = [
 CORS_ALLOW_ALL_ORIGINS = True  # for now while testing
 ROOT_URLCONF = 'classpoint_backend.urls'
 REST_FRAMEWORK = {
+    # Teacher (SimpleJWT) and student tokens, verified once per request
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'students.authentication.StudentAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'students.authentication.BearerAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -87,6 +87,33 @@ SIMPLE_JWT = {
     # Keep refresh lifetime default or adjust as needed
 }
 
+# Join code allocation (see classes/constants.py for the defaults)
+JOIN_CODES = {
+    # Ended classes and closed polls keep their code this long before reuse
+    "COOLDOWN_SECONDS": 24 * 60 * 60,
+}
+
+# Student token checks (see students/constants.py for the defaults)
+STUDENTS = {
+    # Enrollment snapshots behind student tokens; other workers see an
+    # ended class or removed enrollment at most this late
+    "ENROLLMENT_CACHE_TTL_SECONDS": 60,
+}
+
+# Quick poll tuning (see quickpolls/constants.py for the defaults)
+QUICKPOLLS = {
+    # "direct" writes every vote immediately; "buffered" batches votes in
+    # memory and flushes them with bulk_create (for very large rooms)
+    "VOTE_INGESTION": os.getenv('QUICKPOLL_VOTE_INGESTION', 'direct'),
+    "BUFFER_FLUSH_INTERVAL_MS": 250,
+    "BUFFER_MAX_VOTES": 500,
+    # Each worker locks its own numbered journal next to this path;
+    # `manage.py replay_vote_journals` flushes them all before startup
+    "BUFFER_JOURNAL_PATH": BASE_DIR / 'quickpolls_votes.journal',
+    # Live results stream: coalesce vote deltas into one push per interval
+    "STREAM_PUSH_INTERVAL_MS": 500,
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -127,6 +154,17 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Bursts of writers (class joins, votes): WAL lets reads run
+            # alongside the writer, and IMMEDIATE transactions queue for the
+            # write lock up front instead of failing to upgrade mid-way
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+            # The in-memory test database fails on a held lock instead of
+            # waiting for it, so concurrent tests could not queue for writes
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 # Override with DATABASE_URL if provided (useful for Docker and deployment)
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'classpoint_backend.settings')
 
 application = get_wsgi_application()
+
+# Close quick polls whose duration has run out (rehydrates from the DB)
+from quickpolls.scheduler import start_close_scheduler  # noqa: E402
+
+start_close_scheduler()
+
+# Write quick poll votes-per-second counts to the timeline table
+from quickpolls.timeline import vote_timeline  # noqa: E402
+
+vote_timeline.start()
@@ -0,0 +1,315 @@
+"""
+Write-behind vote buffer for very large rooms.
+
+Accepted votes are appended to a local journal and held in memory; a
+background thread persists them with one bulk_create and one counter
+update every BUFFER_FLUSH_INTERVAL_MS or BUFFER_MAX_VOTES votes, whichever
+comes first. Votes that were journaled but not flushed when the process
+died are replayed the next time the buffer starts.
+
+The buffer is per process, so each worker claims its own journal: the
+first free numbered slot next to BUFFER_JOURNAL_PATH, held with an
+exclusive lock for the life of the process. The replay_vote_journals
+command, run before the server starts, replays every slot left on disk,
+including slots above the current worker count, so crashed votes reach
+the database even if their poll gets no further votes. A worker also
+replays the slot it claims.
+
+The (poll, student) unique constraint stays authoritative: a duplicate
+that slips past another worker's buffer is dropped at flush time and the
+counters are recomputed from the stored rows. Votes whose poll, option
+or student was deleted before the flush are dropped too, so they cannot
+hold up the rest of the batch.
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.db import transaction
+
+from students.models import Student
+
+from .constants import quickpoll_setting
+from .models import PollOption, PollVote
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    """Collects votes in memory and flushes them in batches."""
+
+    def __init__(self, journal_path, flush_interval_ms=250, max_votes=500, fsync=True):
+        self.journal_path = Path(journal_path)
+        self.flushing_path = self.journal_path.with_name(self.journal_path.name + '.flushing')
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_votes = max_votes
+        self.fsync = fsync
+
+        self._lock = threading.Lock()          # guards pending state and the journal
+        self._flush_lock = threading.Lock()    # one flush at a time
+        self._wakeup = threading.Event()
+        self._pending = []                     # [(poll_id, option_id, student_id)]
+        self._voters = set()                   # {(poll_id, student_id)} not yet in the DB
+        self._journal = None
+        self._thread = None
+
+    # -------- accepting votes --------
+
+    def submit(self, poll_id, option_id, student_id):
+        """
+        Accept a vote into the buffer.
+
+        Returns False if the student already voted, either in a pending
+        batch or in the database.
+        """
+        key = (poll_id, student_id)
+        with self._lock:
+            if key in self._voters:
+                return False
+        if PollVote.objects.filter(poll_id=poll_id, student_id=student_id).exists():
+            return False
+
+        with self._lock:
+            if key in self._voters:
+                return False
+            self._write_journal(poll_id, option_id, student_id)
+            self._voters.add(key)
+            self._pending.append((poll_id, option_id, student_id))
+            full = len(self._pending) >= self.max_votes
+
+        if full:
+            self._wakeup.set()
+        return True
+
+    def _write_journal(self, poll_id, option_id, student_id):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal.write(json.dumps([poll_id, option_id, student_id]) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    # -------- flushing --------
+
+    def flush(self):
+        """Persist everything pending. Returns the number of votes written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = []
+                # Rotate the journal so votes arriving mid-flush are kept.
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                if self.journal_path.exists():
+                    self._append_to_flushing_segment()
+
+            if batch:
+                try:
+                    self._persist(batch)
+                except Exception:
+                    # Keep the votes queued; the rotated journal still has them.
+                    with self._lock:
+                        self._pending = batch + self._pending
+                    raise
+
+            with self._lock:
+                for poll_id, _option_id, student_id in batch:
+                    self._voters.discard((poll_id, student_id))
+            if self.flushing_path.exists():
+                self.flushing_path.unlink()
+            return len(batch)
+
+    def _append_to_flushing_segment(self):
+        # A previous flush may have died after rotating; keep its votes too.
+        if self.flushing_path.exists():
+            with open(self.flushing_path, 'a', encoding='utf-8') as segment:
+                segment.write(self.journal_path.read_text(encoding='utf-8'))
+            self.journal_path.unlink()
+        else:
+            self.journal_path.rename(self.flushing_path)
+
+    @staticmethod
+    def _persist(batch):
+        from .helpers import PollVoteHelper
+
+        with transaction.atomic():
+            batch = VoteBuffer._still_valid(batch)
+            if not batch:
+                return
+            stored = PollVoteHelper.insert_votes(batch)
+            PollVoteHelper.recount_options({option_id for _poll, option_id, _student in batch})
+
+        # Only the votes that were stored reach live listeners
+        deltas = defaultdict(Counter)
+        for poll_id, option_id, student_id in batch:
+            if (poll_id, student_id) in stored:
+                deltas[poll_id][option_id] += 1
+        for poll_id, poll_deltas in deltas.items():
+            PollVoteHelper.announce(poll_id, poll_deltas)
+
+    @staticmethod
+    def _still_valid(batch):
+        """The votes whose option (and so poll) and student still exist."""
+        options = set(
+            PollOption.objects.filter(pk__in={option_id for _poll, option_id, _student in batch})
+            .values_list('pk', 'poll_id')
+        )
+        students = set(
+            Student.objects.filter(pk__in={student_id for _poll, _option, student_id in batch})
+            .values_list('pk', flat=True)
+        )
+        valid = [
+            (poll_id, option_id, student_id)
+            for poll_id, option_id, student_id in batch
+            if (option_id, poll_id) in options and student_id in students
+        ]
+        if len(valid) < len(batch):
+            logger.warning(
+                "Dropping %d buffered vote(s) whose poll, option or student no longer exists",
+                len(batch) - len(valid),
+            )
+        return valid
+
+    def replay(self):
+        """Load votes left in the journal by a previous process and flush them."""
+        votes = []
+        for path in (self.flushing_path, self.journal_path):
+            if not path.exists():
+                continue
+            with open(path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        poll_id, option_id, student_id = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-write
+                    votes.append((poll_id, option_id, student_id))
+        if not votes:
+            return 0
+
+        with self._lock:
+            for poll_id, option_id, student_id in votes:
+                if (poll_id, student_id) not in self._voters:
+                    self._voters.add((poll_id, student_id))
+                    self._pending.append((poll_id, option_id, student_id))
+        return self.flush()
+
+    # -------- background thread --------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='quickpoll-vote-buffer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Quick poll vote flush failed; retrying next tick")
+            finally:
+                close_old_connections()
+
+
+def _slot_path(base_path, slot):
+    return base_path.with_name(f'{base_path.stem}.{slot}{base_path.suffix}') if slot else base_path
+
+
+def _lock_slot(path):
+    """Lock a slot's lock file; None if another process holds it."""
+    lock_file = open(path.with_name(path.name + '.lock'), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def claim_journal(base_path, slots=None):
+    """
+    Lock the first free journal slot next to `base_path`. Slot 0 is
+    `base_path` itself, so a journal written before slots existed is
+    still replayed.
+
+    Returns (path, lock_file); the lock lasts as long as lock_file stays
+    open. Raises RuntimeError when every slot is held.
+    """
+    base_path = Path(base_path)
+    slots = slots or quickpoll_setting('BUFFER_JOURNAL_SLOTS')
+    for slot in range(slots):
+        path = _slot_path(base_path, slot)
+        lock_file = _lock_slot(path)
+        if lock_file is not None:
+            return path, lock_file
+    raise RuntimeError(
+        f"All {slots} vote journal slots at {base_path} are held; raise BUFFER_JOURNAL_SLOTS."
+    )
+
+
+def journal_slots(base_path):
+    """Every slot next to `base_path` with a journal or flushing segment on disk."""
+    base_path = Path(base_path)
+    if not base_path.parent.is_dir():
+        return []
+    slot_name = re.compile(
+        rf'{re.escape(base_path.stem)}(\.\d+)?{re.escape(base_path.suffix)}(\.flushing)?'
+    )
+    slots = set()
+    for path in base_path.parent.iterdir():
+        if slot_name.fullmatch(path.name):
+            slots.add(base_path.with_name(path.name.removesuffix('.flushing')))
+    return sorted(slots)
+
+
+def replay_journals(base_path=None):
+    """
+    Replay every journal slot on disk that no running worker holds.
+    Returns the number of votes flushed.
+    """
+    base_path = Path(base_path or quickpoll_setting('BUFFER_JOURNAL_PATH'))
+    replayed = 0
+    for path in journal_slots(base_path):
+        lock_file = _lock_slot(path)
+        if lock_file is None:
+            continue   # a live worker owns it and replayed it when it started
+        try:
+            replayed += VoteBuffer(path).replay()
+        finally:
+            lock_file.close()
+    return replayed
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_journal_lock = None
+
+
+def get_vote_buffer():
+    """Return the process-wide buffer, replaying its journal on first use."""
+    global _buffer, _journal_lock
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                journal_path, _journal_lock = claim_journal(quickpoll_setting('BUFFER_JOURNAL_PATH'))
+                buffer = VoteBuffer(
+                    journal_path=journal_path,
+                    flush_interval_ms=quickpoll_setting('BUFFER_FLUSH_INTERVAL_MS'),
+                    max_votes=quickpoll_setting('BUFFER_MAX_VOTES'),
+                    fsync=quickpoll_setting('BUFFER_JOURNAL_FSYNC'),
+                )
+                buffer.replay()
+                buffer.start()
+                _buffer = buffer
+    return _buffer
@@ -0,0 +1,65 @@
+"""
+Constants and configuration for quick polls.
+Values here are defaults; override them through settings.QUICKPOLLS.
+"""
+from django.conf import settings
+
+
+# Vote ingestion modes
+class VoteIngestionModes:
+    DIRECT = 'direct'        # one short transaction per vote
+    BUFFERED = 'buffered'    # in-process buffer flushed with bulk_create
+
+
+# Representations served by the results endpoint (?view=)
+class ResultsViews:
+    FULL = 'full'        # counts plus every voter's name
+    COUNTS = 'counts'    # counts only, straight from PollOption.vote_count
+
+    ALL = (FULL, COUNTS)
+
+
+# Per-item outcomes of a batch vote submission
+class BatchVoteStatus:
+    ACCEPTED = 'accepted'
+    DUPLICATE = 'duplicate'
+    INVALID = 'invalid'
+
+
+# Defaults for settings.QUICKPOLLS
+class QuickPollDefaults:
+    VOTE_INGESTION = VoteIngestionModes.DIRECT
+    BUFFER_FLUSH_INTERVAL_MS = 250
+    BUFFER_MAX_VOTES = 500
+    BUFFER_JOURNAL_PATH = 'quickpolls_votes.journal'
+    BUFFER_JOURNAL_SLOTS = 64         # per-worker journals next to BUFFER_JOURNAL_PATH
+    BUFFER_JOURNAL_FSYNC = True
+    STREAM_PUSH_INTERVAL_MS = 500     # at most one live update per interval
+    STREAM_KEEPALIVE_SECONDS = 15
+    RESULTS_CACHE_SECONDS = 300       # lifetime of an unfrozen results snapshot
+    FROZEN_RESULTS_SECONDS = 60 * 60  # lifetime of a closed poll's final snapshots
+    SEARCH_RESULT_LIMIT = 50          # max polls returned by a name search
+    SEARCH_CANDIDATE_WINDOW = 500     # newest matches considered for ranking
+    BATCH_MAX_VOTES = 500             # votes accepted in one batch request
+    VOTERS_PAGE_SIZE = 50             # voters per page on the voters endpoint
+    VOTERS_MAX_PAGE_SIZE = 200
+    VOTER_SET_IDLE_SECONDS = 15 * 60  # keep well below the join code cool-down
+    ARCHIVE_AFTER_DAYS = 30           # closed this long before votes are compacted
+    ARCHIVE_KEEP_VOTERS = True        # keep a compressed voter list per option
+    ARCHIVE_DELETE_CHUNK = 5000       # raw votes deleted per statement
+    MAX_POLL_DURATION_SECONDS = 24 * 60 * 60
+    AUTO_CLOSE_TICK_MS = 1000         # timing wheel resolution
+    AUTO_CLOSE_WHEEL_SLOTS = 60       # one revolution = slots * tick
+    AUTO_CLOSE_SWEEP_SECONDS = 60     # DB sweep for polls scheduled by other workers
+    TIMELINE_BUCKET_SECONDS = 1       # width of one point on the votes timeline
+    TIMELINE_FLUSH_MS = 1000          # how often bucket counts are written out
+    TIMELINE_DEFAULT_BUCKETS = 300    # points returned when ?buckets= is absent
+    TIMELINE_MAX_BUCKETS = 3600
+
+
+def quickpoll_setting(name):
+    """Read a quick poll setting, falling back to QuickPollDefaults."""
+    overrides = getattr(settings, 'QUICKPOLLS', {})
+    if name in overrides:
+        return overrides[name]
+    return getattr(QuickPollDefaults, name)
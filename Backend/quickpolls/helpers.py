@@ -0,0 +1,531 @@
+"""
+Helper functions and utilities for quick poll operations.
+Keeps the hot vote path out of the views so every entry point shares it.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from classes.constants import JoinCodePools
+from classes.models import JoinCode
+
+from .constants import ResultsViews, VoteIngestionModes, quickpoll_setting
+from .live import poll_events
+from .timeline import vote_timeline
+from .voters import poll_voters
+from .models import QuickPoll, PollNameTrigram, PollOption, PollOptionArchive, PollVote
+
+
+class PollVoteHelper:
+    """Writes votes with the fewest possible round trips."""
+
+    @staticmethod
+    def submit_vote(poll_id: int, option_id: int, student_id: int) -> bool:
+        """Store a vote using the configured ingestion mode."""
+        if quickpoll_setting('VOTE_INGESTION') == VoteIngestionModes.BUFFERED:
+            from .buffer import get_vote_buffer
+            return get_vote_buffer().submit(poll_id, option_id, student_id)
+        return PollVoteHelper.record_vote(poll_id, option_id, student_id)
+
+    @staticmethod
+    def record_vote(poll_id: int, option_id: int, student_id: int) -> bool:
+        """
+        Insert a vote and bump its option counter in one short transaction.
+
+        The (poll, student) unique constraint is the duplicate check: the
+        insert is attempted first and a conflict means the student already
+        voted. The counter is incremented in the database so concurrent
+        voters never overwrite each other's count.
+
+        Returns True if the vote was stored, False if it was a duplicate.
+        """
+        try:
+            with transaction.atomic():
+                PollVote.objects.create(
+                    poll_id=poll_id,
+                    option_id=option_id,
+                    student_id=student_id,
+                )
+                PollOption.objects.filter(pk=option_id).update(
+                    vote_count=F('vote_count') + 1
+                )
+                transaction.on_commit(
+                    lambda: PollVoteHelper.announce(poll_id, {option_id: 1}), robust=True
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    @staticmethod
+    def record_votes(poll_id: int, votes) -> set:
+        """
+        Store many (option_id, student_id) votes for one poll in a single
+        transaction: one bulk insert, one read back and one counter update.
+        Returns the ids of the students whose vote was stored.
+
+        Rows that conflict with an existing vote are skipped by the database
+        and the touched counters are recomputed from the stored rows, so a
+        vote that raced in from elsewhere is still counted exactly once.
+        """
+        with transaction.atomic():
+            stored = {
+                student_id for _poll_id, student_id in PollVoteHelper.insert_votes(
+                    (poll_id, option_id, student_id) for option_id, student_id in votes
+                )
+            }
+            PollVoteHelper.recount_options({option_id for option_id, _student_id in votes})
+            deltas = Counter(
+                option_id for option_id, student_id in votes if student_id in stored
+            )
+            if deltas:
+                transaction.on_commit(lambda: PollVoteHelper.announce(poll_id, deltas), robust=True)
+        return stored
+
+    @staticmethod
+    def insert_votes(votes) -> set:
+        """
+        Bulk insert (poll_id, option_id, student_id) votes, skipping any that
+        conflict with a stored vote, and return the (poll_id, student_id)
+        pairs this call stored. The rows are read back to tell ours from the
+        ones that raced in: ours carry the option and voted_at set on insert.
+        """
+        rows = {}
+        for poll_id, option_id, student_id in votes:
+            rows.setdefault(
+                (poll_id, student_id),
+                PollVote(poll_id=poll_id, option_id=option_id, student_id=student_id),
+            )
+        PollVote.objects.bulk_create(list(rows.values()), ignore_conflicts=True)
+        sent = {key: (row.option_id, row.voted_at) for key, row in rows.items()}
+        stored = PollVote.objects.filter(
+            poll_id__in={poll_id for poll_id, _student_id in sent},
+            student_id__in={student_id for _poll_id, student_id in sent},
+        ).values_list('poll_id', 'student_id', 'option_id', 'voted_at')
+        return {
+            (poll_id, student_id)
+            for poll_id, student_id, option_id, voted_at in stored
+            if sent.get((poll_id, student_id)) == (option_id, voted_at)
+        }
+
+    @staticmethod
+    def announce(poll_id: int, deltas) -> None:
+        """Push stored votes to live listeners and the votes timeline."""
+        poll_events.publish(poll_id, deltas)
+        vote_timeline.record(poll_id, sum(deltas.values()))
+
+    @staticmethod
+    def recount_options(option_ids) -> int:
+        """
+        Set vote_count from the stored votes for the given options in one
+        UPDATE. Idempotent, so replaying a batch can never double count.
+        """
+        votes = (
+            PollVote.objects.filter(option=OuterRef('pk'))
+            .order_by()
+            .values('option')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return PollOption.objects.filter(pk__in=option_ids).update(
+            vote_count=Coalesce(Subquery(votes), 0)
+        )
+
+
+class PollResultsHelper:
+    """Builds the results payloads served by the results endpoints."""
+
+    @staticmethod
+    def option_results(poll_ids):
+        """
+        Options and voter names for many polls from a single query.
+
+        Options are LEFT JOINed to their votes and voters, so an option with
+        no votes still comes back once with a NULL name. Options of
+        compacted polls have no votes left and read their archive instead. Returns
+        {poll_id: [{"text", "vote_count", "voters"}, ...]} in option order.
+        """
+        rows = (
+            PollOption.objects.filter(poll_id__in=poll_ids)
+            .order_by('poll_id', 'id', 'votes__id')
+            .values_list(
+                'poll_id', 'id', 'text', 'vote_count', 'votes__student__full_name',
+                'archive__id', 'archive__voters_blob',
+            )
+        )
+        results = {poll_id: [] for poll_id in poll_ids}
+        current_option = None
+        for poll_id, option_id, text, vote_count, voter, archive_id, blob in rows:
+            if option_id != current_option:
+                current_option = option_id
+                option = {"text": text, "vote_count": vote_count, "voters": []}
+                if archive_id is not None:
+                    # Compacted poll: the names come from the archive blob
+                    option["voters"] = [
+                        name for name, _voted_at in PollOptionArchive.unpack_voters(blob)
+                    ]
+                results[poll_id].append(option)
+            if voter is not None and archive_id is None:
+                option["voters"].append(voter)
+        return results
+
+    @staticmethod
+    def build_results(poll):
+        options_data = [
+            {
+                "text": option["text"],            # <-- frontend expects "text"
+                "count": option["vote_count"],     # <-- frontend expects "count"
+                "voters": option["voters"],
+            }
+            for option in PollResultsHelper.option_results([poll.id])[poll.id]
+        ]
+
+        return {
+            "poll_code": poll.code,
+            "name": poll.name,
+            "question_type": poll.question_type,
+            "options": options_data            # <-- IMPORTANT: frontend searches for "options"
+        }
+
+    @staticmethod
+    def build_counts(poll):
+        """Counts-only results, read from the vote_count columns."""
+        options = (
+            PollOption.objects.filter(poll_id=poll.id)
+            .order_by('id')
+            .values_list('id', 'text', 'vote_count')
+        )
+        return {
+            "poll_code": poll.code,
+            "name": poll.name,
+            "question_type": poll.question_type,
+            "options": [
+                {"id": option_id, "text": text, "count": count}
+                for option_id, text, count in options
+            ],
+        }
+
+    @staticmethod
+    def build_poll_list(polls, created_at_format=None, with_name=True):
+        """
+        Results for a list of polls (dicts with id, code, name, created_at)
+        with one query for all of their options and voters.
+        """
+        options = PollResultsHelper.option_results([poll["id"] for poll in polls])
+        data = []
+        for poll in polls:
+            created_at = poll["created_at"]
+            poll_data = {"poll_code": poll["code"]}
+            if with_name:
+                poll_data["poll_name"] = poll["name"]
+            poll_data.update({
+                "created_at": created_at.strftime(created_at_format) if created_at_format else created_at,
+                "results": [
+                    {
+                        "option": option["text"],
+                        "vote_count": option["vote_count"],
+                        "voters": option["voters"],
+                    }
+                    for option in options[poll["id"]]
+                ],
+            })
+            data.append(poll_data)
+        return data
+
+
+class PollNameSearch:
+    """
+    Ranked, capped substring search over poll names.
+
+    PostgreSQL answers name__icontains from its pg_trgm index. Elsewhere the
+    PollNameTrigram table supplies candidates: up to PROBED_TRIGRAMS of the
+    query's trigrams are probed with capped counts, and the rarest one's
+    posting list bounds the scan. When every probed trigram is common, matches are
+    dense and a newest-first scan stops early anyway.
+
+    Only the newest SEARCH_CANDIDATE_WINDOW matches are ranked, so the cost
+    stays flat however many historical polls match.
+    """
+
+    PROBED_TRIGRAMS = 6
+    SELECTIVE_POSTINGS = 100     # good enough; stop probing
+    COMMON_POSTINGS = 1000       # probe counts are capped here
+
+    @staticmethod
+    def _query_trigrams(query):
+        text = query.lower()
+        grams = list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2)))
+        step = max(1, len(grams) // PollNameSearch.PROBED_TRIGRAMS)
+        return grams[::step][:PollNameSearch.PROBED_TRIGRAMS]
+
+    @staticmethod
+    def _candidates(query):
+        polls = QuickPoll.objects.filter(name__icontains=query)
+        if PollNameTrigram.uses_native_index():
+            return polls
+
+        rarest, rarest_count = None, PollNameSearch.COMMON_POSTINGS
+        for gram in PollNameSearch._query_trigrams(query):
+            count = PollNameTrigram.objects.filter(trigram=gram)[:PollNameSearch.COMMON_POSTINGS].count()
+            if count == 0:
+                return QuickPoll.objects.none()
+            if count < rarest_count:
+                rarest, rarest_count = gram, count
+            if count <= PollNameSearch.SELECTIVE_POSTINGS:
+                break
+        if rarest is not None:
+            polls = polls.filter(
+                pk__in=PollNameTrigram.objects.filter(trigram=rarest).values('poll_id')
+            )
+        return polls
+
+    @staticmethod
+    def search(query, limit):
+        window = (
+            PollNameSearch._candidates(query)
+            .order_by('-pk')[:quickpoll_setting('SEARCH_CANDIDATE_WINDOW')]
+            .values('pk')
+        )
+        # Exact names first, then prefixes, then everything else; newest first within each
+        rank = Case(
+            When(name__iexact=query, then=Value(0)),
+            When(name__istartswith=query, then=Value(1)),
+            default=Value(2),
+        )
+        return (
+            QuickPoll.objects.filter(pk__in=window)
+            .annotate(rank=rank)
+            .order_by('rank', '-created_at')[:limit]
+        )
+
+
+class PollResultsCache:
+    """
+    Serialized results snapshots keyed by (poll, results_version, view).
+
+    results_version is the poll's total vote count, summed from the option
+    counters that every stored vote already increments. A snapshot is
+    therefore valid for exactly one version and never needs invalidating,
+    and voting writes nothing to the poll row. Every read looks the version
+    up in the poll query it runs anyway, so a vote that lands after a close,
+    or is flushed later by another worker's buffer, moves readers to a new
+    snapshot instead of leaving them on the frozen one. Closing a poll
+    freezes it: the final snapshots are built at once and kept for
+    FROZEN_RESULTS_SECONDS.
+    """
+
+    BUILDERS = {
+        ResultsViews.FULL: PollResultsHelper.build_results,
+        ResultsViews.COUNTS: PollResultsHelper.build_counts,
+    }
+
+    @staticmethod
+    def with_version(queryset):
+        """
+        Annotate each poll in `queryset` with its results_version.
+
+        The sum is a correlated subquery inside the poll lookup, so it adds
+        no round trip; it reads the poll's few option rows by their poll_id
+        index. A counter on the poll row would make every vote of a poll
+        queue on that one row.
+        """
+        total = (
+            PollOption.objects.filter(poll_id=OuterRef('pk'))
+            .order_by().values('poll_id')
+            .annotate(votes=Sum('vote_count')).values('votes')
+        )
+        return queryset.annotate(results_version=Coalesce(Subquery(total), 0))
+
+    @staticmethod
+    def etag(poll_id, version, view=ResultsViews.FULL):
+        if view == ResultsViews.FULL:
+            return f'"{poll_id}.{version}"'
+        return f'"{poll_id}.{version}.{view}"'
+
+    @staticmethod
+    def _snapshot_key(poll_id, version, view):
+        return f'quickpoll:results:{poll_id}:{version}:{view}'
+
+    @staticmethod
+    def snapshot(poll, view=ResultsViews.FULL):
+        """Return (etag, body) for the poll's current version, building it on a miss."""
+        key = PollResultsCache._snapshot_key(poll.id, poll.results_version, view)
+        body = cache.get(key)
+        if body is None:
+            body = JSONRenderer().render(PollResultsCache.BUILDERS[view](poll))
+            cache.set(key, body, quickpoll_setting('RESULTS_CACHE_SECONDS'))
+        return PollResultsCache.etag(poll.id, poll.results_version, view), body
+
+    @staticmethod
+    def freeze(poll):
+        """
+        Build the final snapshots of a closed poll under its final version.
+        They are always rebuilt, replacing any snapshot of that version.
+        """
+        cache.set_many(
+            {
+                PollResultsCache._snapshot_key(poll.id, poll.results_version, view):
+                    JSONRenderer().render(builder(poll))
+                for view, builder in PollResultsCache.BUILDERS.items()
+            },
+            quickpoll_setting('FROZEN_RESULTS_SECONDS'),
+        )
+
+
+class PollCloseHelper:
+    """Closes polls, by hand or on schedule, and runs what has to follow."""
+
+    @staticmethod
+    def _flush_buffered_votes():
+        # Persist votes accepted before the close
+        if quickpoll_setting('VOTE_INGESTION') == VoteIngestionModes.BUFFERED:
+            from .buffer import get_vote_buffer
+            get_vote_buffer().flush()
+
+    @staticmethod
+    def close(poll):
+        """Close one poll now."""
+        PollCloseHelper._flush_buffered_votes()
+        with transaction.atomic():
+            poll.is_active = False
+            poll.closed_at = timezone.now()
+            poll.save(update_fields=['is_active', 'closed_at'])   # releases the code
+            PollVoteHelper.recount_options(PollOption.objects.filter(poll_id=poll.pk).values('pk'))
+            # The flush, the recount or votes committed since the poll was loaded moved it on
+            poll.results_version = (
+                PollResultsCache.with_version(QuickPoll.objects.filter(pk=poll.pk))
+                .values_list('results_version', flat=True).get()
+            )
+            PollResultsCache.freeze(poll)
+        poll_events.close(poll.id)
+        poll_voters.drop(poll.code)
+
+    @staticmethod
+    def close_due(poll_ids=None, now=None):
+        """
+        Close every open poll whose closes_at has passed, optionally only
+        among poll_ids, with a single UPDATE. Returns the ids it closed.
+        """
+        due = QuickPoll.objects.filter(is_active=True, closes_at__lte=now or timezone.now())
+        if poll_ids is not None:
+            due = due.filter(pk__in=poll_ids)
+        due_ids = list(due.values_list('id', flat=True))
+        if not due_ids:
+            return []
+
+        PollCloseHelper._flush_buffered_votes()
+        QuickPoll.objects.filter(pk__in=due_ids, is_active=True).update(
+            is_active=False, closed_at=F('closes_at')
+        )
+        PollVoteHelper.recount_options(PollOption.objects.filter(poll_id__in=due_ids).values('pk'))
+        # The bulk UPDATE skips QuickPoll.save, so release the codes here
+        polls = list(PollResultsCache.with_version(
+            QuickPoll.objects.filter(pk__in=due_ids).only('id', 'code', 'name', 'question_type')
+        ))
+        JoinCode.release(JoinCodePools.POLL, *(poll.code for poll in polls))
+        for poll in polls:
+            PollResultsCache.freeze(poll)
+            poll_events.close(poll.id)
+            poll_voters.drop(poll.code)
+        return due_ids
+
+    @staticmethod
+    def schedule(poll):
+        """Have this worker's close scheduler shut the poll at closes_at."""
+        if poll.closes_at is None:
+            return
+        from .scheduler import get_close_scheduler
+        transaction.on_commit(
+            lambda: get_close_scheduler().schedule(poll.id, poll.closes_at)
+        )
+
+
+class PollArchiveHelper:
+    """
+    Folds the votes of long-closed polls into PollOptionArchive rows so
+    the vote table only holds polls that can still change.
+    """
+
+    @staticmethod
+    def due_polls(days=None):
+        """Closed polls older than the retention window that still hold raw votes."""
+        days = quickpoll_setting('ARCHIVE_AFTER_DAYS') if days is None else days
+        cutoff = timezone.now() - timedelta(days=days)
+        # Polls closed before closed_at was recorded fall back to created_at
+        return (
+            QuickPoll.objects.filter(is_active=False)
+            .annotate(ended_at=Coalesce('closed_at', 'created_at'))
+            .filter(ended_at__lte=cutoff)
+            .filter(Q(compacted_at__isnull=True) | Exists(PollVote.objects.filter(poll=OuterRef('pk'))))
+        )
+
+    @staticmethod
+    def compact(poll_id, keep_voters=None, chunk_size=None):
+        """
+        Archive one closed poll and delete its raw votes in bounded chunks.
+
+        Counters that drifted from the stored votes are corrected before
+        the votes go. Safe to re-run: an already archived poll only has its
+        leftover rows deleted. Returns {"deleted": n, "drifted": n}.
+        """
+        if keep_voters is None:
+            keep_voters = quickpoll_setting('ARCHIVE_KEEP_VOTERS')
+        chunk_size = chunk_size or quickpoll_setting('ARCHIVE_DELETE_CHUNK')
+
+        drifted = 0
+        with transaction.atomic():
+            poll = QuickPoll.objects.select_for_update().filter(pk=poll_id, is_active=False).first()
+            if poll is None:
+                return {"deleted": 0, "drifted": 0}
+            if poll.compacted_at is None:
+                drifted = PollArchiveHelper._archive(poll, keep_voters)
+
+        deleted = 0
+        while True:
+            chunk = list(PollVote.objects.filter(poll_id=poll_id).values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                break
+            deleted += PollVote.objects.filter(pk__in=chunk).delete()[0]
+
+        if drifted:
+            # Snapshots of this version carried the wrong counts
+            PollResultsCache.freeze(PollResultsCache.with_version(QuickPoll.objects.filter(pk=poll_id)).get())
+        return {"deleted": deleted, "drifted": drifted}
+
+    @staticmethod
+    def _archive(poll, keep_voters):
+        counts = Counter()
+        voters = defaultdict(list)
+        votes = PollVote.objects.filter(poll=poll)
+        if keep_voters:
+            for option_id, name, voted_at in (
+                votes.order_by('id').values_list('option_id', 'student__full_name', 'voted_at').iterator()
+            ):
+                counts[option_id] += 1
+                voters[option_id].append([name, voted_at.isoformat()])
+        else:
+            counts.update(dict(
+                votes.order_by().values('option_id').annotate(n=Count('id')).values_list('option_id', 'n')
+            ))
+
+        options = dict(poll.options.values_list('id', 'vote_count'))
+        PollOptionArchive.objects.bulk_create([
+            PollOptionArchive(
+                option_id=option_id,
+                vote_count=counts[option_id],
+                voters_blob=PollOptionArchive.pack_voters(voters[option_id]) if keep_voters else None,
+            )
+            for option_id in options
+        ])
+        drifted = [option_id for option_id, count in options.items() if count != counts[option_id]]
+        if drifted:
+            PollVoteHelper.recount_options(drifted)
+
+        poll.compacted_at = timezone.now()
+        poll.save(update_fields=['compacted_at'])
+        return len(drifted)
@@ -0,0 +1,143 @@
+"""
+Live result updates for quick polls.
+
+The vote path publishes per-option count deltas to an in-process hub and
+each server-sent-events stream drains them at most once per
+STREAM_PUSH_INTERVAL_MS. Viewers then cost nothing until a vote lands,
+instead of rebuilding the full results on every refresh.
+
+The hub only reaches subscribers in the same process, and streaming needs
+the ASGI application (classpoint_backend.asgi). A subscriber whose event
+loop has gone away is dropped on the next publish; delivery never raises
+into the vote path.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from .constants import quickpoll_setting
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One listener's pending deltas, fed from any thread."""
+
+    def __init__(self, poll_id, loop):
+        self.poll_id = poll_id
+        self.loop = loop
+        self.closed = False
+        self._lock = threading.Lock()
+        self._deltas = Counter()
+        self._ready = asyncio.Event()
+
+    def push(self, deltas=None, closed=False):
+        with self._lock:
+            if deltas:
+                self._deltas.update(deltas)
+            self.closed = self.closed or closed
+        self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def wait(self, timeout):
+        """Wait for activity; returns (deltas, closed), or None on timeout."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        with self._lock:
+            deltas, self._deltas = self._deltas, Counter()
+            return deltas, self.closed
+
+
+class PollEventHub:
+    """Fans vote deltas out to the subscribers of each poll."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, poll_id, loop):
+        subscription = Subscription(poll_id, loop)
+        with self._lock:
+            self._subscribers[poll_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.poll_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.poll_id]
+
+    def _listeners(self, poll_id):
+        with self._lock:
+            return list(self._subscribers.get(poll_id, ()))
+
+    def _deliver(self, poll_id, deltas=None, closed=False):
+        for subscription in self._listeners(poll_id):
+            try:
+                subscription.push(deltas, closed=closed)
+            except RuntimeError:
+                # Its event loop is closed; the stream can never read again
+                logger.warning("Dropping dead live results subscriber for poll %s", poll_id)
+                self.unsubscribe(subscription)
+
+    def publish(self, poll_id, deltas):
+        """Send {option_id: +n} to every stream watching the poll."""
+        self._deliver(poll_id, deltas)
+
+    def close(self, poll_id):
+        """Tell every stream watching the poll that it has closed."""
+        self._deliver(poll_id, closed=True)
+
+
+poll_events = PollEventHub()
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def result_events(poll_id, load_snapshot):
+    """
+    Yield the snapshot, then coalesced deltas until the poll closes.
+
+    Subscribes before `load_snapshot()` reads the counts so no vote falls in
+    between, and always unsubscribes when the stream ends or is dropped.
+    """
+    interval = quickpoll_setting('STREAM_PUSH_INTERVAL_MS') / 1000
+    keepalive = quickpoll_setting('STREAM_KEEPALIVE_SECONDS')
+    subscription = poll_events.subscribe(poll_id, asyncio.get_running_loop())
+    try:
+        snapshot = await load_snapshot()
+        yield sse_event('snapshot', snapshot)
+        if not snapshot['is_active']:
+            return
+        last_push = 0.0
+        while True:
+            # Let deltas pile up until the next push is allowed.
+            wait = last_push + interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            activity = await subscription.wait(keepalive)
+            if activity is None:
+                yield ": keepalive\n\n"
+                continue
+
+            deltas, closed = activity
+            if deltas:
+                yield sse_event('votes', {
+                    'deltas': {str(option_id): n for option_id, n in deltas.items()},
+                })
+                last_push = time.monotonic()
+            if closed:
+                yield sse_event('closed', {})
+                return
+    finally:
+        poll_events.unsubscribe(subscription)
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from quickpolls.constants import quickpoll_setting
+from quickpolls.helpers import PollArchiveHelper
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the votes of polls closed longer than the retention window into "
+        "per-option archives and delete the raw vote rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=quickpoll_setting('ARCHIVE_AFTER_DAYS'),
+            help="Only compact polls closed at least this many days ago.",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=quickpoll_setting('ARCHIVE_DELETE_CHUNK'),
+            help="Raw votes deleted per statement.",
+        )
+        parser.add_argument(
+            '--drop-voters', action='store_true',
+            help="Keep counts only, without the compressed voter lists.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="List the polls that would be compacted and stop.",
+        )
+
+    def handle(self, *args, **options):
+        poll_ids = list(PollArchiveHelper.due_polls(options['days']).values_list('id', flat=True))
+        if options['dry_run']:
+            self.stdout.write(f"{len(poll_ids)} poll(s) would be compacted.")
+            return
+
+        deleted = drifted = 0
+        for poll_id in poll_ids:
+            summary = PollArchiveHelper.compact(
+                poll_id,
+                keep_voters=not options['drop_voters'],
+                chunk_size=options['chunk_size'],
+            )
+            deleted += summary['deleted']
+            drifted += summary['drifted']
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {len(poll_ids)} poll(s): {deleted} vote row(s) deleted, "
+            f"{drifted} drifted counter(s) corrected."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from quickpolls.buffer import replay_journals
+
+
+class Command(BaseCommand):
+    help = (
+        "Flush the buffered votes left in every vote journal slot by workers "
+        "that stopped before persisting them. Run before the server starts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--journal', default=None,
+            help="Base journal path (defaults to QUICKPOLLS['BUFFER_JOURNAL_PATH']).",
+        )
+
+    def handle(self, *args, **options):
+        replayed = replay_journals(options['journal'])
+        self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} buffered vote(s)."))
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TRGM_INDEX = 'quickpolls_quickpoll_name_trgm'
+
+
+def build_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Matches the UPPER(name::text) LIKE expression Django emits for icontains
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON quickpolls_quickpoll '
+            'USING gin (UPPER(name::text) gin_trgm_ops)'
+        )
+        return
+
+    QuickPoll = apps.get_model('quickpolls', 'QuickPoll')
+    PollNameTrigram = apps.get_model('quickpolls', 'PollNameTrigram')
+    batch = []
+    for poll_id, name in QuickPoll.objects.values_list('id', 'name').iterator(chunk_size=2000):
+        text = name.lower()
+        batch.extend(
+            PollNameTrigram(poll_id=poll_id, trigram=trigram)
+            for trigram in {text[i:i + 3] for i in range(len(text) - 2)}
+        )
+        if len(batch) >= 10000:
+            PollNameTrigram.objects.bulk_create(batch)
+            batch = []
+    PollNameTrigram.objects.bulk_create(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickpolls', '0005_quickpoll_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollNameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_trigrams', to='quickpolls.quickpoll')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigram', 'poll'), name='unique_trigram_per_poll')],
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:17
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+# One seeding routine for both pools, kept with the JoinCode table
+seed_pool = import_module('classes.migrations.0005_join_codes').seed_pool
+
+
+def seed_poll_codes(apps, schema_editor):
+    QuickPoll = apps.get_model('quickpolls', 'QuickPoll')
+    JoinCode = apps.get_model('classes', 'JoinCode')
+    seed_pool(
+        JoinCode, 'poll',
+        in_use=QuickPoll.objects.filter(is_active=True).values_list('code', flat=True),
+        released=QuickPoll.objects.filter(is_active=False).values_list('code', flat=True),
+    )
+
+
+def clear_poll_codes(apps, schema_editor):
+    apps.get_model('classes', 'JoinCode').objects.filter(pool='poll').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_join_codes'),
+        ('quickpolls', '0006_poll_name_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quickpoll',
+            name='code',
+            field=models.CharField(db_index=True, max_length=6),
+        ),
+        migrations.AddConstraint(
+            model_name='quickpoll',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('code',), name='unique_active_poll_code'),
+        ),
+        migrations.RunPython(seed_poll_codes, clear_poll_codes),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_join_codes'),
+        ('quickpolls', '0007_join_codes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quickpoll',
+            name='classroom',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='quickpolls', to='classes.class'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickpolls', '0008_quickpoll_classroom'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quickpoll',
+            name='closes_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickpolls', '0009_quickpoll_closes_at'),
+        ('students', '0006_studenttoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pollvote',
+            index=models.Index(fields=['option', 'id'], name='pollvote_option_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickpolls', '0010_pollvote_option_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quickpoll',
+            name='compacted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PollOptionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vote_count', models.PositiveIntegerField()),
+                ('voters_blob', models.BinaryField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='quickpolls.polloption')),
+            ],
+        ),
+    ]
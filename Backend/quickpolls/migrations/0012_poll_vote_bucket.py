@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickpolls', '0011_poll_vote_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollVoteBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.BigIntegerField()),
+                ('votes', models.PositiveIntegerField(default=0)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_buckets', to='quickpolls.quickpoll')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('poll', 'started_at'), name='unique_vote_bucket_per_poll')],
+            },
+        ),
+    ]
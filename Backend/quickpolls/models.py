@@ -1,8 +1,12 @@
 # Backend/quickpolls/models.py
 
-from django.db import models
+import json
+import zlib
+
+from django.db import models, connection, transaction
 from django.contrib.auth import get_user_model
-import random
+from classes.constants import JoinCodePools
+from classes.models import Class, JoinCode
 from students.models import Student 
 User = get_user_model()
 
@@ -13,31 +17,82 @@ class QuickPoll(models.Model):
         ('custom', 'Custom'),
     ]
     name = models.CharField(max_length=120, db_index=True)
-    code = models.CharField(max_length=6, unique=True)
+    code = models.CharField(max_length=6, db_index=True)
     creator = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='quickpolls',
         null=True, blank=True      # ✅ make optional for anonymous
     )
+    # Optional live class; when set, only its enrolled students can vote
+    classroom = models.ForeignKey(
+        Class,
+        on_delete=models.CASCADE,
+        related_name='quickpolls',
+        null=True, blank=True
+    )
     question_type = models.CharField(max_length=20, choices=QUESTION_TYPES)
     option_count = models.IntegerField(default=2)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     closed_at = models.DateTimeField(null=True, blank=True)
+    # Set from a duration at creation; the close scheduler shuts the poll then
+    closes_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Set once the raw votes have been folded into PollOptionArchive rows
+    compacted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Codes are recycled, so only open polls need distinct ones
+            models.UniqueConstraint(
+                fields=['code'],
+                condition=models.Q(is_active=True),
+                name='unique_active_poll_code',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed_name = instance.__dict__.get('name')
+        instance._code_held = instance.__dict__.get('is_active')
+        return instance
 
     def save(self, *args, **kwargs):
-        if not self.code:
-            self.code = self._generate_unique_code()
+        held = getattr(self, '_code_held', None)
+        if not self._state.adding:
+            super().save(*args, **kwargs)
+        elif self.code:
+            with transaction.atomic():
+                self._insert(*args, **kwargs)
+        else:
+            JoinCode.save_new(
+                JoinCodePools.POLL,
+                self,
+                lambda: self._insert(*args, **kwargs),
+                QuickPoll.objects.filter(is_active=True),
+            )
+            held = True
+            from .voters import poll_voters
+            poll_voters.activate(self.code, self.id)
+
+        # Closing a poll hands its code back to the pool
+        if held and not self.is_active:
+            JoinCode.release(JoinCodePools.POLL, self.code)
+        elif held is False and self.is_active:
+            JoinCode.reserve(JoinCodePools.POLL, self.code)
+        self._code_held = self.is_active
+
+        if self.name != getattr(self, '_indexed_name', None):
+            PollNameTrigram.reindex(self)
+            self._indexed_name = self.name
+
+    def _insert(self, *args, **kwargs):
+        """Insert a new poll with its default options and name index, in the caller's transaction."""
         super().save(*args, **kwargs)
-        if not self.options.exists():
-            self._create_default_options()
-
-    def _generate_unique_code(self):
-        while True:
-            code = str(random.randint(1000, 9999))
-            if not QuickPoll.objects.filter(code=code).exists():
-                return code
+        self._create_default_options()
+        PollNameTrigram.reindex(self, created=True)
+        self._indexed_name = self.name
 
     def _create_default_options(self):
         options = []
@@ -47,13 +102,48 @@ class QuickPoll(models.Model):
             options = ['Yes', 'No', 'Unsure']
         elif self.question_type == 'custom':
             options = [f'Option {i+1}' for i in range(self.option_count)]
-        for text in options:
-            PollOption.objects.create(poll=self, text=text)
+        PollOption.objects.bulk_create(PollOption(poll=self, text=text) for text in options)
 
     def __str__(self):
         return f"{self.name} ({self.code})"
 
 
+def name_trigrams(text):
+    """Distinct lower-cased 3-character windows of a poll name."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PollNameTrigram(models.Model):
+    """
+    Trigram posting list for substring search on poll names.
+
+    Only maintained on databases without a native trigram index; PostgreSQL
+    uses a pg_trgm GIN index on QuickPoll.name instead (migration 0007).
+    """
+    poll = models.ForeignKey(QuickPoll, on_delete=models.CASCADE, related_name='name_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'poll'], name='unique_trigram_per_poll'),
+        ]
+
+    @staticmethod
+    def uses_native_index():
+        return connection.vendor == 'postgresql'
+
+    @classmethod
+    def reindex(cls, poll, created=False):
+        if cls.uses_native_index():
+            return
+        if not created:
+            cls.objects.filter(poll=poll).delete()
+        cls.objects.bulk_create(
+            cls(poll=poll, trigram=trigram) for trigram in name_trigrams(poll.name)
+        )
+
+
 class PollOption(models.Model):
     poll = models.ForeignKey(QuickPoll, on_delete=models.CASCADE, related_name='options')
     text = models.CharField(max_length=100)
@@ -62,6 +152,34 @@ class PollOption(models.Model):
     def __str__(self):
         return f"{self.text} ({self.vote_count} votes)"
     
+class PollOptionArchive(models.Model):
+    """
+    Compact stand-in for the votes of an option on a compacted poll.
+
+    vote_count is the number of votes that were stored; voters_blob is an
+    optional zlib-compressed JSON list of [name, voted_at] pairs in vote
+    order.
+    """
+    option = models.OneToOneField(PollOption, on_delete=models.CASCADE, related_name='archive')
+    vote_count = models.PositiveIntegerField()
+    voters_blob = models.BinaryField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def pack_voters(voters):
+        return zlib.compress(json.dumps(voters, separators=(',', ':')).encode())
+
+    @staticmethod
+    def unpack_voters(blob):
+        """[[name, voted_at], ...] from a stored blob; [] when none was kept."""
+        if not blob:
+            return []
+        return json.loads(zlib.decompress(bytes(blob)))
+
+    def __str__(self):
+        return f"{self.option.text} ({self.vote_count} archived votes)"
+
+
 class PollVote(models.Model):
     poll = models.ForeignKey('QuickPoll', on_delete=models.CASCADE, related_name='votes')
     option = models.ForeignKey('PollOption', on_delete=models.CASCADE, related_name='votes')
@@ -70,11 +188,36 @@ class PollVote(models.Model):
 
     class Meta:
         unique_together = ('poll', 'student')  # ✅ one vote per student per poll
+        indexes = [
+            # Keyset pages of an option's voters
+            models.Index(fields=['option', 'id'], name='pollvote_option_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} → {self.option.text}"
 
 
+class PollVoteBucket(models.Model):
+    """
+    Votes a poll received in one fixed-width time bucket.
+
+    started_at is the bucket's start in epoch seconds, a multiple of
+    QUICKPOLLS['TIMELINE_BUCKET_SECONDS']. Rows are written by the vote
+    timeline (quickpolls.timeline), never per vote.
+    """
+    poll = models.ForeignKey(QuickPoll, on_delete=models.CASCADE, related_name='vote_buckets')
+    started_at = models.BigIntegerField()
+    votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['poll', 'started_at'], name='unique_vote_bucket_per_poll'),
+        ]
+
+    def __str__(self):
+        return f"{self.poll.code} @ {self.started_at}: {self.votes}"
+
+
 class Meta:
     unique_together = ('poll', 'student') # one vote per student per poll
     indexes = [
@@ -0,0 +1,129 @@
+"""
+Automatic closing of quick polls created with a duration.
+
+Deadlines live in a hashed timing wheel: AUTO_CLOSE_WHEEL_SLOTS buckets,
+one per AUTO_CLOSE_TICK_MS. Each tick looks only at the buckets it has
+passed, and every poll found due is closed with one bulk UPDATE.
+Deadlines more than one revolution away simply stay in their bucket
+until a later lap.
+
+The wheel is per process. It is rebuilt from QuickPoll.closes_at when it
+starts, so deadlines survive worker restarts. Every AUTO_CLOSE_SWEEP_SECONDS
+it also closes anything overdue in the database, which covers polls
+scheduled by another worker that has since gone away. Closing is
+idempotent, so several workers can safely race on the same poll.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from .constants import quickpoll_setting
+from .helpers import PollCloseHelper
+from .models import QuickPoll
+
+logger = logging.getLogger(__name__)
+
+
+class PollCloseScheduler:
+    """Timing wheel of poll deadlines, drained by a background thread."""
+
+    def __init__(self, tick_ms=1000, slots=60, sweep_seconds=60):
+        self.tick = tick_ms / 1000
+        self.slots = slots
+        self.sweep_seconds = sweep_seconds
+
+        self._lock = threading.Lock()
+        self._wheel = [dict() for _ in range(slots)]   # {poll_id: deadline timestamp}
+        self._last_tick = int(time.time() // self.tick)
+        self._last_sweep = time.time()
+        self._thread = None
+
+    def schedule(self, poll_id, closes_at):
+        deadline = closes_at.timestamp()
+        with self._lock:
+            # Overdue deadlines go in the next slot the wheel visits
+            tick = max(int(deadline // self.tick), self._last_tick)
+            self._wheel[tick % self.slots][poll_id] = deadline
+
+    def rehydrate(self):
+        """Schedule every open poll that has a deadline. Returns how many."""
+        pending = QuickPoll.objects.filter(is_active=True, closes_at__isnull=False)
+        count = 0
+        for poll_id, closes_at in pending.values_list('id', 'closes_at').iterator():
+            self.schedule(poll_id, closes_at)
+            count += 1
+        return count
+
+    def advance(self, now=None):
+        """Close the polls whose deadlines the wheel has passed. Returns their ids."""
+        now = time.time() if now is None else now
+        current = int(now // self.tick)
+        due = []
+        with self._lock:
+            # Visit each slot passed since the last tick, at most one full lap
+            first = max(self._last_tick, current - self.slots + 1)
+            for tick in range(first, current + 1):
+                bucket = self._wheel[tick % self.slots]
+                for poll_id, deadline in list(bucket.items()):
+                    if deadline <= now:
+                        due.append(poll_id)
+                        del bucket[poll_id]
+            self._last_tick = current
+        if not due:
+            return []
+        return PollCloseHelper.close_due(due, now=datetime.fromtimestamp(now, tz=timezone.utc))
+
+    # -------- background thread --------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='quickpoll-close-scheduler', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        hydrated = False
+        while True:
+            time.sleep(self.tick)
+            try:
+                if not hydrated:
+                    self.rehydrate()
+                    hydrated = True
+                self.advance()
+                if time.time() - self._last_sweep >= self.sweep_seconds:
+                    self._last_sweep = time.time()
+                    PollCloseHelper.close_due()
+            except Exception:
+                logger.exception("Quick poll auto-close failed; retrying next tick")
+            finally:
+                close_old_connections()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_close_scheduler():
+    """Return the process-wide scheduler (not started)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = PollCloseScheduler(
+                    tick_ms=quickpoll_setting('AUTO_CLOSE_TICK_MS'),
+                    slots=quickpoll_setting('AUTO_CLOSE_WHEEL_SLOTS'),
+                    sweep_seconds=quickpoll_setting('AUTO_CLOSE_SWEEP_SECONDS'),
+                )
+    return _scheduler
+
+
+def start_close_scheduler():
+    """Start closing polls; deadlines are rehydrated from the database first."""
+    scheduler = get_close_scheduler()
+    with _scheduler_lock:
+        scheduler.start()
+    return scheduler
@@ -1,7 +1,13 @@
 from rest_framework import serializers
+from django.contrib.auth import get_user_model
 from .models import QuickPoll, PollOption, PollVote
-from students.models import Student
+from students.helpers import StudentLookup
+from classes.models import Class
 from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+from .constants import quickpoll_setting
+from .helpers import PollCloseHelper
 
 
 class PollOptionSerializer(serializers.ModelSerializer):
@@ -13,23 +19,51 @@ class PollOptionSerializer(serializers.ModelSerializer):
 class QuickPollSerializer(serializers.ModelSerializer):
     options = PollOptionSerializer(many=True, read_only=True)
     creator = serializers.StringRelatedField(read_only=True)
+    class_id = serializers.PrimaryKeyRelatedField(
+        queryset=Class.objects.filter(active=True), source='classroom',
+        required=False, allow_null=True
+    )
+    # ✅ optional: close the poll automatically after this many seconds
+    duration_seconds = serializers.IntegerField(
+        write_only=True, required=False, min_value=1,
+        max_value=quickpoll_setting('MAX_POLL_DURATION_SECONDS')
+    )
 
     class Meta:
         model = QuickPoll
         fields = [
-            'id','name', 'code', 'creator', 'question_type', 'option_count',
-            'is_active', 'created_at', 'closed_at', 'options'
+            'id','name', 'code', 'creator', 'class_id', 'question_type', 'option_count',
+            'is_active', 'created_at', 'closed_at', 'closes_at', 'duration_seconds', 'options'
         ]
-        read_only_fields = ['code', 'created_at', 'closed_at', 'options']
+        read_only_fields = ['code', 'created_at', 'closed_at', 'closes_at', 'options']
+
+    def validate_class_id(self, classroom):
+        # ✅ only a class's own teacher can restrict a poll to it; a student
+        # token's id is a Student id and must never match a teacher's
+        user = self.context['request'].user
+        if classroom is not None and (
+            not isinstance(user, get_user_model()) or classroom.teacher_id != user.id
+        ):
+            raise serializers.ValidationError("You can only bind polls to your own classes.")
+        return classroom
 
     def create(self, validated_data):
         user = self.context['request'].user
-        if user.is_anonymous:  # ✅ allow anonymous poll creation
+        if not isinstance(user, get_user_model()):  # ✅ allow anonymous poll creation
             user = None
+        duration = validated_data.pop('duration_seconds', None)
+        if duration:
+            validated_data['closes_at'] = timezone.now() + timedelta(seconds=duration)
         poll = QuickPoll.objects.create(creator=user, **validated_data)
+        PollCloseHelper.schedule(poll)
         return poll
 
 
+class PollVoterSerializer(serializers.Serializer):
+    name = serializers.CharField(source='student__full_name')
+    voted_at = serializers.DateTimeField()
+
+
 # ✅ Updated VoteSerializer to support student info and unique voting
 class VoteSerializer(serializers.Serializer):
     option_id = serializers.IntegerField()
@@ -53,9 +87,8 @@ class VoteSerializer(serializers.Serializer):
             raise serializers.ValidationError('This poll is closed.')
 
         # ✅ Require the student to already exist
-        try:
-            student = Student.objects.get(email=student_email, full_name=student_name)
-        except Student.DoesNotExist:
+        student = StudentLookup.by_identity(student_name, student_email).order_by('id').first()
+        if student is None:
             raise serializers.ValidationError({
                 "detail": "Invalid name or email. Please use your registered student credentials."
             })
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from classes.constants import JoinCodePools
+from classes.models import JoinCode
+from .models import QuickPoll
+
+
+@receiver(post_delete, sender=QuickPoll)
+def release_poll_code(sender, instance, **kwargs):
+    """Deleting an open poll (directly or by cascade) frees its join code."""
+    if instance.is_active:
+        JoinCode.release(JoinCodePools.POLL, instance.code)
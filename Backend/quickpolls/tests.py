@@ -1,18 +1,1098 @@
+import asyncio
+import io
+import json
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
 from django.urls import reverse
-from rest_framework.test import APIClient
-from django.test import TestCase
-from students.models import Student
-from quickpolls.models import QuickPoll, PollOption, PollVote
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.db import IntegrityError
+from django.utils import timezone
+from classes.models import Class, JoinCode
+from courses.models import Course
+from students.authentication import StudentToken
+from students.enrollments import enrollment_cache
+from students.models import Student, StudentClassEnrollment
+from django.core.management import call_command
+from quickpolls.models import (
+    QuickPoll, PollNameTrigram, PollOption, PollOptionArchive, PollVote, PollVoteBucket,
+)
+from quickpolls.buffer import VoteBuffer, claim_journal
+from quickpolls.live import poll_events
+from quickpolls.voters import poll_voters
+from quickpolls.helpers import PollArchiveHelper, PollNameSearch, PollResultsCache, PollVoteHelper
+from quickpolls.scheduler import PollCloseScheduler
+from quickpolls.timeline import VoteTimeline, vote_timeline
+from quickpolls.views import PollsByNameView
+
+
+def vote_payload(option, student):
+    return {
+        'option_id': option.id,
+        'student_name': student.full_name,
+        'student_email': student.email,
+    }
+
 
 class VoteFlowTests(TestCase):
     def setUp(self):
         self.client = APIClient()
-        # create teacher/user, poll, options, and a student + token based on your auth scheme
-        # TODO: bootstrap StudentToken so client is authenticated as the student
+        self.poll = QuickPoll.objects.create(name='Warm-up', question_type='true_false')
+        self.option = self.poll.options.get(text='True')
+        self.student = Student.objects.create(full_name='Ada Lovelace', email='ada@example.com')
+        self.url = reverse('submit_vote', args=[self.poll.code])
 
     def test_student_can_vote_once(self):
-        # self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
-        # r = self.client.post(f'/api/quickpolls/{poll.code}/vote/', {'option_id': opt.id}, format='json')
-        # self.assertEqual(r.status_code, 200)
-        # self.assertEqual(PollVote.objects.filter(poll=poll, student=student).count(), 1)
-        pass
\ No newline at end of file
+        r = self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(PollVote.objects.filter(poll=self.poll, student=self.student).count(), 1)
+
+        r = self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(PollVote.objects.filter(poll=self.poll, student=self.student).count(), 1)
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.vote_count, 1)
+
+    def test_repeat_vote_skips_the_insert(self):
+        self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        with self.assertNumQueries(2):  # poll+option check, student lookup
+            r = self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 409)
+
+    def test_cold_voter_set_is_warmed_from_the_database(self):
+        PollVoteHelper.record_vote(self.poll.id, self.option.id, self.student.id)
+        poll_voters.drop(self.poll.code)     # e.g. another worker took the first vote
+        with self.assertNumQueries(3):  # poll+option check, student lookup, warm-up
+            r = self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 409)
+
+    def test_lookup_is_case_insensitive(self):
+        payload = vote_payload(self.option, self.student)
+        payload['student_email'] = 'ADA@example.com'
+        r = self.client.post(self.url, payload, format='json')
+        self.assertEqual(r.status_code, 200)
+
+    def test_option_from_another_poll_is_rejected(self):
+        other = QuickPoll.objects.create(name='Other', question_type='true_false')
+        r = self.client.post(self.url, vote_payload(other.options.first(), self.student), format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(PollVote.objects.exists())
+
+    def test_unknown_student_is_rejected(self):
+        payload = vote_payload(self.option, self.student)
+        payload['student_email'] = 'nobody@example.com'
+        r = self.client.post(self.url, payload, format='json')
+        self.assertEqual(r.status_code, 403)
+
+    def test_closed_poll_is_not_found(self):
+        self.poll.is_active = False
+        self.poll.save()
+        r = self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 404)
+
+    def test_vote_query_count(self):
+        # poll+option check, student lookup, insert, counter update
+        with self.assertNumQueries(6):  # + savepoint/release around the insert
+            r = self.client.post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 200)
+
+
+class PollCreationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_custom_poll_is_created_in_one_transaction(self):
+        # code claim, poll, options, name trigrams (SQLite only) + savepoint/release
+        with self.assertNumQueries(6):
+            poll = QuickPoll.objects.create(name='Ten', question_type='custom', option_count=10)
+        self.assertEqual(
+            list(poll.options.order_by('id').values_list('text', flat=True)),
+            [f'Option {i}' for i in range(1, 11)],
+        )
+
+    def test_close_does_not_probe_options(self):
+        poll = QuickPoll.objects.create(name='Closing', question_type='true_false')
+        # poll lookup, update, code release, recount, version re-read, final
+        # full and counts snapshots + savepoint/release around the close
+        with self.assertNumQueries(9):
+            r = APIClient().post(reverse('close_poll', args=[poll.code]))
+        self.assertEqual(r.status_code, 200)
+        poll.refresh_from_db()
+        self.assertFalse(poll.is_active)
+        self.assertIsNotNone(poll.closed_at)
+        self.assertEqual(poll.options.count(), 2)
+
+
+class ClassVoteTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pw')
+        course = Course.objects.create(name='Biology', teacher=self.teacher)
+        self.classroom = Class.objects.create(course=course, teacher=self.teacher)
+        self.poll = QuickPoll.objects.create(
+            name='In class', question_type='true_false', classroom=self.classroom
+        )
+        self.option = self.poll.options.get(text='True')
+        self.student = Student.objects.create(full_name='Ada Lovelace', email='ada@example.com')
+        self.url = reverse('submit_vote', args=[self.poll.code])
+        enrollment_cache.clear()
+
+    def token_client(self, classroom=None):
+        classroom = classroom or self.classroom
+        enrollment = StudentClassEnrollment.objects.create(student=self.student, classroom=classroom)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + StudentToken.generate_token(
+            self.student.id, classroom.id, enrollment.id
+        ))
+        return client
+
+    def test_enrolled_student_votes_with_token_only(self):
+        client = self.token_client()
+        enrollment_cache.get(StudentClassEnrollment.objects.get().id)   # warmed by earlier requests
+        # poll+option check, insert, counter update; membership is served from the cache
+        with self.assertNumQueries(5) as ctx:  # + savepoint/release around the insert
+            r = client.post(self.url, {'option_id': self.option.id}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'studentclassenrollment' in q['sql']])
+        self.assertTrue(PollVote.objects.filter(poll=self.poll, student=self.student).exists())
+
+        r = client.post(self.url, {'option_id': self.option.id}, format='json')
+        self.assertEqual(r.status_code, 409)
+
+    def test_bound_poll_rejects_name_and_email(self):
+        r = APIClient().post(self.url, vote_payload(self.option, self.student), format='json')
+        self.assertEqual(r.status_code, 403)
+        self.assertFalse(PollVote.objects.exists())
+
+    def test_repeat_tap_is_rejected_before_any_query(self):
+        client = self.token_client()
+        client.post(self.url, {'option_id': self.option.id}, format='json')
+        with self.assertNumQueries(0):
+            r = client.post(self.url, {'option_id': self.option.id}, format='json')
+        self.assertEqual(r.status_code, 409)
+
+    def test_token_for_another_class_is_rejected(self):
+        other_course = Course.objects.create(name='Chemistry', teacher=self.teacher)
+        other = Class.objects.create(course=other_course, teacher=self.teacher)
+        r = self.token_client(other).post(self.url, {'option_id': self.option.id}, format='json')
+        self.assertEqual(r.status_code, 403)
+
+    def test_cache_miss_reads_the_enrollment(self):
+        client = self.token_client()
+        StudentClassEnrollment.objects.all().delete()
+        enrollment_cache.clear()
+        r = client.post(self.url, {'option_id': self.option.id}, format='json')
+        self.assertEqual(r.status_code, 403)
+        self.assertFalse(PollVote.objects.exists())
+
+    def test_token_from_ended_class_is_rejected(self):
+        client = self.token_client()
+        self.classroom.active = False
+        self.classroom.save()
+        r = client.post(self.url, {'option_id': self.option.id}, format='json')
+        self.assertEqual(r.status_code, 403)
+
+    def test_only_the_class_teacher_can_bind_a_poll(self):
+        client = APIClient()
+        payload = {'name': 'Bound', 'question_type': 'true_false', 'class_id': self.classroom.id}
+        self.assertEqual(client.post(reverse('create_quickpoll'), payload, format='json').status_code, 400)
+
+        client.force_authenticate(self.teacher)
+        r = client.post(reverse('create_quickpoll'), payload, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['class_id'], self.classroom.id)
+
+    def test_student_token_cannot_bind_a_poll(self):
+        # The student's id equals the teacher's user id; it must not pass as them
+        self.student.delete()
+        self.student = Student.objects.create(id=self.teacher.id, full_name='Eve', email='eve@example.com')
+        payload = {'name': 'Bound', 'question_type': 'true_false', 'class_id': self.classroom.id}
+        r = self.token_client().post(reverse('create_quickpoll'), payload, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(QuickPoll.objects.filter(name='Bound').exists())
+
+
+class BatchVoteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.poll = QuickPoll.objects.create(name='Hub', question_type='yes_no_unsure')
+        self.yes, self.no, _unsure = self.poll.options.order_by('id')
+        self.students = [
+            Student.objects.create(full_name=f'Student {i}', email=f's{i}@example.com')
+            for i in range(40)
+        ]
+        self.url = reverse('submit_vote_batch', args=[self.poll.code])
+
+    def test_batch_is_stored_with_per_vote_statuses(self):
+        PollVoteHelper.record_vote(self.poll.id, self.no.id, self.students[0].id)
+        other = QuickPoll.objects.create(name='Other', question_type='true_false')
+        votes = [vote_payload(self.yes, student) for student in self.students]
+        votes += [
+            vote_payload(self.no, self.students[1]),            # repeated in the batch
+            vote_payload(other.options.first(), self.students[1]),
+            {'option_id': self.yes.id, 'student_name': 'Nobody', 'student_email': 'x@example.com'},
+            {'option_id': 'abc'},
+        ]
+
+        # poll, options, students, earlier votes, insert, read back, recount
+        with self.assertNumQueries(9):  # + savepoint/release around the batch
+            r = self.client.post(self.url, {'votes': votes}, format='json')
+        self.assertEqual(r.status_code, 200)
+        statuses = [item['status'] for item in r.json()['results']]
+        self.assertEqual(statuses[0], 'duplicate')
+        self.assertEqual(statuses[1:40], ['accepted'] * 39)
+        self.assertEqual(statuses[40:], ['duplicate', 'invalid', 'invalid', 'invalid'])
+        self.assertEqual(r.json()['accepted'], 39)
+
+        self.yes.refresh_from_db()
+        self.no.refresh_from_db()
+        self.assertEqual((self.yes.vote_count, self.no.vote_count), (39, 1))
+
+    def test_vote_that_races_in_is_reported_as_duplicate(self):
+        record_votes = PollVoteHelper.record_votes
+
+        def raced(poll_id, votes):
+            # Another request stores a vote for the second student after the batch checked
+            PollVoteHelper.record_vote(poll_id, self.no.id, self.students[1].id)
+            return record_votes(poll_id, votes)
+
+        votes = [vote_payload(self.yes, student) for student in self.students[:3]]
+        with mock.patch.object(PollVoteHelper, 'record_votes', side_effect=raced):
+            r = self.client.post(self.url, {'votes': votes}, format='json')
+        statuses = [item['status'] for item in r.json()['results']]
+        self.assertEqual(statuses, ['accepted', 'duplicate', 'accepted'])
+        self.assertEqual(r.json()['accepted'], 2)
+
+        self.yes.refresh_from_db()
+        self.no.refresh_from_db()
+        self.assertEqual((self.yes.vote_count, self.no.vote_count), (2, 1))
+
+    def test_batch_size_is_capped(self):
+        with self.settings(QUICKPOLLS={'BATCH_MAX_VOTES': 2}):
+            votes = [vote_payload(self.yes, student) for student in self.students[:3]]
+            r = self.client.post(self.url, {'votes': votes}, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(PollVote.objects.exists())
+
+    def test_class_poll_takes_enrolled_student_ids_from_its_teacher(self):
+        teacher = User.objects.create_user(username='teacher', password='pw')
+        classroom = Class.objects.create(
+            course=Course.objects.create(name='Biology', teacher=teacher), teacher=teacher
+        )
+        poll = QuickPoll.objects.create(name='Bound', question_type='true_false', classroom=classroom)
+        StudentClassEnrollment.objects.create(student=self.students[0], classroom=classroom)
+        option = poll.options.first()
+        url = reverse('submit_vote_batch', args=[poll.code])
+        votes = [
+            {'option_id': option.id, 'student_id': self.students[0].id},
+            {'option_id': option.id, 'student_id': self.students[1].id},
+        ]
+
+        self.assertEqual(self.client.post(url, {'votes': votes}, format='json').status_code, 403)
+
+        self.client.force_authenticate(teacher)
+        r = self.client.post(url, {'votes': votes}, format='json')
+        self.assertEqual([item['status'] for item in r.json()['results']], ['accepted', 'invalid'])
+
+
+class AutoCloseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def poll(self, name, seconds):
+        return QuickPoll.objects.create(
+            name=name, question_type='true_false', closes_at=self.now + timedelta(seconds=seconds)
+        )
+
+    def test_duration_sets_closes_at(self):
+        r = APIClient().post(
+            reverse('create_quickpoll'),
+            {'name': 'Timed', 'question_type': 'true_false', 'duration_seconds': 90},
+            format='json',
+        )
+        self.assertEqual(r.status_code, 201)
+        closes_at = QuickPoll.objects.get(pk=r.json()['id']).closes_at
+        self.assertAlmostEqual((closes_at - timezone.now()).total_seconds(), 90, delta=5)
+
+    def test_due_polls_close_with_one_update_per_tick(self):
+        scheduler = PollCloseScheduler(tick_ms=1000, slots=8)
+        due = [self.poll(f'Due {i}', 2) for i in range(3)]
+        later = self.poll('Later', 30)     # several laps of an 8-slot wheel away
+        for poll in due + [later]:
+            scheduler.schedule(poll.id, poll.closes_at)
+
+        self.assertEqual(scheduler.advance(self.now.timestamp()), [])
+        # find due, update, recount, reload, release codes, 2 snapshots for each of 3 polls
+        with self.assertNumQueries(11) as ctx:
+            closed = scheduler.advance(self.now.timestamp() + 3)
+        self.assertCountEqual(closed, [poll.id for poll in due])
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "quickpolls_quickpoll"')]
+        self.assertEqual(len(updates), 1)
+
+        for poll in due:
+            poll.refresh_from_db()
+            self.assertFalse(poll.is_active)
+            self.assertEqual(poll.closed_at, poll.closes_at)
+            with self.assertNumQueries(1):  # poll and version; the snapshot is frozen
+                self.assertEqual(APIClient().get(reverse('poll_results', args=[poll.code])).status_code, 200)
+            self.assertFalse(JoinCode.objects.get(pool='poll', code=poll.code).in_use)
+        later.refresh_from_db()
+        self.assertTrue(later.is_active)
+
+        self.assertEqual(scheduler.advance(self.now.timestamp() + 31), [later.id])
+
+    def test_restarted_scheduler_rehydrates_from_the_database(self):
+        overdue = self.poll('Overdue', -60)
+        pending = self.poll('Pending', 5)
+        QuickPoll.objects.create(name='Untimed', question_type='true_false')
+
+        scheduler = PollCloseScheduler(tick_ms=1000, slots=8)
+        self.assertEqual(scheduler.rehydrate(), 2)
+        self.assertEqual(scheduler.advance(self.now.timestamp()), [overdue.id])
+        self.assertEqual(scheduler.advance(self.now.timestamp() + 6), [pending.id])
+
+
+class VoteBufferTests(TestCase):
+    def setUp(self):
+        self.poll = QuickPoll.objects.create(name='Lecture', question_type='yes_no_unsure')
+        self.yes, self.no, _unsure = self.poll.options.order_by('id')
+        self.students = Student.objects.bulk_create(
+            Student(full_name=f'Student {i}', email=f's{i}@example.com') for i in range(6)
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.journal = Path(self.tmp.name) / 'votes.journal'
+
+    def make_buffer(self):
+        return VoteBuffer(self.journal, flush_interval_ms=10, max_votes=100, fsync=False)
+
+    def test_flush_writes_batch_and_counts(self):
+        buffer = self.make_buffer()
+        for i, student in enumerate(self.students):
+            option = self.yes if i % 3 else self.no
+            self.assertTrue(buffer.submit(self.poll.id, option.id, student.id))
+        self.assertFalse(PollVote.objects.exists())
+
+        # savepoint, option and student checks, bulk insert, read back, counter update, release
+        with self.assertNumQueries(7):
+            self.assertEqual(buffer.flush(), 6)
+
+        self.yes.refresh_from_db()
+        self.no.refresh_from_db()
+        self.assertEqual((self.yes.vote_count, self.no.vote_count), (4, 2))
+        self.assertFalse(self.journal.exists())
+
+    def test_duplicates_rejected_from_buffer_and_db(self):
+        buffer = self.make_buffer()
+        student = self.students[0]
+        self.assertTrue(buffer.submit(self.poll.id, self.yes.id, student.id))
+        self.assertFalse(buffer.submit(self.poll.id, self.no.id, student.id))
+        buffer.flush()
+        self.assertFalse(buffer.submit(self.poll.id, self.no.id, student.id))
+        self.assertEqual(PollVote.objects.get().option, self.yes)
+
+    def test_only_stored_votes_are_announced(self):
+        buffer = self.make_buffer()
+        buffer.submit(self.poll.id, self.yes.id, self.students[0].id)
+        buffer.submit(self.poll.id, self.yes.id, self.students[1].id)
+        # Another worker stores a vote for the first student before the flush
+        PollVote.objects.create(poll=self.poll, option=self.no, student=self.students[0])
+
+        with mock.patch('quickpolls.helpers.PollVoteHelper.announce') as announce:
+            buffer.flush()
+        announce.assert_called_once_with(self.poll.id, Counter({self.yes.id: 1}))
+        self.yes.refresh_from_db()
+        self.assertEqual(self.yes.vote_count, 1)
+
+    def test_vote_for_a_deleted_row_does_not_block_the_batch(self):
+        buffer = self.make_buffer()
+        gone = Student.objects.create(full_name='Gone', email='gone@example.com')
+        other_poll = QuickPoll.objects.create(name='Deleted', question_type='true_false')
+        buffer.submit(self.poll.id, self.yes.id, gone.id)
+        buffer.submit(other_poll.id, other_poll.options.first().id, self.students[0].id)
+        buffer.submit(self.poll.id, self.no.id, self.students[1].id)
+        gone.delete()
+        other_poll.delete()
+
+        with self.assertLogs('quickpolls.buffer', 'WARNING'):
+            buffer.flush()
+        self.assertEqual(list(PollVote.objects.values_list('student_id', flat=True)), [self.students[1].id])
+        self.assertEqual(buffer.flush(), 0)   # nothing was put back
+
+    def test_each_worker_claims_its_own_journal(self):
+        first, first_lock = claim_journal(self.journal)
+        self.addCleanup(first_lock.close)
+        second, second_lock = claim_journal(self.journal)
+        self.addCleanup(second_lock.close)
+        self.assertEqual(first, self.journal)
+        self.assertNotEqual(second, first)
+
+        first_lock.close()   # the worker holding slot 0 exits
+        again, again_lock = claim_journal(self.journal)
+        self.addCleanup(again_lock.close)
+        self.assertEqual(again, self.journal)
+
+    def test_startup_replays_every_slot_left_on_disk(self):
+        # Three workers of a larger deployment crashed with votes in their journals
+        for slot, student in zip((0, 5, 70), self.students):
+            path = self.journal.with_name(f'votes.{slot}.journal') if slot else self.journal
+            path.write_text(json.dumps([self.poll.id, self.yes.id, student.id]) + '\n')
+        # ...one of them mid-flush
+        self.journal.with_name('votes.5.journal').rename(self.journal.with_name('votes.5.journal.flushing'))
+        # A running worker holds its own slot and replays it itself
+        held = self.journal.with_name('votes.1.journal')
+        held.write_text(json.dumps([self.poll.id, self.no.id, self.students[3].id]) + '\n')
+        _path, lock_file = claim_journal(held, slots=1)
+        self.addCleanup(lock_file.close)
+
+        out = io.StringIO()
+        call_command('replay_vote_journals', journal=str(self.journal), stdout=out)
+        self.assertIn('Replayed 3 buffered vote(s).', out.getvalue())
+        self.assertEqual(
+            set(PollVote.objects.values_list('student_id', flat=True)),
+            {student.id for student in self.students[:3]},
+        )
+        self.assertTrue(held.exists())
+
+    def test_journal_is_replayed_after_crash(self):
+        crashed = self.make_buffer()
+        for student in self.students[:3]:
+            crashed.submit(self.poll.id, self.yes.id, student.id)
+        # A torn last line must not stop the replay.
+        with open(self.journal, 'a', encoding='utf-8') as journal:
+            journal.write(json.dumps([self.poll.id, self.no.id, self.students[3].id]) + '\n[1, 2')
+
+        restarted = self.make_buffer()
+        self.assertEqual(restarted.replay(), 4)
+        self.assertEqual(PollVote.objects.filter(poll=self.poll).count(), 4)
+        self.yes.refresh_from_db()
+        self.assertEqual(self.yes.vote_count, 3)
+
+        # Replaying the same votes again is harmless.
+        self.journal.write_text(json.dumps([self.poll.id, self.yes.id, self.students[0].id]) + '\n')
+        self.make_buffer().replay()
+        self.yes.refresh_from_db()
+        self.assertEqual(self.yes.vote_count, 3)
+
+
+class ResultsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.poll = QuickPoll.objects.create(name='Cached', question_type='true_false')
+        self.option = self.poll.options.get(text='True')
+        self.student = Student.objects.create(full_name='Ada Lovelace', email='ada@example.com')
+        self.url = reverse('poll_results', args=[self.poll.code])
+
+    def test_snapshot_is_reused_until_a_vote_lands(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['options'][0], {'text': 'True', 'count': 0, 'voters': []})
+        etag = first['ETag']
+
+        with self.assertNumQueries(1):
+            again = self.client.get(self.url)
+        self.assertEqual(again.content, first.content)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        self.client.post(
+            reverse('submit_vote', args=[self.poll.code]),
+            vote_payload(self.option, self.student),
+            format='json',
+        )
+        fresh = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+        self.assertEqual(fresh.json()['options'][0]['voters'], ['Ada Lovelace'])
+
+    def test_closed_poll_is_served_from_its_frozen_snapshot(self):
+        self.client.post(reverse('close_poll', args=[self.poll.code]))
+        with self.assertNumQueries(1):  # poll and version
+            frozen = self.client.get(self.url)
+        self.assertEqual(frozen.status_code, 200)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=frozen['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_vote_that_lands_after_the_close_is_served(self):
+        self.client.post(reverse('close_poll', args=[self.poll.code]))
+        frozen = self.client.get(self.url)
+        # A vote that passed its checks before the close commits after it
+        PollVoteHelper.record_vote(self.poll.id, self.option.id, self.student.id)
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH=frozen['ETag'])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()['options'][0]['count'], 1)
+
+    def test_unknown_poll_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('poll_results', args=['0000'])).status_code, 404)
+
+    def test_vote_does_not_write_the_poll_row(self):
+        with self.assertNumQueries(6) as ctx:
+            self.client.post(
+                reverse('submit_vote', args=[self.poll.code]),
+                vote_payload(self.option, self.student),
+                format='json',
+            )
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "quickpolls_quickpoll"')])
+        self.assertEqual(self.client.get(self.url).json()['options'][0]['count'], 1)
+
+    @override_settings(QUICKPOLLS={'FROZEN_RESULTS_SECONDS': 0})
+    def test_frozen_results_expire(self):
+        self.client.post(reverse('close_poll', args=[self.poll.code]))
+        with self.assertNumQueries(2):  # poll and version, then the rebuild
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_buffered_votes_are_in_the_frozen_results(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        buffer = VoteBuffer(Path(tmp.name) / 'votes.journal', fsync=False)
+        students = Student.objects.bulk_create(
+            Student(full_name=f'Student {i}', email=f's{i}@example.com') for i in range(3)
+        )
+        for student in students:
+            self.assertTrue(buffer.submit(self.poll.id, self.option.id, student.id))
+        # Cache the pre-flush snapshot
+        self.assertEqual(self.client.get(self.url).json()['options'][0]['count'], 0)
+
+        with override_settings(QUICKPOLLS={'VOTE_INGESTION': 'buffered'}), \
+                mock.patch('quickpolls.buffer._buffer', buffer):
+            self.client.post(reverse('close_poll', args=[self.poll.code]))
+
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.vote_count, 3)
+        self.assertEqual(self.client.get(self.url).json()['options'][0]['count'], 3)
+
+
+class ResultsViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.poll = QuickPoll.objects.create(name='Projector', question_type='true_false')
+        self.true, self.false = self.poll.options.order_by('id')
+        self.students = [
+            Student.objects.create(full_name=f'Student {i}', email=f's{i}@example.com')
+            for i in range(5)
+        ]
+        for student in self.students:
+            PollVoteHelper.record_vote(self.poll.id, self.true.id, student.id)
+
+    def test_counts_view_has_no_voter_names(self):
+        url = reverse('poll_results', args=[self.poll.code]) + '?view=counts'
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()['options'], [
+            {'id': self.true.id, 'text': 'True', 'count': 5},
+            {'id': self.false.id, 'text': 'False', 'count': 0},
+        ])
+        full = self.client.get(reverse('poll_results', args=[self.poll.code]))
+        self.assertNotEqual(r['ETag'], full['ETag'])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag']).status_code, 304)
+
+        self.client.post(reverse('close_poll', args=[self.poll.code]))
+        with self.assertNumQueries(1):  # poll and version; the snapshot is frozen
+            self.assertEqual(self.client.get(url).json()['options'][0]['count'], 5)
+
+    def test_unknown_view_is_rejected(self):
+        r = self.client.get(reverse('poll_results', args=[self.poll.code]) + '?view=everything')
+        self.assertEqual(r.status_code, 400)
+
+    def test_voters_are_paged_with_a_cursor(self):
+        url = reverse('option_voters', args=[self.poll.code, self.true.id]) + '?limit=2'
+        names = []
+        with self.assertNumQueries(2):   # option check, page
+            page = self.client.get(url).json()
+        while True:
+            names += [voter['name'] for voter in page['results']]
+            if not page['next']:
+                break
+            page = self.client.get(page['next']).json()
+        self.assertEqual(names, [student.full_name for student in self.students])
+
+    def test_voter_page_size_follows_settings(self):
+        url = reverse('option_voters', args=[self.poll.code, self.true.id])
+        with self.settings(QUICKPOLLS={'VOTERS_PAGE_SIZE': 2, 'VOTERS_MAX_PAGE_SIZE': 3}):
+            self.assertEqual(len(self.client.get(url).json()['results']), 2)
+            self.assertEqual(len(self.client.get(url + '?limit=5').json()['results']), 3)
+
+    def test_voters_of_another_polls_option_are_not_found(self):
+        other = QuickPoll.objects.create(name='Other', question_type='true_false')
+        url = reverse('option_voters', args=[other.code, self.true.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class VotesExportTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.poll = QuickPoll.objects.create(name='Export', question_type='true_false', creator=self.teacher)
+        self.true, self.false = self.poll.options.order_by('id')
+        self.students = [
+            Student.objects.create(full_name=f'Student {i}', email=f's{i}@example.com')
+            for i in range(3)
+        ]
+        for student in self.students:
+            PollVoteHelper.record_vote(self.poll.id, self.true.id, student.id)
+        self.url = reverse('poll_votes_export', args=[self.poll.code])
+
+    def test_csv_export_streams_every_vote(self):
+        r = self.client.get(self.url)
+        self.assertTrue(r.streaming)
+        self.assertEqual(r['Content-Type'], 'text/csv')
+        lines = b''.join(r.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,option_id,option_text,student_id,student_name,voted_at')
+        self.assertEqual(len(lines), 4)
+        self.assertIn('True,', lines[1])
+
+    def test_jsonl_export_is_one_object_per_line(self):
+        r = self.client.get(self.url + '?fmt=jsonl')
+        rows = [json.loads(line) for line in b''.join(r.streaming_content).decode().splitlines()]
+        self.assertEqual([row['student_name'] for row in rows], ['Student 0', 'Student 1', 'Student 2'])
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get(self.url + '?fmt=xml').status_code, 400)
+
+    def test_only_the_creator_or_class_teacher_can_export(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='pw'))
+        self.assertEqual(other.get(self.url).status_code, 403)
+
+        teacher = User.objects.create_user(username='class-teacher', password='pw')
+        self.poll.classroom = Class.objects.create(
+            course=Course.objects.create(name='Biology', teacher=teacher), teacher=teacher
+        )
+        self.poll.save()
+        other.force_authenticate(teacher)
+        self.assertEqual(other.get(self.url).status_code, 200)
+
+    def test_anonymous_poll_cannot_be_exported(self):
+        self.poll.creator = None
+        self.poll.save()
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 403)
+        self.assertEqual(
+            r.json(),
+            {'detail': 'This poll was created without an account, so its votes cannot be exported.'},
+        )
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        vote_timeline.flush()   # drop counts left over from other tests
+        self.client = APIClient()
+        self.poll = QuickPoll.objects.create(name='Sparkline', question_type='true_false')
+        self.true, self.false = self.poll.options.order_by('id')
+        self.students = [
+            Student.objects.create(full_name=f'Student {i}', email=f's{i}@example.com')
+            for i in range(4)
+        ]
+
+    def test_votes_show_up_on_the_timeline(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PollVoteHelper.record_vote(self.poll.id, self.true.id, self.students[0].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            PollVoteHelper.record_votes(
+                self.poll.id, [(self.false.id, student.id) for student in self.students[1:]]
+            )
+
+        url = reverse('poll_timeline', args=[self.poll.code]) + '?buckets=5'
+        body = self.client.get(url).json()
+        self.assertEqual(body['bucket_seconds'], 1)
+        self.assertEqual(sum(body['counts']), 4)
+
+        # Flushed counts read back the same, one row per bucket
+        vote_timeline.flush()
+        self.assertEqual(sum(PollVoteBucket.objects.filter(poll=self.poll).values_list('votes', flat=True)), 4)
+        with self.assertNumQueries(2):   # poll, buckets
+            self.assertEqual(sum(self.client.get(url).json()['counts']), 4)
+
+    def test_flushes_add_to_existing_buckets(self):
+        timeline = VoteTimeline(bucket_seconds=10)
+        timeline.record(self.poll.id, 2, at=100)
+        timeline.record(self.poll.id, 1, at=105)
+        timeline.record(self.poll.id, 4, at=112)
+        self.assertEqual(timeline.flush(), 2)
+        timeline.record(self.poll.id, 1, at=101)
+        timeline.flush()
+        timeline.record(self.poll.id, 5, at=130)   # still pending
+
+        self.assertEqual(
+            dict(PollVoteBucket.objects.filter(poll=self.poll).values_list('started_at', 'votes')),
+            {100: 4, 110: 4},
+        )
+        self.assertEqual(timeline.series(self.poll.id, 100, 130), [4, 4, 0, 5])
+
+    @override_settings(QUICKPOLLS={'TIMELINE_BUCKET_SECONDS': 10})
+    def test_bucket_width_follows_settings(self):
+        body = self.client.get(reverse('poll_timeline', args=[self.poll.code]) + '?buckets=3').json()
+        self.assertEqual(body['bucket_seconds'], 10)
+        self.assertEqual(body['start'] % 10, 0)
+
+    def test_counts_for_deleted_polls_are_dropped(self):
+        timeline = VoteTimeline()
+        timeline.record(self.poll.id, at=100)
+        poll_id = self.poll.id
+        self.poll.delete()
+        timeline.flush()
+        self.assertFalse(PollVoteBucket.objects.filter(poll_id=poll_id).exists())
+
+    def test_closed_poll_window_ends_when_it_closed(self):
+        closed_at = self.poll.created_at + timedelta(seconds=3)
+        QuickPoll.objects.filter(pk=self.poll.pk).update(is_active=False, closed_at=closed_at)
+        body = self.client.get(reverse('poll_timeline', args=[self.poll.code])).json()
+        self.assertEqual(body['start'], int(self.poll.created_at.timestamp()))
+        self.assertEqual(len(body['counts']), int(closed_at.timestamp()) - body['start'] + 1)
+
+    def test_bad_bucket_counts_are_rejected(self):
+        url = reverse('poll_timeline', args=[self.poll.code])
+        self.assertEqual(self.client.get(url + '?buckets=0').status_code, 400)
+        self.assertEqual(self.client.get(url + '?buckets=many').status_code, 400)
+        self.assertEqual(self.client.get(reverse('poll_timeline', args=['0000'])).status_code, 404)
+
+
+class CompactionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.poll = QuickPoll.objects.create(name='Archived', question_type='true_false')
+        self.true, self.false = self.poll.options.order_by('id')
+        self.names = [f'Student {i}' for i in range(5)]
+        for i, name in enumerate(self.names):
+            student = Student.objects.create(full_name=name, email=f's{i}@example.com')
+            PollVoteHelper.record_vote(self.poll.id, self.true.id, student.id)
+        self.client.post(reverse('close_poll', args=[self.poll.code]))
+        QuickPoll.objects.filter(pk=self.poll.pk).update(closed_at=timezone.now() - timedelta(days=40))
+
+    def results(self):
+        cache.clear()
+        return self.client.get(reverse('poll_results', args=[self.poll.code])).json()
+
+    def test_votes_are_folded_into_archives(self):
+        before = self.results()
+        PollOption.objects.filter(pk=self.true.pk).update(vote_count=99)   # drifted counter
+
+        out = io.StringIO()
+        call_command('compact_quickpolls', chunk_size=2, stdout=out)
+        self.assertIn('5 vote row(s) deleted, 1 drifted counter(s) corrected', out.getvalue())
+        self.assertFalse(PollVote.objects.filter(poll=self.poll).exists())
+        self.assertEqual(
+            dict(PollOptionArchive.objects.values_list('option_id', 'vote_count')),
+            {self.true.id: 5, self.false.id: 0},
+        )
+        self.true.refresh_from_db()
+        self.assertEqual(self.true.vote_count, 5)
+
+        self.assertEqual(self.results(), before)
+        r = self.client.get(reverse('polls_by_name', args=['Archived'])).json()
+        self.assertEqual(r['polls'][0]['results'][0]['voters'], self.names)
+        r = self.client.get(reverse('option_voters', args=[self.poll.code, self.true.id])).json()
+        self.assertEqual([voter['name'] for voter in r['results']], self.names)
+
+    def test_counts_only_archive_and_rerun(self):
+        PollArchiveHelper.compact(self.poll.id, keep_voters=False)
+        self.assertEqual(self.results()['options'][0], {'text': 'True', 'count': 5, 'voters': []})
+        self.assertEqual(PollArchiveHelper.compact(self.poll.id), {'deleted': 0, 'drifted': 0})
+        self.assertEqual(PollOptionArchive.objects.count(), 2)
+
+    def test_recent_and_open_polls_are_left_alone(self):
+        QuickPoll.objects.filter(pk=self.poll.pk).update(closed_at=timezone.now())
+        QuickPoll.objects.create(name='Open', question_type='true_false')
+        self.assertFalse(PollArchiveHelper.due_polls().exists())
+
+
+class ResultsByNameTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.students = Student.objects.bulk_create(
+            Student(full_name=f'Student {i}', email=f's{i}@example.com') for i in range(3)
+        )
+
+    def make_polls(self, count):
+        for _ in range(count):
+            poll = QuickPoll.objects.create(name='Chapter 1 check', question_type='custom', option_count=4)
+            first, second = poll.options.order_by('id')[:2]
+            PollVote.objects.create(poll=poll, option=first, student=self.students[0])
+            PollVote.objects.create(poll=poll, option=first, student=self.students[1])
+            PollVote.objects.create(poll=poll, option=second, student=self.students[2])
+
+    def search(self):
+        return self.client.get(reverse('polls_by_name', args=['chapter']))
+
+    def test_payload_groups_voters_per_option(self):
+        self.make_polls(1)
+        data = self.search().json()
+        self.assertEqual(data['search_query'], 'chapter')
+        poll = data['polls'][0]
+        self.assertEqual(poll['poll_name'], 'Chapter 1 check')
+        self.assertEqual([r['option'] for r in poll['results']], ['Option 1', 'Option 2', 'Option 3', 'Option 4'])
+        self.assertEqual(poll['results'][0]['voters'], ['Student 0', 'Student 1'])
+        self.assertEqual(poll['results'][1]['voters'], ['Student 2'])
+        self.assertEqual(poll['results'][3]['voters'], [])
+
+    def test_query_count_does_not_grow_with_polls(self):
+        # trigram probe, polls, options + voters
+        self.make_polls(2)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.search().json()['polls']), 2)
+        self.make_polls(10)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.search().json()['polls']), 12)
+
+    def test_no_match_returns_empty_list(self):
+        self.assertEqual(self.search().json(), {'polls': []})
+
+    def test_exact_name_view_query_count(self):
+        self.make_polls(5)
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=User.objects.create_user('teacher'))
+        with self.assertNumQueries(2):
+            response = PollsByNameView.as_view()(request, name='Chapter 1 check')
+        self.assertEqual(len(response.data['polls']), 5)
+        self.assertNotIn('poll_name', response.data['polls'][0])
+
+
+class PollNameSearchTests(TestCase):
+    def names(self, query, limit=50):
+        return list(PollNameSearch.search(query, limit).values_list('name', flat=True))
+
+    def test_trigrams_follow_renames(self):
+        poll = QuickPoll.objects.create(name='Abc', question_type='true_false')
+        self.assertEqual(set(poll.name_trigrams.values_list('trigram', flat=True)), {'abc'})
+        poll.name = 'Xyz!'
+        poll.save()
+        self.assertEqual(set(poll.name_trigrams.values_list('trigram', flat=True)), {'xyz', 'yz!'})
+
+        reloaded = QuickPoll.objects.get(pk=poll.pk)
+        reloaded.is_active = False
+        # update + code release; name unchanged, no reindex
+        with self.assertNumQueries(2):
+            reloaded.save()
+
+    def test_ranked_substring_matches(self):
+        for name in ['Week 2 photosynthesis', 'Photosynthesis', 'Photosynthesis recap', 'Cell division']:
+            QuickPoll.objects.create(name=name, question_type='true_false')
+        self.assertEqual(
+            self.names('photosynthesis'),
+            ['Photosynthesis', 'Photosynthesis recap', 'Week 2 photosynthesis'],
+        )
+        self.assertEqual(self.names('SYNTH', limit=2), ['Photosynthesis recap', 'Photosynthesis'])
+        self.assertEqual(self.names('mitosis'), [])
+
+    def test_trigrams_must_be_contiguous(self):
+        # Shares every trigram of "abcd" but does not contain it
+        QuickPoll.objects.create(name='abc bcd', question_type='true_false')
+        self.assertEqual(self.names('abcd'), [])
+
+    def test_short_query_falls_back_to_scan(self):
+        QuickPoll.objects.create(name='Q1 warm-up', question_type='true_false')
+        self.assertEqual(self.names('q1'), ['Q1 warm-up'])
+
+    def test_endpoint_caps_results(self):
+        for i in range(5):
+            QuickPoll.objects.create(name=f'Quiz {i}', question_type='true_false')
+        url = reverse('polls_by_name', args=['quiz'])
+        self.assertEqual(len(APIClient().get(url, {'limit': 3}).json()['polls']), 3)
+        with override_settings(QUICKPOLLS={'SEARCH_RESULT_LIMIT': 2}):
+            self.assertEqual(len(APIClient().get(url, {'limit': 10}).json()['polls']), 2)
+
+
+@override_settings(QUICKPOLLS={'STREAM_PUSH_INTERVAL_MS': 50})
+class ResultsStreamTests(TestCase):
+    def setUp(self):
+        self.poll = QuickPoll.objects.create(name='Live', question_type='true_false')
+        self.true, self.false = self.poll.options.order_by('id')
+        self.url = reverse('poll_results_stream', args=[self.poll.code])
+
+    @staticmethod
+    def parse(chunk):
+        event, data = chunk.decode().strip().split('\n')
+        return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_stream_sends_snapshot_coalesced_deltas_and_close(self):
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        event, data = self.parse(await anext(events))
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual([o['count'] for o in data['options']], [0, 0])
+
+        # Three votes in quick succession arrive as a single push.
+        poll_events.publish(self.poll.id, {self.true.id: 1})
+        poll_events.publish(self.poll.id, {self.true.id: 1})
+        poll_events.publish(self.poll.id, {self.false.id: 1})
+        event, data = self.parse(await anext(events))
+        self.assertEqual(event, 'votes')
+        self.assertEqual(data['deltas'], {str(self.true.id): 2, str(self.false.id): 1})
+
+        poll_events.close(self.poll.id)
+        event, _data = self.parse(await anext(events))
+        self.assertEqual(event, 'closed')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    async def test_unknown_poll_is_not_found(self):
+        response = await AsyncClient().get(reverse('poll_results_stream', args=['0000']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_request_is_refused(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 501)
+
+    def test_dead_subscriber_does_not_fail_the_vote(self):
+        loop = asyncio.new_event_loop()
+        loop.close()
+        subscription = poll_events.subscribe(self.poll.id, loop)
+        self.addCleanup(poll_events.unsubscribe, subscription)
+        student = Student.objects.create(full_name='Ada Lovelace', email='ada@example.com')
+
+        with self.assertLogs('quickpolls.live', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            r = APIClient().post(
+                reverse('submit_vote', args=[self.poll.code]),
+                vote_payload(self.true, student),
+                format='json',
+            )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(poll_events._listeners(self.poll.id), [])
+
+    def test_committed_vote_is_published(self):
+        student = Student.objects.create(full_name='Ada Lovelace', email='ada@example.com')
+        published = []
+        original = poll_events.publish
+        poll_events.publish = lambda poll_id, deltas: published.append((poll_id, deltas))
+        self.addCleanup(setattr, poll_events, 'publish', original)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            APIClient().post(
+                reverse('submit_vote', args=[self.poll.code]),
+                vote_payload(self.true, student),
+                format='json',
+            )
+        self.assertEqual(published, [(self.poll.id, {self.true.id: 1})])
+
+
+class JoinCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def poll_codes(self):
+        return JoinCode.objects.filter(pool='poll')
+
+    def test_open_polls_get_distinct_claimed_codes(self):
+        codes = [
+            QuickPoll.objects.create(name=f'Poll {i}', question_type='true_false').code
+            for i in range(50)
+        ]
+        self.assertEqual(len(set(codes)), 50)
+        self.assertTrue(all(len(code) == 4 for code in codes))
+        self.assertEqual(self.poll_codes().filter(code__in=codes, in_use=True).count(), 50)
+
+    def test_closed_poll_code_is_reused_after_cool_down(self):
+        old = QuickPoll.objects.create(name='Monday', question_type='true_false')
+        self.client.post(reverse('close_poll', args=[old.code]))
+        released = self.poll_codes().get(code=old.code)
+        self.assertFalse(released.in_use)
+        self.assertGreater(released.available_at, timezone.now())
+
+        # Leave the released code as the only one in the pool
+        self.poll_codes().exclude(code=old.code).update(in_use=True)
+        with self.settings(JOIN_CODES={'MAX_LENGTH': 4}):
+            with self.assertRaises(IntegrityError):
+                QuickPoll.objects.create(name='Too soon', question_type='true_false')
+
+            released.available_at = timezone.now()
+            released.save()
+            new = QuickPoll.objects.create(name='Tuesday', question_type='yes_no_unsure')
+        self.assertEqual(new.code, old.code)
+
+        r = self.client.get(reverse('poll_results', args=[new.code]))
+        self.assertEqual(r.json()['name'], 'Tuesday')
+
+    def test_seeded_codes_of_closed_polls_cool_down(self):
+        seed_pool = import_module('classes.migrations.0005_join_codes').seed_pool
+        self.poll_codes().delete()
+        seed_pool(JoinCode, 'poll', in_use=['1234'], released=['1234', '5678'])
+
+        self.assertTrue(self.poll_codes().get(code='1234').in_use)
+        closed = self.poll_codes().get(code='5678')
+        self.assertFalse(closed.in_use)
+        self.assertGreater(closed.available_at, timezone.now() + timedelta(hours=23))
+        self.assertIsNone(self.poll_codes().get(code='4321').available_at)
+
+    def test_pool_widens_when_every_code_is_taken(self):
+        self.poll_codes().update(in_use=True)
+        poll = QuickPoll.objects.create(name='Big day', question_type='true_false')
+        self.assertEqual(len(poll.code), 5)
+
+    def test_code_held_outside_the_pool_is_skipped(self):
+        nxt = self.poll_codes().filter(in_use=False).order_by('position').first()
+        QuickPoll.objects.create(name='Imported', question_type='true_false', code=nxt.code)
+
+        poll = QuickPoll.objects.create(name='Fresh', question_type='true_false')
+        self.assertNotEqual(poll.code, nxt.code)
+        nxt.refresh_from_db()
+        self.assertTrue(nxt.in_use)
+
+
+class VoteBurstTests(TransactionTestCase):
+    """
+    500 students voting at once must produce exact counts. On SQLite the
+    writers queue for the IMMEDIATE write lock on the file-based test
+    database. `manage.py benchmark_votes` reports the burst's latency.
+    """
+
+    VOTERS = 500
+    WORKERS = 16
+
+    def setUp(self):
+        self.poll = QuickPoll.objects.create(
+            name='Burst', question_type='custom', option_count=4
+        )
+        self.options = list(self.poll.options.order_by('id'))
+        self.students = Student.objects.bulk_create(
+            Student(full_name=f'Student {i}', email=f's{i}@example.com')
+            for i in range(self.VOTERS)
+        )
+        self.url = reverse('submit_vote', args=[self.poll.code])
+
+    def _vote(self, index):
+        client = APIClient()
+        payload = vote_payload(self.options[index % len(self.options)], self.students[index])
+        try:
+            r = client.post(self.url, payload, format='json')
+            # Every student taps twice; the second tap must be rejected.
+            duplicate = client.post(self.url, payload, format='json')
+            return r.status_code, duplicate.status_code
+        finally:
+            connections.close_all()
+
+    def test_burst_counts_are_exact(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            results = list(pool.map(self._vote, range(self.VOTERS)))
+
+        self.assertEqual([r[0] for r in results], [200] * self.VOTERS)
+        self.assertEqual([r[1] for r in results], [409] * self.VOTERS)
+        self.assertEqual(PollVote.objects.filter(poll=self.poll).count(), self.VOTERS)
+
+        expected = self.VOTERS // len(self.options)
+        for option in PollOption.objects.filter(poll=self.poll):
+            self.assertEqual(option.vote_count, expected)
+            self.assertEqual(option.votes.count(), expected)
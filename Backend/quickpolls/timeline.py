@@ -0,0 +1,146 @@
+"""
+Votes-per-bucket counters for live poll charts.
+
+The vote paths call record() once a vote is stored. Counts accumulate in
+memory per (poll, bucket), where a bucket is TIMELINE_BUCKET_SECONDS wide,
+and a background thread adds them to PollVoteBucket every
+TIMELINE_FLUSH_MS with one upsert. Reading a series therefore costs one
+row per bucket, however many votes the poll has.
+
+Counts this process has not flushed yet are merged into reads, so the
+worker that took the votes sees them at once. Other workers see them
+after the next flush.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .constants import quickpoll_setting
+from .models import PollVoteBucket, QuickPoll
+
+logger = logging.getLogger(__name__)
+
+
+class VoteTimeline:
+    """Pending per-bucket vote counts, flushed to PollVoteBucket in batches."""
+
+    def __init__(self, bucket_seconds=None, flush_interval_ms=None):
+        # None means the QUICKPOLLS setting, read each time it is needed
+        self._bucket_seconds = bucket_seconds
+        self._flush_interval_ms = flush_interval_ms
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = Counter()     # {(poll_id, bucket_start): votes}
+        self._flushing = Counter()    # taken by a flush that has not finished
+        self._thread = None
+
+    @property
+    def bucket_seconds(self):
+        if self._bucket_seconds is not None:
+            return self._bucket_seconds
+        return quickpoll_setting('TIMELINE_BUCKET_SECONDS')
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval_ms is not None:
+            return self._flush_interval_ms / 1000
+        return quickpoll_setting('TIMELINE_FLUSH_MS') / 1000
+
+    def bucket(self, at=None):
+        """Epoch second at which the bucket holding `at` starts."""
+        at = time.time() if at is None else at
+        return int(at // self.bucket_seconds) * self.bucket_seconds
+
+    def record(self, poll_id, votes=1, at=None):
+        with self._lock:
+            self._pending[(poll_id, self.bucket(at))] += votes
+
+    def pending(self, poll_id):
+        """{bucket_start: votes} recorded here but not yet in the database."""
+        counts = Counter()
+        with self._lock:
+            for source in (self._pending, self._flushing):
+                for (pending_poll, started_at), votes in source.items():
+                    if pending_poll == poll_id:
+                        counts[started_at] += votes
+        return counts
+
+    def flush(self):
+        """Add everything pending to PollVoteBucket. Returns the rows written."""
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, Counter()
+                batch = list(self._flushing.items())
+            if not batch:
+                return 0
+            try:
+                self._upsert(batch)
+            except Exception:
+                # Keep the counts for the next attempt
+                with self._lock:
+                    self._pending.update(self._flushing)
+                    self._flushing = Counter()
+                raise
+            with self._lock:
+                self._flushing = Counter()
+            return len(batch)
+
+    @staticmethod
+    def _upsert(batch):
+        table = connection.ops.quote_name(PollVoteBucket._meta.db_table)
+        polls = connection.ops.quote_name(QuickPoll._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Counts for a poll deleted since the vote are dropped
+            cursor.executemany(
+                f"""
+                INSERT INTO {table} (poll_id, started_at, votes)
+                SELECT %s, %s, %s WHERE EXISTS (SELECT 1 FROM {polls} WHERE id = %s)
+                ON CONFLICT (poll_id, started_at)
+                DO UPDATE SET votes = {table}.votes + excluded.votes
+                """,
+                [
+                    (poll_id, started_at, votes, poll_id)
+                    for (poll_id, started_at), votes in batch
+                ],
+            )
+
+    def series(self, poll_id, first, last):
+        """Vote counts for every bucket from `first` to `last` (epoch seconds)."""
+        counts = Counter(dict(
+            PollVoteBucket.objects.filter(
+                poll_id=poll_id, started_at__gte=first, started_at__lte=last
+            ).values_list('started_at', 'votes')
+        ))
+        counts.update({
+            started_at: votes for started_at, votes in self.pending(poll_id).items()
+            if first <= started_at <= last
+        })
+        return [counts[started_at] for started_at in range(first, last + 1, self.bucket_seconds)]
+
+    # -------- background thread --------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='quickpoll-vote-timeline', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Quick poll timeline flush failed; retrying next tick")
+            finally:
+                close_old_connections()
+
+
+vote_timeline = VoteTimeline()
@@ -2,17 +2,27 @@ from django.urls import path
 from .views import (
     CreateQuickPollView,
     SubmitVoteView,
+    SubmitVoteBatchView,
     PollResultsView,
     ClosePollView,
+    OptionVotersView,
+    PollTimelineView,
+    PollVotesExportView,
     PollsByNameView,
     PollResultsByNameView,
     get_poll_details,
+    poll_results_stream,
 )
 
 urlpatterns = [
     path('create/', CreateQuickPollView.as_view(), name='create_quickpoll'),
     path('<str:code>/vote/', SubmitVoteView.as_view(), name='submit_vote'),
+    path('<str:code>/votes/batch/', SubmitVoteBatchView.as_view(), name='submit_vote_batch'),
     path('<str:code>/results/', PollResultsView.as_view(), name='poll_results'),
+    path('<str:code>/results/stream/', poll_results_stream, name='poll_results_stream'),
+    path('<str:code>/options/<int:option_id>/voters/', OptionVotersView.as_view(), name='option_voters'),
+    path('<str:code>/timeline/', PollTimelineView.as_view(), name='poll_timeline'),
+    path('<str:code>/votes/export/', PollVotesExportView.as_view(), name='poll_votes_export'),
     path('<str:code>/close/', ClosePollView.as_view(), name='close_poll'),
     path("name/<str:name>/", PollResultsByNameView.as_view(), name="polls_by_name"), 
     path('<str:code>/', get_poll_details, name='poll_details'),
@@ -6,14 +6,26 @@ from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import F
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import F, Exists, OuterRef, Q
+from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from .models import QuickPoll, PollOption,PollVote
+from django.utils import timezone
+from .models import QuickPoll, PollOption, PollOptionArchive, PollVote
 from .serializers import QuickPollSerializer, PollOptionSerializer
-from students.authentication import StudentAuthentication
+from students.authentication import StudentClaims, StudentClaimsAuthentication
 from rest_framework.permissions import IsAuthenticated
-from .serializers import VoteSerializer
+from .serializers import PollVoterSerializer, VoteSerializer
+from rest_framework.pagination import CursorPagination
+from .helpers import (
+    PollCloseHelper, PollNameSearch, PollResultsCache, PollResultsHelper, PollVoteHelper,
+)
+from .live import result_events
+from .timeline import vote_timeline
+from .voters import poll_voters
+from .constants import BatchVoteStatus, ResultsViews, quickpoll_setting
 
 
 
@@ -26,114 +38,445 @@ class CreateQuickPollView(generics.CreateAPIView):
 
 
 from rest_framework.permissions import AllowAny
-from students.models import Student
+from students.constants import ExportFormats
+from students.helpers import StreamingExport, StudentLookup
+from students.models import Student, StudentClassEnrollment
 
 class SubmitVoteView(APIView):
+    """
+    Cast a vote. Students holding a class token are identified by its
+    claims alone; everyone else gives their registered name and email.
+    Polls bound to a class only take votes from its enrolled students.
+    """
+    authentication_classes = [StudentClaimsAuthentication]
     permission_classes = [AllowAny]
 
     def post(self, request, code):
-        try:
-            poll = QuickPoll.objects.get(code=code, is_active=True)
-        except QuickPoll.DoesNotExist:
-            return Response({"error": "Poll not found."}, status=404)
-
+        claims = request.user if isinstance(request.user, StudentClaims) else None
         option_id      = request.data.get("option_id")
         student_name   = (request.data.get("student_name") or "").strip()
         student_email  = (request.data.get("student_email") or "").strip()
 
-        if not option_id or not student_name or not student_email:
+        if claims is None and (not option_id or not student_name or not student_email):
             return Response(
                 {"detail": "Name, email and option are required."},
                 status=400,
             )
 
-        # 1️⃣ Find student by email (and optionally name)
-        student = Student.objects.filter(
-            email__iexact=student_email,
-            full_name__iexact=student_name,
-        ).order_by("id").first()
+        try:
+            option_id = int(option_id)
+        except (TypeError, ValueError):
+            return Response({"detail": "Invalid option."}, status=400)
 
-        if not student:
+        # 0️⃣ Repeat taps from token voters are answered from memory, before any query
+        if claims is not None and poll_voters.seen(code, claims.student_id):
             return Response(
-                {"detail": "You are not registered as a student."},
-                status=403,
+                {"error": "You have already voted in this poll."},
+                status=409,
             )
 
-        # 2️⃣ Check that option belongs to this poll
-        try:
-            option = poll.options.get(id=option_id)
-        except PollOption.DoesNotExist:
+        # 1️⃣ Find the active poll and check the option belongs to it (one query)
+        polls = (
+            QuickPoll.objects.filter(code=code, is_active=True)
+            .annotate(has_option=Exists(
+                PollOption.objects.filter(poll=OuterRef("pk"), id=option_id)
+            ))
+        )
+        poll = polls.values("id", "classroom_id", "has_option").first()
+        if poll is None:
+            return Response({"error": "Poll not found."}, status=404)
+
+        if claims is not None:
+            # 2️⃣ Token voters: membership comes from the claims and the enrollment cache
+            if poll["classroom_id"] not in (None, claims.class_id) or not claims.is_enrolled():
+                return Response(
+                    {"detail": "You are not enrolled in this poll's class."},
+                    status=403,
+                )
+            student_id = claims.student_id
+        elif poll["classroom_id"] is not None:
+            return Response(
+                {"detail": "Join the class to vote in this poll."},
+                status=403,
+            )
+        else:
+            # 2️⃣ Find student by email (and optionally name)
+            student_id = StudentLookup.by_identity(student_name, student_email).order_by(
+                "id"
+            ).values_list("id", flat=True).first()
+
+            if not student_id:
+                return Response(
+                    {"detail": "You are not registered as a student."},
+                    status=403,
+                )
+
+        if not poll["has_option"]:
             return Response({"detail": "Invalid option."}, status=400)
 
-        # 3️⃣ Prevent duplicate vote by *student*
-        if PollVote.objects.filter(poll=poll, student=student).exists():
+        if poll_voters.has_voted(code, poll["id"], student_id):
             return Response(
                 {"error": "You have already voted in this poll."},
                 status=409,
             )
 
-        # 4️⃣ Create the vote
-        PollVote.objects.create(
-            poll=poll,
-            option=option,
-            student=student,
+        # 3️⃣ Insert the vote; the unique constraint rejects a second vote
+        stored = PollVoteHelper.submit_vote(poll["id"], option_id, student_id)
+        poll_voters.add(code, poll["id"], student_id)
+        if not stored:
+            return Response(
+                {"error": "You have already voted in this poll."},
+                status=409,
+            )
+
+        return Response({"message": "Vote submitted successfully!"})
+
+
+class SubmitVoteBatchView(APIView):
+    """
+    Accept many votes for one poll in a single request, e.g. from a
+    classroom hub that collects answers before relaying them.
+
+    Votes look like the single vote body. For a poll bound to a class the
+    hub must be signed in as the class teacher and identifies students by
+    "student_id" instead of name and email. Every vote gets its own status,
+    in request order.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, code):
+        votes = request.data.get("votes")
+        max_votes = quickpoll_setting("BATCH_MAX_VOTES")
+        if not isinstance(votes, list) or not votes:
+            return Response({"detail": "A non-empty list of votes is required."}, status=400)
+        if len(votes) > max_votes:
+            return Response({"detail": f"At most {max_votes} votes can be sent at once."}, status=400)
+
+        poll = (
+            QuickPoll.objects.filter(code=code, is_active=True)
+            .values("id", "classroom_id", "classroom__teacher_id")
+            .first()
         )
+        if poll is None:
+            return Response({"error": "Poll not found."}, status=404)
 
-        # 5️⃣ Update the option vote count
-        option.vote_count = option.votes.count()
-        option.save()
+        bound = poll["classroom_id"] is not None
+        if bound and not (
+            isinstance(request.user, get_user_model())
+            and request.user.id == poll["classroom__teacher_id"]
+        ):
+            return Response(
+                {"detail": "Only the class teacher can submit votes for this poll."},
+                status=403,
+            )
 
+        # 1️⃣ Parse every vote; malformed ones are reported, not fatal
+        parsed = [self._parse(vote, bound) for vote in votes]
+        option_ids = {option_id for option_id, _key in filter(None, parsed)}
+        student_keys = {key for _option_id, key in filter(None, parsed)}
 
-        return Response({"message": "Vote submitted successfully!"})
+        # 2️⃣ One query each for the options, the students and their earlier votes
+        valid_options = set(
+            PollOption.objects.filter(poll_id=poll["id"], id__in=option_ids)
+            .values_list("id", flat=True)
+        )
+        students = self._resolve_students(poll, student_keys)
+        voted = set(
+            PollVote.objects.filter(poll_id=poll["id"], student_id__in=students.values())
+            .values_list("student_id", flat=True)
+        )
+
+        # 3️⃣ Decide each vote in request order
+        results, accepted = [], []
+        for index, item in enumerate(parsed):
+            result = {"index": index}
+            student_id = students.get(item[1]) if item else None
+            if item is None:
+                result.update(status=BatchVoteStatus.INVALID, detail="Option and student are required.")
+            elif item[0] not in valid_options:
+                result.update(status=BatchVoteStatus.INVALID, detail="Invalid option.")
+            elif student_id is None:
+                result.update(status=BatchVoteStatus.INVALID, detail=(
+                    "Student is not enrolled in this class." if bound
+                    else "You are not registered as a student."
+                ))
+            elif student_id in voted:
+                result.update(status=BatchVoteStatus.DUPLICATE)
+            else:
+                voted.add(student_id)
+                accepted.append((item[0], student_id))
+                result.update(status=BatchVoteStatus.ACCEPTED)
+            results.append(result)
+
+        # 4️⃣ One insert and one counter update for the whole batch
+        stored = PollVoteHelper.record_votes(poll["id"], accepted) if accepted else set()
+        for result, item in zip(results, parsed):
+            if result["status"] != BatchVoteStatus.ACCEPTED:
+                continue
+            student_id = students[item[1]]
+            if student_id in stored:
+                poll_voters.add(code, poll["id"], student_id)
+            else:
+                # Another vote for this student landed first
+                result["status"] = BatchVoteStatus.DUPLICATE
+
+        return Response({
+            "accepted": len(stored),
+            "results": results,
+        })
+
+    @staticmethod
+    def _parse(vote, bound):
+        """Return (option_id, student key) or None if the vote is malformed."""
+        if not isinstance(vote, dict):
+            return None
+        try:
+            option_id = int(vote.get("option_id"))
+            if bound:
+                return option_id, int(vote.get("student_id"))
+        except (TypeError, ValueError):
+            return None
+        name = Student.normalize(vote.get("student_name"))
+        email = Student.normalize(vote.get("student_email"))
+        if not name or not email:
+            return None
+        return option_id, (email, name)
+
+    @staticmethod
+    def _resolve_students(poll, keys):
+        """Map each student key of the batch to a student id with one query."""
+        if not keys:
+            return {}
+        if poll["classroom_id"] is not None:
+            enrolled = StudentClassEnrollment.objects.filter(
+                classroom_id=poll["classroom_id"], student_id__in=keys
+            ).values_list("student_id", flat=True)
+            return {student_id: student_id for student_id in enrolled}
+
+        match = Q()
+        for email, name in keys:
+            match |= Q(email_key=email, name_key=name)
+        students = {}
+        # Same rule as a single vote: the oldest matching student wins
+        for student_id, email, name in (
+            Student.objects.filter(match).order_by("-id").values_list("id", "email_key", "name_key")
+        ):
+            students[(email, name)] = student_id
+        return students
 
 
 class PollResultsView(generics.RetrieveAPIView):
     permission_classes = [AllowAny]
 
     def get(self, request, code):
-        try:
-            poll = QuickPoll.objects.get(code=code)
-        except QuickPoll.DoesNotExist:
+        # ?view=counts skips the voter names (projector screens)
+        view = request.query_params.get("view", ResultsViews.FULL)
+        if view not in ResultsViews.ALL:
+            return Response({"detail": f"view must be one of: {', '.join(ResultsViews.ALL)}."}, status=400)
+
+        # Codes are recycled; the newest poll holding one is the one asked for.
+        # Its stored version picks the snapshot, closed or not (one query)
+        poll = PollResultsCache.with_version(
+            QuickPoll.objects.filter(code=code).order_by("-created_at")
+            .only("id", "code", "name", "question_type")
+        ).first()
+        if poll is None:
             return Response({"error": "Poll not found."}, status=404)
 
-        options_data = []
-        for option in poll.options.all():
-            voters = option.votes.select_related('student').values_list('student__full_name', flat=True)
+        etag, body = PollResultsCache.snapshot(poll, view)
+        held = [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]
+        if etag in held:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+class PollVotersPagination(CursorPagination):
+    ordering = "id"     # vote order; stable while new votes are appended
+    page_size_query_param = "limit"
 
-            options_data.append({
-                "text": option.text,            # <-- frontend expects "text"
-                "count": option.vote_count,     # <-- frontend expects "count"
-                "voters": list(voters)
+    def get_page_size(self, request):
+        # Sizes are read per request so settings changes take effect
+        self.page_size = quickpoll_setting("VOTERS_PAGE_SIZE")
+        self.max_page_size = quickpoll_setting("VOTERS_MAX_PAGE_SIZE")
+        return super().get_page_size(request)
+
+
+class OptionVotersView(generics.ListAPIView):
+    """Voters of one option, oldest vote first, one cursor page at a time."""
+    permission_classes = [AllowAny]
+    serializer_class = PollVoterSerializer
+    pagination_class = PollVotersPagination
+
+    def get_queryset(self):
+        return PollVote.objects.filter(option_id=self.kwargs["option_id"]).values(
+            "id", "student__full_name", "voted_at"
+        )
+
+    def list(self, request, code, option_id):
+        option = PollOption.objects.filter(
+            id=option_id, poll=QuickPoll.objects.filter(code=code).order_by("-created_at")[:1]
+        ).values("archive__id", "archive__voters_blob").first()
+        if option is None:
+            return Response({"error": "Option not found."}, status=404)
+
+        if option["archive__id"] is not None:
+            # Compacted poll: the raw votes are gone, serve the archived list in one page
+            voters = PollOptionArchive.unpack_voters(option["archive__voters_blob"])
+            return Response({
+                "next": None,
+                "previous": None,
+                "results": [{"name": name, "voted_at": voted_at} for name, voted_at in voters],
             })
+        return super().list(request, code, option_id)
+
+
+class PollVotesExportView(APIView):
+    """
+    Every stored vote of a poll, streamed as CSV or JSON lines (?fmt=).
+    Only the poll's creator or the teacher of its class can export it, so
+    a poll created anonymously and not bound to a class has no export.
+    """
+    permission_classes = [IsAuthenticated]
+
+    COLUMNS = [
+        ("id", "id"),
+        ("option_id", "option_id"),
+        ("option_text", "option__text"),
+        ("student_id", "student_id"),
+        ("student_name", "student__full_name"),
+        ("voted_at", "voted_at"),
+    ]
+
+    def get(self, request, code):
+        fmt = request.query_params.get("fmt", ExportFormats.CSV)
+        if fmt not in ExportFormats.ALL:
+            return Response({"detail": f"fmt must be one of: {', '.join(ExportFormats.ALL)}."}, status=400)
+
+        poll = QuickPoll.objects.filter(code=code).order_by("-created_at").values(
+            "id", "creator_id", "classroom__teacher_id"
+        ).first()
+        if poll is None:
+            return Response({"error": "Poll not found."}, status=404)
+
+        if poll["creator_id"] is None and poll["classroom__teacher_id"] is None:
+            return Response(
+                {"detail": "This poll was created without an account, so its votes cannot be exported."},
+                status=403,
+            )
+        if not (
+            isinstance(request.user, get_user_model())
+            and request.user.id in (poll["creator_id"], poll["classroom__teacher_id"])
+        ):
+            return Response(
+                {"detail": "Only the poll's creator or class teacher can export its votes."},
+                status=403,
+            )
+
+        votes = PollVote.objects.filter(poll_id=poll["id"]).order_by("id")
+        return StreamingExport.response(votes, self.COLUMNS, fmt, f"poll-{code}-votes")
+
+
+class PollTimelineView(APIView):
+    """
+    Votes per bucket for a poll's sparkline, newest bucket last.
+
+    Reads one PollVoteBucket row per bucket, so the cost follows the
+    number of buckets asked for (?buckets=), not the number of votes.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, code):
+        # 1️⃣ How many points to return
+        try:
+            count = int(request.query_params.get("buckets", quickpoll_setting("TIMELINE_DEFAULT_BUCKETS")))
+        except ValueError:
+            return Response({"detail": "buckets must be an integer."}, status=400)
+        if not 1 <= count <= quickpoll_setting("TIMELINE_MAX_BUCKETS"):
+            return Response(
+                {"detail": f"buckets must be between 1 and {quickpoll_setting('TIMELINE_MAX_BUCKETS')}."},
+                status=400,
+            )
+
+        # 2️⃣ Newest poll holding the code
+        poll = QuickPoll.objects.filter(code=code).order_by("-created_at").values(
+            "id", "created_at", "closed_at", "is_active"
+        ).first()
+        if poll is None:
+            return Response({"error": "Poll not found."}, status=404)
+
+        # 3️⃣ Window ends now for open polls, at closing time otherwise
+        end = poll["closed_at"] if not poll["is_active"] and poll["closed_at"] else timezone.now()
+        last = vote_timeline.bucket(end.timestamp())
+        first = max(
+            vote_timeline.bucket(poll["created_at"].timestamp()),
+            last - (count - 1) * vote_timeline.bucket_seconds,
+        )
 
         return Response({
-            "poll_code": poll.code,
-            "name": poll.name,
-            "question_type": poll.question_type,
-            "options": options_data            # <-- IMPORTANT: frontend searches for "options"
+            "poll_code": code,
+            "is_active": poll["is_active"],
+            "bucket_seconds": vote_timeline.bucket_seconds,
+            "start": first,
+            "counts": vote_timeline.series(poll["id"], first, last),
         })
 
+
+async def poll_results_stream(request, code):
+    """
+    Server-sent events with live results for a poll.
+
+    Sends a "snapshot" event with the current counts, then "votes" events
+    carrying per-option deltas as votes land, and "closed" when the poll
+    is closed.
+    """
+    # Under WSGI the stream would pin a worker for as long as it stays open
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Live results need the ASGI server (classpoint_backend.asgi)."},
+            status=501,
+        )
+
+    poll = await QuickPoll.objects.filter(code=code).order_by("-created_at").values(
+        "id", "code", "name", "question_type", "is_active"
+    ).afirst()
+    if poll is None:
+        return JsonResponse({"error": "Poll not found."}, status=404)
+
+    async def load_snapshot():
+        options = [
+            {"id": option["id"], "text": option["text"], "count": option["vote_count"]}
+            async for option in PollOption.objects.filter(poll_id=poll["id"])
+            .order_by("id").values("id", "text", "vote_count")
+        ]
+        return {
+            "poll_code": poll["code"],
+            "name": poll["name"],
+            "question_type": poll["question_type"],
+            "is_active": poll["is_active"],
+            "options": options,
+        }
+
+    response = StreamingHttpResponse(
+        result_events(poll["id"], load_snapshot), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 class PollsByNameView(APIView):
     def get(self, request, name):
-        polls = QuickPoll.objects.filter(name=name)
-        if not polls.exists():
+        polls = list(
+            QuickPoll.objects.filter(name=name).values("id", "code", "name", "created_at")
+        )
+        if not polls:
             return Response({"error": "No polls found with that name."}, status=status.HTTP_404_NOT_FOUND)
 
-        all_results = []
-        for poll in polls:
-            poll_data = {
-                "poll_code": poll.code,
-                "created_at": poll.created_at,
-                "results": []
-            }
-            for option in poll.options.all():
-                voters = option.votes.select_related('student').values_list('student__full_name', flat=True)
-                poll_data["results"].append({
-                    "option": option.text,
-                    "vote_count": option.vote_count,
-                    "voters": list(voters),
-                })
-            all_results.append(poll_data)
+        all_results = PollResultsHelper.build_poll_list(polls, with_name=False)
 
         return Response({
             "poll_name": name,
@@ -147,9 +490,10 @@ class ClosePollView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, code):
-        poll = get_object_or_404(QuickPoll, code=code)
-        poll.is_active = False
-        poll.save()
+        poll = QuickPoll.objects.filter(code=code).order_by("-created_at").first()
+        if poll is None:
+            return Response({"error": "Poll not found."}, status=404)
+        PollCloseHelper.close(poll)
         return Response({"message": "Poll closed successfully."})
 
 
@@ -157,32 +501,22 @@ class PollResultsByNameView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, name):
-        # ✅ Case-insensitive and partial match
-        polls = QuickPoll.objects.filter(name__icontains=name).order_by('-created_at')
-        if not polls.exists():
+        # ✅ Case-insensitive and partial match, best matches first
+        max_results = quickpoll_setting("SEARCH_RESULT_LIMIT")
+        try:
+            limit = min(int(request.query_params.get("limit", max_results)), max_results)
+        except ValueError:
+            limit = max_results
+        polls = list(
+            PollNameSearch.search(name, max(limit, 1))
+            .values("id", "code", "name", "created_at")
+        )
+        if not polls:
             return Response({"polls": []}, status=status.HTTP_200_OK)
 
-        data = []
-        for poll in polls:
-            results = []
-            for option in poll.options.all():
-                voters = option.votes.select_related('student').values_list('student__full_name', flat=True)
-                results.append({
-                    "option": option.text,
-                    "vote_count": option.vote_count,
-                    "voters": list(voters),
-                })
-
-            data.append({
-                "poll_code": poll.code,
-                "poll_name": poll.name,  # ✅ include the actual name
-                "created_at": poll.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "results": results,
-            })
-
         return Response({
             "search_query": name,
-            "polls": data
+            "polls": PollResultsHelper.build_poll_list(polls, "%Y-%m-%d %H:%M:%S"),
         })
     
 
@@ -200,5 +534,6 @@ def get_poll_details(request, code):
         "poll_code": poll.code,
         "name": poll.name,
         "question_type": poll.question_type,
+        "class_id": poll.classroom_id,
         "options": list(options),
     })
@@ -0,0 +1,92 @@
+"""
+In-process record of who has voted in each open poll.
+
+Repeat taps are common on clicker-style polls. The voter set lets
+SubmitVoteView answer them with 409 before running a query (token voters)
+or before attempting the insert (name and email voters).
+
+Sets are keyed by join code, which is unique among open polls, so a
+lookup needs no query. Each entry also remembers its poll id so that a
+recycled code is never confused with the poll that held it before. An
+entry left idle for VOTER_SET_IDLE_SECONDS is dropped; keep that well
+below the join code cool-down. The (poll, student) unique constraint
+stays authoritative: a missing or partial set only costs a trip to the
+database.
+"""
+import threading
+import time
+
+from .constants import quickpoll_setting
+from .models import PollVote
+
+
+class _VoterSet:
+    __slots__ = ('poll_id', 'students', 'touched')
+
+    def __init__(self, poll_id, students=()):
+        self.poll_id = poll_id
+        self.students = set(students)
+        self.touched = time.monotonic()
+
+
+class PollVoterIndex:
+    """Student ids that already voted, per open poll in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._polls = {}    # {code: _VoterSet}
+
+    def _live(self, code):
+        # Caller holds the lock
+        entry = self._polls.get(code)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry.touched > quickpoll_setting('VOTER_SET_IDLE_SECONDS'):
+            del self._polls[code]
+            return None
+        entry.touched = now
+        return entry
+
+    def activate(self, code, poll_id):
+        """Start an empty set for a poll that was just created."""
+        with self._lock:
+            self._polls[code] = _VoterSet(poll_id)
+
+    def seen(self, code, student_id):
+        """True if the student is known to have voted. Never queries."""
+        with self._lock:
+            entry = self._live(code)
+            return entry is not None and student_id in entry.students
+
+    def has_voted(self, code, poll_id, student_id):
+        """Like seen(), but warms the set from PollVote first if it is cold."""
+        with self._lock:
+            entry = self._live(code)
+            if entry is not None and entry.poll_id == poll_id:
+                return student_id in entry.students
+
+        students = PollVote.objects.filter(poll_id=poll_id).values_list('student_id', flat=True)
+        entry = _VoterSet(poll_id, students)
+        with self._lock:
+            current = self._polls.get(code)
+            if current is not None and current.poll_id == poll_id:
+                current.students |= entry.students   # warmed concurrently
+                entry = current
+            else:
+                self._polls[code] = entry
+            return student_id in entry.students
+
+    def add(self, code, poll_id, student_id):
+        with self._lock:
+            entry = self._live(code)
+            if entry is not None and entry.poll_id == poll_id:
+                entry.students.add(student_id)
+
+    def drop(self, code):
+        """Forget a poll that has closed."""
+        with self._lock:
+            self._polls.pop(code, None)
+
+
+poll_voters = PollVoterIndex()
@@ -0,0 +1,127 @@
+"""
+Cached quiz lists for the student endpoints.
+
+When a teacher launches a quiz, every student in the room asks for the
+course's quiz list at once. The list is cached per course under a
+version that is bumped whenever a quiz in the course (or the course
+itself) changes, so a stale build can never overwrite a newer one.
+
+The version lives in the database (QuizListVersion) and is bumped in the
+transaction that changes the quiz, so every worker moves to the new list
+as soon as the change commits; reading it is one primary key lookup per
+request. The lists sit in the default cache, which is per process unless
+CACHES says otherwise.
+
+Concurrent misses are coalesced within a process: one request builds the
+list and the rest wait for its result. Each worker still builds its own.
+"""
+import threading
+
+from django.core.cache import cache
+from django.db.models import F
+
+from courses.models import Course
+
+from .constants import quiz_setting
+from .models import Quiz, QuizListVersion
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one build per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}    # {key: _Call}
+
+    def do(self, key, build):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = build()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class QuizListCache:
+    """Standalone quizzes of a course, as served to students."""
+
+    FIELDS = (
+        'id', 'title', 'quiz_type', 'properties', 'created_at',
+        'show_timer', 'auto_close_after_seconds',
+    )
+    flights = SingleFlight()
+
+    @staticmethod
+    def _version(course_id):
+        versions = QuizListVersion.objects.filter(course_id=course_id).values_list('version', flat=True)
+        version = versions.first()
+        if version is None:
+            # First list of this course: create the row later changes bump
+            QuizListVersion.objects.bulk_create(
+                [QuizListVersion(course_id=course_id)], ignore_conflicts=True
+            )
+            version = versions.first()
+        return version
+
+    @staticmethod
+    def get(course_id):
+        """{"course_name", "quizzes"} for a course, newest quiz first."""
+        key = f"quizzes:course:{course_id}:list:{QuizListCache._version(course_id)}"
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+
+        def build():
+            # Another flight may have filled it while this one queued
+            payload = cache.get(key)
+            if payload is None:
+                payload = QuizListCache.build(course_id)
+                cache.set(key, payload, quiz_setting('QUIZ_LIST_CACHE_SECONDS'))
+            return payload
+
+        return QuizListCache.flights.do(key, build)
+
+    @staticmethod
+    def build(course_id):
+        quizzes = list(
+            Quiz.objects.filter(course_id=course_id, multi_question_id__isnull=True)
+            .order_by('-created_at')
+            .values(*QuizListCache.FIELDS, course_name=F('course__name'))
+        )
+        if quizzes:
+            course_name = quizzes[0]['course_name']
+        else:
+            course_name = Course.objects.filter(id=course_id).values_list('name', flat=True).first()
+        for quiz in quizzes:
+            del quiz['course_name']
+        return {'course_name': course_name, 'quizzes': quizzes}
+
+    @staticmethod
+    def forget(*course_ids):
+        """Invalidate the cached lists of the given courses, in every worker."""
+        QuizListVersion.objects.filter(course_id__in=course_ids).update(version=F('version') + 1)
@@ -2,6 +2,8 @@
 Constants and configuration for quiz system.
 Centralizes magic numbers and configuration values.
 """
+from django.conf import settings
+
 
 # Quiz Type Codes
 class QuizTypeCodes:
@@ -108,3 +110,17 @@ class QuizConfig:
     # Competition mode
     COMPETITION_POINTS_MULTIPLIER = 2
     COMPETITION_TIME_BONUS = 0.1  # 10% bonus for speed
+
+
+# Defaults for settings.QUIZZES
+class QuizSettingDefaults:
+    QUIZ_LIST_CACHE_SECONDS = 300   # lifetime of a cached per-course quiz list
+    MULTI_QUIZ_PAGE_MAX = 100       # multi-quiz groups per page (?limit=)
+
+
+def quiz_setting(name):
+    """Read a quiz setting, falling back to QuizSettingDefaults."""
+    overrides = getattr(settings, 'QUIZZES', {})
+    if name in overrides:
+        return overrides[name]
+    return getattr(QuizSettingDefaults, name)
@@ -3,10 +3,15 @@ Helper functions and utilities for quiz operations.
 Provides clean separation of concerns and prevents code duplication.
 """
 from typing import Dict, List, Any, Optional
+from itertools import groupby
+import uuid
 from django.core.exceptions import ValidationError
 from django.db import models
+from rest_framework import exceptions
 import json
 
+from .constants import quiz_setting
+
 
 class QuizTypeValidator:
     """Validates quiz type specific requirements and constraints."""
@@ -189,3 +194,53 @@ class QuizStatisticsHelper:
             'highest_score': max(scores) if scores else 0,
             'lowest_score': min(scores) if scores else 0
         }
+
+
+class MultiQuizHelper:
+    """Lists multi-quiz groups with a single query."""
+
+    @staticmethod
+    def page_params(query_params):
+        """(limit, after) from ?limit= and ?after=; both optional."""
+        limit = query_params.get('limit')
+        after = query_params.get('after')
+        try:
+            limit = int(limit) if limit is not None else None
+            after = uuid.UUID(after) if after else None
+        except ValueError:
+            raise exceptions.ValidationError({'detail': 'limit must be an integer and after a multi-quiz id.'})
+        if limit is not None and not 1 <= limit <= quiz_setting('MULTI_QUIZ_PAGE_MAX'):
+            raise exceptions.ValidationError(
+                {'detail': f"limit must be between 1 and {quiz_setting('MULTI_QUIZ_PAGE_MAX')}."}
+            )
+        return limit, after
+
+    @staticmethod
+    def grouped(sources, limit=None, after=None):
+        """
+        Every question of the multi-quiz groups that `sources` (a Quiz
+        queryset) reaches, as ([(multi_question_id, [quiz, ...]), ...],
+        next_after). Groups come in multi_question_id order and questions
+        in question_order. With a limit, only that many groups after
+        `after` are returned and next_after is set when more remain.
+        """
+        group_ids = sources.filter(multi_question_id__isnull=False)
+        if after is not None:
+            group_ids = group_ids.filter(multi_question_id__gt=after)
+        group_ids = group_ids.order_by('multi_question_id').values('multi_question_id').distinct()
+        if limit is not None:
+            group_ids = group_ids[:limit + 1]   # one extra to know if there is a next page
+
+        quizzes = sources.model.objects.filter(multi_question_id__in=group_ids).order_by(
+            'multi_question_id', 'question_order'
+        )
+        groups = [
+            (multi_id, list(questions))
+            for multi_id, questions in groupby(quizzes, key=lambda quiz: quiz.multi_question_id)
+        ]
+
+        next_after = None
+        if limit is not None and len(groups) > limit:
+            groups = groups[:limit]
+            next_after = groups[-1][0]
+        return groups, next_after
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('quizzes', '0005_quiz_multi_question_id_quiz_question_order_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizListVersion',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='courses.course')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -138,3 +138,20 @@ class Quiz(models.Model):
 
     def __str__(self):
         return f"{self.title} ({self.quiz_type})"
+
+
+class QuizListVersion(models.Model):
+    """
+    Version of a course's cached student quiz list.
+
+    Kept in the database so a bump commits with the quiz change that caused
+    it and every worker sees it on its next request; the lists themselves
+    are cached per process under the version.
+    """
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, primary_key=True, related_name='+'
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.course_id} v{self.version}"
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.models import Course
+
+from .cache import QuizListCache
+from .models import Quiz
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def forget_course_quiz_list(sender, instance, **kwargs):
+    """Students see quiz changes on their next list request."""
+    QuizListCache.forget(instance.course_id)
+
+
+@receiver(post_save, sender=Course)
+def forget_renamed_course(sender, instance, created, **kwargs):
+    if not created:
+        QuizListCache.forget(instance.id)
@@ -0,0 +1,190 @@
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from classes.models import Class
+from courses.models import Course
+from quizzes.cache import QuizListCache
+from quizzes.models import Quiz
+from students.authentication import StudentUser
+from students.models import Student, StudentClassEnrollment
+
+
+class MultiQuizListTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.course = Course.objects.create(name='Biology', teacher=self.teacher)
+        self.classroom = Class.objects.create(course=self.course, teacher=self.teacher)
+        self.student = Student.objects.create(full_name='Ada Lovelace')
+        enrollment = StudentClassEnrollment.objects.create(student=self.student, classroom=self.classroom)
+        self.student_user = StudentUser(self.student, self.classroom, enrollment)
+
+        self.group_ids = sorted(uuid.uuid4() for _ in range(5))
+        for multi_id in self.group_ids:
+            self.add_group(multi_id, questions=3)
+        Quiz.objects.create(
+            course=self.course, title='Standalone', quiz_type='short_answer', created_by=self.teacher
+        )
+
+        self.client = APIClient()
+
+    def add_group(self, multi_id, questions):
+        for order in reversed(range(1, questions + 1)):
+            Quiz.objects.create(
+                course=self.course, title=f'Q{order}', quiz_type='short_answer',
+                created_by=self.teacher, multi_question_id=multi_id, question_order=order,
+            )
+
+    def test_teacher_list_is_one_query(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('multi_quiz_list')
+        with self.assertNumQueries(1):
+            body = self.client.get(url).json()
+        self.assertEqual(list(body), [str(multi_id) for multi_id in self.group_ids])
+        self.assertEqual([q['question_order'] for q in body[str(self.group_ids[0])]], [1, 2, 3])
+
+        # More groups, same number of queries
+        for _ in range(5):
+            self.add_group(uuid.uuid4(), questions=2)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get(url).json()), 10)
+
+    def test_student_list_is_one_query(self):
+        other = Course.objects.create(name='Chemistry', teacher=self.teacher)
+        Quiz.objects.create(
+            course=other, title='Hidden', quiz_type='short_answer', created_by=self.teacher,
+            multi_question_id=uuid.uuid4(), question_order=1,
+        )
+        self.client.force_authenticate(self.student_user)
+        with self.assertNumQueries(1):
+            body = self.client.get(reverse('student-multi-quiz-list')).json()
+        self.assertEqual(list(body), [str(multi_id) for multi_id in self.group_ids])
+
+    def test_keyset_pages_cover_every_group_once(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('multi_quiz_list')
+        seen, after = [], None
+        while True:
+            query = '?limit=2' + (f'&after={after}' if after else '')
+            with self.assertNumQueries(1):
+                r = self.client.get(url + query)
+            seen += list(r.json())
+            after = r.get('X-Next-Cursor')
+            if after is None:
+                break
+        self.assertEqual(seen, [str(multi_id) for multi_id in self.group_ids])
+
+    def test_bad_page_params_are_rejected(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('multi_quiz_list')
+        self.assertEqual(self.client.get(url + '?limit=0').status_code, 400)
+        self.assertEqual(self.client.get(url + '?after=nope').status_code, 400)
+
+    def test_student_questions_cost_is_flat_in_enrollments(self):
+        self.client.force_authenticate(self.student_user)
+        url = reverse('student-multi-quiz-questions', args=[self.group_ids[0]])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get(url).json()), 3)
+
+        for i in range(10):
+            course = Course.objects.create(name=f'Course {i}', teacher=self.teacher)
+            classroom = Class.objects.create(course=course, teacher=self.teacher)
+            StudentClassEnrollment.objects.create(student=self.student, classroom=classroom)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get(url).json()), 3)
+
+    def test_student_questions_hidden_outside_enrolled_courses(self):
+        other = Course.objects.create(name='Chemistry', teacher=self.teacher)
+        hidden = uuid.uuid4()
+        Quiz.objects.create(
+            course=other, title='Hidden', quiz_type='short_answer', created_by=self.teacher,
+            multi_question_id=hidden, question_order=1,
+        )
+        self.client.force_authenticate(self.student_user)
+        r = self.client.get(reverse('student-multi-quiz-questions', args=[hidden]))
+        self.assertEqual(r.status_code, 404)
+
+
+class QuizListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher')
+        self.course = Course.objects.create(name='Biology', teacher=self.teacher)
+        self.quiz = Quiz.objects.create(
+            course=self.course, title='Cells', quiz_type='short_answer', created_by=self.teacher
+        )
+
+    def titles(self):
+        return [quiz['title'] for quiz in QuizListCache.get(self.course.id)['quizzes']]
+
+    def test_list_is_built_once_then_served_from_cache(self):
+        with self.assertNumQueries(4):  # version, version row insert, version, list
+            self.assertEqual(self.titles(), ['Cells'])
+        with self.assertNumQueries(1):  # version
+            self.assertEqual(self.titles(), ['Cells'])
+
+    def test_concurrent_misses_share_one_build(self):
+        builds = []
+        result = {'course_name': 'Biology', 'quizzes': []}
+
+        def slow_build(course_id):
+            builds.append(course_id)
+            time.sleep(0.2)     # long enough for every other request to queue up
+            return result
+
+        start = threading.Barrier(300)
+        results = []
+
+        def request():
+            start.wait()
+            results.append(QuizListCache.get(self.course.id))
+
+        with mock.patch.object(QuizListCache, 'build', side_effect=slow_build), \
+                mock.patch.object(QuizListCache, '_version', return_value=0):
+            threads = [threading.Thread(target=request) for _ in range(300)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(builds, [self.course.id])
+        self.assertEqual(len(results), 300)
+        self.assertTrue(all(payload == result for payload in results))
+
+    def test_quiz_and_course_changes_invalidate_the_list(self):
+        self.assertEqual(self.titles(), ['Cells'])
+
+        Quiz.objects.create(course=self.course, title='Genes', quiz_type='short_answer', created_by=self.teacher)
+        self.assertEqual(self.titles(), ['Genes', 'Cells'])
+
+        self.quiz.title = 'Cell biology'
+        self.quiz.save()
+        self.assertEqual(self.titles(), ['Genes', 'Cell biology'])
+
+        self.quiz.delete()
+        self.assertEqual(self.titles(), ['Genes'])
+
+        self.course.name = 'Life sciences'
+        self.course.save()
+        self.assertEqual(QuizListCache.get(self.course.id)['course_name'], 'Life sciences')
+
+    def test_other_courses_keep_their_list(self):
+        other = Course.objects.create(name='Chemistry', teacher=self.teacher)
+        QuizListCache.get(other.id)
+        Quiz.objects.create(course=self.course, title='Genes', quiz_type='short_answer', created_by=self.teacher)
+        with self.assertNumQueries(1):  # version
+            QuizListCache.get(other.id)
+
+    def test_a_change_reaches_lists_cached_by_other_workers(self):
+        self.assertEqual(self.titles(), ['Cells'])
+        # Another worker saves a quiz: its cache is not ours, the version row is shared
+        with mock.patch('quizzes.cache.cache'):
+            Quiz.objects.create(course=self.course, title='Genes', quiz_type='short_answer', created_by=self.teacher)
+        self.assertEqual(self.titles(), ['Genes', 'Cells'])
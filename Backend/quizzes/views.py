@@ -6,6 +6,7 @@ from django.db.models import Count
 from .models import Quiz
 from .serializers import QuizSerializer, MultiQuizSerializer, MultiQuizListSerializer
 from .constants import QuizTypeCodes
+from .helpers import MultiQuizHelper
 import uuid
 
 
@@ -107,6 +108,17 @@ class CreateWordCloudQuizView(APIView):
 
 
 # Multi-Quiz Views
+def multi_quiz_response(groups, next_after):
+    """Grouped multi-quiz questions keyed by multi_question_id."""
+    response = Response({
+        str(multi_id): QuizSerializer(questions, many=True).data
+        for multi_id, questions in groups
+    })
+    if next_after is not None:
+        response['X-Next-Cursor'] = str(next_after)
+    return response
+
+
 class MultiQuizViewSet(viewsets.ViewSet):
     """ViewSet for managing multi-quiz operations"""
     permission_classes = [permissions.IsAuthenticated]
@@ -119,22 +131,16 @@ class MultiQuizViewSet(viewsets.ViewSet):
         )
     
     def list(self, request):
-        """List all multi-quiz grouped by multi_question_id"""
-        # Get all unique multi_question_ids for this teacher
-        multi_quiz_ids = Quiz.objects.filter(
-            created_by=request.user,
-            multi_question_id__isnull=False
-        ).values_list('multi_question_id', flat=True).distinct()
-        
-        # Build response with quizzes grouped by multi_question_id
-        result = {}
-        for multi_id in multi_quiz_ids:
-            quizzes = Quiz.objects.filter(multi_question_id=multi_id).order_by('question_order')
-            if quizzes.exists():
-                quiz_serializer = QuizSerializer(quizzes, many=True)
-                result[str(multi_id)] = quiz_serializer.data
-        
-        return Response(result)
+        """
+        List all multi-quiz grouped by multi_question_id, in one query.
+        Optional keyset pages: ?limit=<groups>&after=<multi_question_id>;
+        the X-Next-Cursor header carries the next page's "after".
+        """
+        limit, after = MultiQuizHelper.page_params(request.query_params)
+        groups, next_after = MultiQuizHelper.grouped(
+            Quiz.objects.filter(created_by=request.user), limit=limit, after=after
+        )
+        return multi_quiz_response(groups, next_after)
     
     def create(self, request):
         """Create a new multi-quiz with multiple questions"""
@@ -2,14 +2,23 @@
 Student authentication system for ClassPoint.
 Students get temporary tokens when they join a class.
 """
+import hashlib
 import jwt
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import timedelta
 from django.utils import timezone
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from .constants import student_setting
+from .enrollments import enrollment_cache
 from .models import Student, StudentClassEnrollment
 
 
@@ -34,94 +43,218 @@ class StudentToken:
         return token
     
     @staticmethod
-    def decode_token(token):
-        """Decode and validate a student token."""
+    def decode_claims(token):
+        """
+        Verify a student token's signature, expiry and type without touching
+        the database. Callers must check the enrollment themselves.
+        """
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            
-            # Validate token type
-            if payload.get('token_type') != 'student':
-                raise AuthenticationFailed('Invalid token type')
-            
-            # Check if enrollment still exists and is valid
-            enrollment_id = payload.get('enrollment_id')
-            if not enrollment_id:
-                raise AuthenticationFailed('Invalid token')
-            
-            enrollment = StudentClassEnrollment.objects.select_related(
-                'student', 'classroom'
-            ).get(id=enrollment_id)
-            
-            # Check if class is still active
-            if not enrollment.classroom.active:
-                raise AuthenticationFailed('Class is no longer active')
-            
-            return {
-                'student_id': payload['student_id'],
-                'class_id': payload['class_id'],
-                'enrollment_id': payload['enrollment_id'],
-                'student': enrollment.student,
-                'classroom': enrollment.classroom,
-                'enrollment': enrollment
-            }
-            
         except jwt.ExpiredSignatureError:
             raise AuthenticationFailed('Token has expired')
         except jwt.InvalidTokenError:
             raise AuthenticationFailed('Invalid token')
-        except StudentClassEnrollment.DoesNotExist:
+
+        # Validate token type
+        if payload.get('token_type') != 'student':
+            raise AuthenticationFailed('Invalid token type')
+        if not payload.get('enrollment_id'):
+            raise AuthenticationFailed('Invalid token')
+        return payload
+
+    @staticmethod
+    def decode_token(token):
+        """Decode and validate a student token."""
+        payload = StudentToken.decode_claims(token)
+        # Check if enrollment still exists and is valid (cached per process)
+        enrollment = enrollment_cache.get(payload['enrollment_id'])
+        if enrollment is None:
             raise AuthenticationFailed('Invalid enrollment')
 
+        # Check if class is still active
+        if not enrollment.classroom.active:
+            raise AuthenticationFailed('Class is no longer active')
+
+        return {
+            'student_id': payload['student_id'],
+            'class_id': payload['class_id'],
+            'enrollment_id': payload['enrollment_id'],
+            'student': enrollment.student,
+            'classroom': enrollment.classroom,
+            'enrollment': enrollment
+        }
 
-class StudentAuthentication(BaseAuthentication):
+
+class VerifiedTokenCache:
     """
-    Custom authentication for students using JWT tokens.
-    Students authenticate with tokens received when joining a class.
+    Bounded map of token digest to verified payload, kept until the token
+    expires. Keys are SHA-256 digests so raw tokens are never held.
     """
-    
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._payloads = OrderedDict()   # {digest: payload}
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest):
+        with self._lock:
+            payload = self._payloads.get(digest)
+            if payload is None:
+                return None
+            if payload['exp'] <= time.time():
+                del self._payloads[digest]
+                return None
+            self._payloads.move_to_end(digest)
+            return payload
+
+    def add(self, digest, payload):
+        with self._lock:
+            self._payloads[digest] = payload
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+
+verified_tokens = VerifiedTokenCache(student_setting('AUTH_TOKEN_CACHE_SIZE'))
+
+
+class BearerAuthentication(BaseAuthentication):
+    """
+    One pass over the Authorization header for teachers and students.
+
+    The bearer token is verified once and dispatched on its token_type:
+    SimpleJWT access tokens resolve to the teacher's User, student tokens
+    to a StudentUser. Access tokens are validated by SimpleJWT itself, so
+    SIMPLE_JWT's key, algorithm, audience, issuer, leeway and type claim
+    all apply; student tokens by StudentToken.decode_claims. Verified
+    payloads are cached by token digest until they expire, so a repeat
+    request skips the signature check too.
+    """
+
     def authenticate(self, request):
-        """Authenticate student using token from header."""
         auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
         if not auth_header or not auth_header.startswith('Bearer '):
             return None
-        
+        token = auth_header[7:].strip()
+        if not token:
+            return None
+
+        payload = self.verify(token)
+        if payload.get('token_type') == 'student':
+            return (self.student_user(payload), token)
+        return (JWTAuthentication().get_user(payload), token)
+
+    @staticmethod
+    def verify(token):
+        """Verified payload for a token, from the cache when possible."""
+        digest = verified_tokens.digest(token)
+        payload = verified_tokens.get(digest)
+        if payload is not None:
+            return payload
+
+        # The unverified claims only pick the validator; both verify fully
         try:
-            # Extract token from "Bearer <token>" format
-            token = auth_header.split(' ')[1]
-            
-            # Quick check: if token doesn't contain student info, skip
-            # This prevents JWT from trying to validate student tokens
-            import jwt
+            unverified = jwt.decode(token, options={'verify_signature': False})
+        except jwt.InvalidTokenError:
+            raise AuthenticationFailed('Invalid token')
+        if unverified.get('token_type') == 'student':
+            payload = StudentToken.decode_claims(token)
+        else:
             try:
-                # Decode without verification to check token type
-                unverified_payload = jwt.decode(token, options={"verify_signature": False})
-                if unverified_payload.get('token_type') != 'student':
-                    return None
-            except:
-                return None
-            
-            # Now properly validate the student token
-            token_data = StudentToken.decode_token(token)
-            
-            # Create a proper user object for students
-            student_user = StudentUser(
-                student=token_data['student'],
-                classroom=token_data['classroom'],
-                enrollment=token_data['enrollment']
-            )
-            
-            # Return (user, auth) tuple
-            return (student_user, token)
-            
-        except (IndexError, AuthenticationFailed, Exception):
+                payload = AccessToken(token).payload
+            except TokenError as exc:
+                raise AuthenticationFailed(str(exc))
+
+        verified_tokens.add(digest, payload)
+        return payload
+
+    @staticmethod
+    def student_user(payload):
+        enrollment = enrollment_cache.get(payload['enrollment_id'])
+        if enrollment is None:
+            raise AuthenticationFailed('Invalid enrollment')
+        if not enrollment.classroom.active:
+            raise AuthenticationFailed('Class is no longer active')
+        return StudentUser(
+            student=enrollment.student,
+            classroom=enrollment.classroom,
+            enrollment=enrollment,
+        )
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+class StudentClaimsAuthentication(BaseAuthentication):
+    """
+    Student JWT authentication that trusts the signed claims alone.
+
+    Nothing is loaded here, so views using it must confirm the enrollment
+    themselves, e.g. with StudentClaims.is_enrolled().
+    """
+
+    def authenticate(self, request):
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header or not auth_header.startswith('Bearer '):
             return None
-    
+
+        token = auth_header.split(' ', 1)[1]
+        try:
+            claims = BearerAuthentication.verify(token)
+        except AuthenticationFailed:
+            return None
+        if claims.get('token_type') != 'student':
+            return None
+        return (StudentClaims(claims), token)
+
     def authenticate_header(self, request):
-        """Return the authentication header."""
         return 'Bearer'
 
 
+class StudentClaims:
+    """
+    A student identified only by the claims of a verified token.
+    Carries ids, not model instances.
+    """
+
+    def __init__(self, payload):
+        self.student_id = payload['student_id']
+        self.class_id = payload['class_id']
+        self.enrollment_id = payload['enrollment_id']
+        self.id = self.student_id
+        self.is_authenticated = True
+        self.is_anonymous = False
+
+    def __str__(self):
+        return f"Student({self.student_id})"
+
+    def is_enrolled(self):
+        """
+        Whether the token's enrollment still exists in a live class.
+        Served from the enrollment cache; only a miss reads the database.
+        """
+        enrollment = enrollment_cache.get(self.enrollment_id)
+        return (
+            enrollment is not None
+            and enrollment.student_id == self.student_id
+            and enrollment.classroom_id == self.class_id
+            and enrollment.classroom.active
+        )
+
+    def has_perm(self, perm, obj=None):
+        return False
+
+    def has_module_perms(self, app_label):
+        return False
+
+
 class StudentUser:
     """
     Simple user object for students.
@@ -0,0 +1,34 @@
+"""
+Constants and configuration for student authentication.
+Values here are defaults; override them through settings.STUDENTS.
+"""
+from django.conf import settings
+
+
+# Formats served by the export endpoints (?fmt=)
+class ExportFormats:
+    CSV = 'csv'
+    JSONL = 'jsonl'
+
+    ALL = (CSV, JSONL)
+
+
+# Defaults for settings.STUDENTS
+class StudentDefaults:
+    ENROLLMENT_CACHE_SIZE = 10000         # enrollments kept per process (LRU)
+    ENROLLMENT_CACHE_TTL_SECONDS = 60     # bounds staleness seen by other workers
+    AUTH_TOKEN_CACHE_SIZE = 10000         # verified bearer payloads kept per process
+    AUTOCOMPLETE_LIMIT = 10               # suggestions returned by default
+    AUTOCOMPLETE_MAX_LIMIT = 50
+    BACKFILL_CHUNK = 1000                 # students rewritten per identity backfill batch
+    IMPORT_CHUNK = 1000                   # roster rows written per bulk insert
+    IMPORT_MAX_ERRORS = 100               # skipped rows listed in an import summary
+    EXPORT_CHUNK = 2000                   # rows fetched per round trip by exports
+
+
+def student_setting(name):
+    """Read a student setting, falling back to StudentDefaults."""
+    overrides = getattr(settings, 'STUDENTS', {})
+    if name in overrides:
+        return overrides[name]
+    return getattr(StudentDefaults, name)
@@ -0,0 +1,149 @@
+"""
+In-process cache of the enrollments behind student tokens.
+
+Every request made with a student token needs its enrollment, student and
+classroom to check that the class is still active. The cache keeps a
+snapshot of those three rows per enrollment, so steady-state requests
+authenticate without a query.
+
+Entries are evicted least recently used beyond ENROLLMENT_CACHE_SIZE and
+expire after ENROLLMENT_CACHE_TTL_SECONDS. Saving a class or deleting an
+enrollment invalidates the affected entries in the process that made the
+change, once the change commits; other workers pick the change up when
+their entry expires, so keep the TTL short. A row read before an
+invalidation but finished after it is returned to its caller and not
+cached, so it cannot restore what was just dropped.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .constants import student_setting
+from .models import Student, StudentClassEnrollment
+from classes.models import Class
+
+
+def _fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+class _Snapshot:
+    """Column values of one enrollment and its student and classroom."""
+    __slots__ = ('db', 'class_id', 'enrollment', 'student', 'classroom', 'expires')
+
+    def __init__(self, enrollment, ttl):
+        self.db = enrollment._state.db
+        self.class_id = enrollment.classroom_id
+        self.enrollment = self._values(enrollment)
+        self.student = self._values(enrollment.student)
+        self.classroom = self._values(enrollment.classroom)
+        self.expires = time.monotonic() + ttl
+
+    @staticmethod
+    def _values(instance):
+        return tuple(getattr(instance, name) for name in _fields(type(instance)))
+
+    def build(self):
+        """Fresh model instances, so callers never share mutable state."""
+        enrollment = StudentClassEnrollment.from_db(self.db, _fields(StudentClassEnrollment), self.enrollment)
+        enrollment.student = Student.from_db(self.db, _fields(Student), self.student)
+        enrollment.classroom = Class.from_db(self.db, _fields(Class), self.classroom)
+        return enrollment
+
+
+class EnrollmentCache:
+    """Bounded LRU/TTL map of enrollment id to snapshot, with hit counters."""
+
+    def __init__(self, max_size=10000, ttl_seconds=60):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {enrollment_id: _Snapshot}
+        self._by_class = {}             # {class_id: {enrollment_id}}
+        self._generation = 0            # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, enrollment_id):
+        """The enrollment with student and classroom loaded, or None if it is gone."""
+        with self._lock:
+            entry = self._entries.get(enrollment_id)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(enrollment_id)
+                self.hits += 1
+                return entry.build()
+            self.misses += 1
+            generation = self._generation
+
+        enrollment = self._load(enrollment_id)
+        if enrollment is None:
+            self.forget(enrollment_id)
+            return None
+
+        entry = _Snapshot(enrollment, self.ttl)
+        with self._lock:
+            if self._generation != generation:
+                # Invalidated while we read; this row may predate the change
+                return enrollment
+            self._discard(enrollment_id)
+            self._entries[enrollment_id] = entry
+            self._by_class.setdefault(entry.class_id, set()).add(enrollment_id)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+        return enrollment
+
+    @staticmethod
+    def _load(enrollment_id):
+        return StudentClassEnrollment.objects.select_related(
+            'student', 'classroom'
+        ).filter(id=enrollment_id).first()
+
+    def _discard(self, enrollment_id):
+        # Caller holds the lock
+        entry = self._entries.pop(enrollment_id, None)
+        if entry is not None:
+            members = self._by_class.get(entry.class_id)
+            if members is not None:
+                members.discard(enrollment_id)
+                if not members:
+                    del self._by_class[entry.class_id]
+
+    def forget(self, *enrollment_ids):
+        with self._lock:
+            self._generation += 1
+            for enrollment_id in enrollment_ids:
+                self._discard(enrollment_id)
+
+    def forget_class(self, *class_ids):
+        """Drop every cached enrollment of the given classes."""
+        with self._lock:
+            self._generation += 1
+            for class_id in class_ids:
+                for enrollment_id in list(self._by_class.get(class_id, ())):
+                    self._discard(enrollment_id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_class.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+enrollment_cache = EnrollmentCache(
+    max_size=student_setting('ENROLLMENT_CACHE_SIZE'),
+    ttl_seconds=student_setting('ENROLLMENT_CACHE_TTL_SECONDS'),
+)
@@ -0,0 +1,288 @@
+"""
+Helper functions and utilities for finding and importing students.
+Every lookup goes through the normalized name_key/email_key columns so it
+can use their indexes.
+"""
+import csv
+import json
+from datetime import date, datetime
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
+
+from quizzes.models import Quiz
+
+from .constants import ExportFormats, student_setting
+from .models import Student, StudentAnswer, StudentClassEnrollment, StudentQuizSubmission
+
+
+class StudentLookup:
+    """Student queries on the normalized identity columns."""
+
+    @staticmethod
+    def by_name(full_name):
+        return Student.objects.filter(name_key=Student.normalize(full_name) or '')
+
+    @staticmethod
+    def by_identity(full_name, email):
+        """Students registered with this name and email, ignoring case and spacing."""
+        return Student.objects.filter(
+            name_key=Student.normalize(full_name) or '',
+            email_key=Student.normalize(email),
+        )
+
+    @staticmethod
+    def autocomplete(prefix, limit):
+        """Up to `limit` students whose normalized name starts with `prefix`."""
+        prefix = Student.normalize(prefix)
+        if not prefix:
+            return Student.objects.none()
+        students = Student.objects.filter(name_key__startswith=prefix)
+        if connection.vendor == 'sqlite':
+            # SQLite will not use an index for LIKE; bound the scan as a range
+            students = students.filter(name_key__gte=prefix, name_key__lt=prefix + '\U0010ffff')
+        return students.order_by('name_key', 'id')[:limit]
+
+
+class StudentQuizAccess:
+    """
+    Restricts quiz querysets to the courses a student is enrolled in.
+
+    The check is one correlated EXISTS on the enrollment table, so the
+    query stays the same size however many classes the student joined.
+    """
+
+    @staticmethod
+    def enrolled(student_id, course_field='course_id'):
+        """EXISTS condition for rows whose `course_field` is one of the student's courses."""
+        return Exists(StudentClassEnrollment.objects.filter(
+            student_id=student_id, classroom__course_id=OuterRef(course_field)
+        ))
+
+    @staticmethod
+    def quizzes(student_id, queryset=None):
+        """Quizzes (from `queryset`, default all) the student can see."""
+        queryset = Quiz.objects.all() if queryset is None else queryset
+        return queryset.filter(StudentQuizAccess.enrolled(student_id))
+
+
+class AnswerSubmission:
+    """
+    The write path behind POST /api/students/answers/.
+
+    The quiz is read once per request. The submission and the answer are
+    then inserted without checking first: the (student, quiz) and
+    one-answer-per-submission unique constraints decide duplicates.
+    Uploads are the exception: the file is written to storage before the
+    row, so a duplicate is looked for first rather than leaving an
+    orphaned file behind.
+    """
+
+    @staticmethod
+    def quiz(quiz_id):
+        """The quiz for a client-sent quiz_id, or None if there is no such quiz."""
+        try:
+            quiz_id = int(quiz_id)
+        except (TypeError, ValueError):
+            return None
+        return Quiz.objects.filter(id=quiz_id).first()
+
+    @staticmethod
+    def submit(serializer, student, quiz):
+        """
+        Save the validated answer under the student's submission for `quiz`.
+        Raises IntegrityError if the student already answered it.
+        """
+        with transaction.atomic():
+            # Upsert so an existing submission is reused in the same statement
+            submission = StudentQuizSubmission(student=student, quiz=quiz)
+            StudentQuizSubmission.objects.bulk_create(
+                [submission],
+                update_conflicts=True,
+                unique_fields=['student', 'quiz'],
+                update_fields=['quiz'],
+            )
+            # The upsert holds the submission row, so nothing can slip in after this check
+            if serializer.validated_data.get('uploaded_file') and (
+                StudentAnswer.objects.filter(submission=submission).exists()
+            ):
+                raise IntegrityError("An answer already exists for this submission.")
+            return serializer.save(submission=submission)
+
+
+class RosterImport:
+    """
+    Streams a roster CSV (full_name, optional email) into one class.
+
+    Rows are read and written CHUNK rows at a time, so memory does not
+    grow with the file. Per chunk: one IN lookup for existing students,
+    one bulk insert of new ones, one lookup of existing enrollments and
+    one bulk insert of new enrollments.
+    """
+
+    REQUIRED_COLUMNS = {'full_name'}
+
+    def __init__(self, classroom_id, chunk_size=None):
+        self.classroom_id = classroom_id
+        self.chunk_size = chunk_size or student_setting('IMPORT_CHUNK')
+        self.summary = {
+            'rows': 0,
+            'created': 0,
+            'existing': 0,
+            'enrolled': 0,
+            'already_enrolled': 0,
+            'skipped': 0,
+            'errors': [],
+        }
+        self._seen = set()   # identity keys already handled in this file
+
+    def run(self, lines):
+        """Import from an iterable of text lines. Returns the summary."""
+        reader = csv.DictReader(lines)
+        columns = {(name or '').strip().lower() for name in reader.fieldnames or ()}
+        missing = self.REQUIRED_COLUMNS - columns
+        if missing:
+            raise ValidationError(f"Missing column(s): {', '.join(sorted(missing))}.")
+        reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames]
+
+        rows = enumerate(reader, start=2)   # line 1 is the header
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return self.summary
+            self._import_chunk(chunk)
+
+    def _skip(self, line, error):
+        self.summary['skipped'] += 1
+        if len(self.summary['errors']) < student_setting('IMPORT_MAX_ERRORS'):
+            self.summary['errors'].append({'line': line, 'error': error})
+
+    def _parse(self, chunk):
+        """{(name_key, email_key): Student} for the new, valid rows of a chunk."""
+        students = {}
+        for line, row in chunk:
+            self.summary['rows'] += 1
+            full_name = ' '.join((row.get('full_name') or '').split())
+            email = (row.get('email') or '').strip() or None
+            if not full_name:
+                self._skip(line, 'full_name is required.')
+                continue
+            if email:
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    self._skip(line, 'Invalid email.')
+                    continue
+
+            student = Student(full_name=full_name, email=email)
+            student.identity_keys()
+            key = (student.name_key, student.email_key)
+            if key in self._seen:
+                self._skip(line, 'Duplicate of an earlier row.')
+                continue
+            self._seen.add(key)
+            students[key] = student
+        return students
+
+    def _import_chunk(self, chunk):
+        students = self._parse(chunk)
+        if not students:
+            return
+
+        with transaction.atomic():
+            # 1️⃣ Students that already exist (oldest match wins)
+            ids = {}
+            for student_id, name_key, email_key in Student.objects.filter(
+                name_key__in={name_key for name_key, _email_key in students}
+            ).order_by('-id').values_list('id', 'name_key', 'email_key'):
+                ids[(name_key, email_key)] = student_id
+            ids = {key: ids[key] for key in students if key in ids}
+
+            # 2️⃣ Create the rest in one insert
+            new = [student for key, student in students.items() if key not in ids]
+            Student.objects.bulk_create(new)
+            for student in new:
+                ids[(student.name_key, student.email_key)] = student.id
+
+            # 3️⃣ Enroll everyone who is not enrolled yet
+            enrolled = set(StudentClassEnrollment.objects.filter(
+                classroom_id=self.classroom_id, student_id__in=ids.values()
+            ).values_list('student_id', flat=True))
+            StudentClassEnrollment.objects.bulk_create(
+                [
+                    StudentClassEnrollment(student_id=student_id, classroom_id=self.classroom_id)
+                    for student_id in ids.values() if student_id not in enrolled
+                ],
+                ignore_conflicts=True,
+            )
+
+        self.summary['created'] += len(new)
+        self.summary['existing'] += len(students) - len(new)
+        self.summary['already_enrolled'] += len(enrolled)
+        self.summary['enrolled'] += len(students) - len(enrolled)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+class StreamingExport:
+    """
+    Streams a queryset as CSV or JSON lines.
+
+    Rows come from values_list().iterator(), EXPORT_CHUNK at a time (a
+    server-side cursor on PostgreSQL). Memory stays flat however many rows
+    there are, and the first bytes go out before the query finishes.
+    """
+
+    CONTENT_TYPES = {
+        ExportFormats.CSV: 'text/csv',
+        ExportFormats.JSONL: 'application/x-ndjson',
+    }
+
+    @staticmethod
+    def response(queryset, columns, fmt, filename):
+        """
+        columns: [(output name, field lookup), ...] in output order.
+        """
+        names = [name for name, _lookup in columns]
+        rows = queryset.values_list(*[lookup for _name, lookup in columns]).iterator(
+            chunk_size=student_setting('EXPORT_CHUNK')
+        )
+        if fmt == ExportFormats.CSV:
+            body = StreamingExport._csv(names, rows)
+        else:
+            body = StreamingExport._jsonl(names, rows)
+
+        response = StreamingHttpResponse(body, content_type=StreamingExport.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+        return response
+
+    @staticmethod
+    def _csv(names, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([StreamingExport._cell(value) for value in row])
+
+    @staticmethod
+    def _cell(value):
+        # Same text as the JSON lines export for nested data and timestamps
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, cls=DjangoJSONEncoder)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _jsonl(names, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from students.constants import student_setting
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill Student.name_key and email_key from full_name and email, one "
+        "primary-key chunk at a time. Migration 0007 already backfills every "
+        "student; use this to re-run it, e.g. with --all after a rule change. "
+        "Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=student_setting('BACKFILL_CHUNK'),
+            help="Students rewritten per transaction.",
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Recompute every student, not only those without a name key.",
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        if not options['all']:
+            students = students.filter(name_key='')
+
+        updated = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                students.filter(id__gt=last_id).order_by('id')
+                .only('id', 'full_name', 'email', 'name_key', 'email_key')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            changed = []
+            for student in chunk:
+                before = (student.name_key, student.email_key)
+                student.identity_keys()
+                if (student.name_key, student.email_key) != before:
+                    changed.append(student)
+            with transaction.atomic():
+                Student.objects.bulk_update(changed, ['name_key', 'email_key'])
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled identity keys for {updated} student(s)."))
@@ -0,0 +1,110 @@
+import time
+
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from classes.models import Class
+from courses.models import Course
+from students.authentication import (
+    BearerAuthentication, StudentToken, StudentUser, verified_tokens,
+)
+from students.enrollments import enrollment_cache
+from students.models import Student, StudentClassEnrollment
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _ChainedStudentAuthentication(BaseAuthentication):
+    """
+    The student half of the chain BearerAuthentication replaced: peek at the
+    token type, verify the signature, then load the enrollment from the
+    database on every request.
+    """
+
+    def authenticate(self, request):
+        token = request.META['HTTP_AUTHORIZATION'].split(' ')[1]
+        if jwt.decode(token, options={'verify_signature': False}).get('token_type') != 'student':
+            return None
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        enrollment = StudentClassEnrollment.objects.select_related(
+            'student', 'classroom'
+        ).get(id=payload['enrollment_id'])
+        return (StudentUser(enrollment.student, enrollment.classroom, enrollment), token)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time per-request authentication with the old student + "
+        "JWTAuthentication chain against BearerAuthentication, with the "
+        "enrollment cache hits and misses of each run. Uses throwaway rows "
+        "that are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per scenario.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['requests'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, count):
+        teacher = User.objects.create_user(username='benchmark-auth-teacher', password='x')
+        course = Course.objects.create(name='benchmark-auth-course', teacher=teacher)
+        classroom = Class.objects.create(course=course, teacher=teacher)
+        student = Student.objects.create(full_name='Benchmark Student')
+        enrollment = StudentClassEnrollment.objects.create(student=student, classroom=classroom)
+
+        tokens = {
+            'teacher': str(AccessToken.for_user(teacher)),
+            'student': StudentToken.generate_token(student.id, classroom.id, enrollment.id),
+        }
+        chains = {
+            'before': [_ChainedStudentAuthentication(), JWTAuthentication()],
+            'after': [BearerAuthentication()],
+        }
+        factory = APIRequestFactory()
+
+        self.stdout.write(
+            f"{'token':<8} {'chain':<7} {'us/request':>11} {'queries/request':>16} "
+            f"{'cache hits':>11} {'cache misses':>13}"
+        )
+        for kind, token in tokens.items():
+            request = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            for name, chain in chains.items():
+                verified_tokens.clear()
+                enrollment_cache.clear()
+                before = enrollment_cache.stats()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(count):
+                        self._authenticate(chain, request)
+                    elapsed = time.perf_counter() - started
+                after = enrollment_cache.stats()
+                self.stdout.write(
+                    f"{kind:<8} {name:<7} {elapsed / count * 1e6:>11.1f} "
+                    f"{len(queries) / count:>16.2f} "
+                    f"{after['hits'] - before['hits']:>11} {after['misses'] - before['misses']:>13}"
+                )
+
+    @staticmethod
+    def _authenticate(chain, request):
+        # What DRF's Request does with DEFAULT_AUTHENTICATION_CLASSES
+        for authenticator in chain:
+            result = authenticator.authenticate(request)
+            if result is not None:
+                return result
+        raise AssertionError("Benchmark token did not authenticate")
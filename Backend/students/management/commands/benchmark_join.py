@@ -0,0 +1,80 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from rest_framework.test import APIRequestFactory
+
+from classes.models import Class
+from courses.models import Course
+from students.models import Student
+from students.views import JoinClassView
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a burst of students joining one class through JoinClassView "
+        "against the configured database, report throughput and latency, and "
+        "compare them with the targets. The rows it creates are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=400, help="Students in the burst.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Joins in flight at once.")
+        parser.add_argument('--target-rps', type=float, default=100.0, help="Minimum joins per second.")
+        parser.add_argument('--target-p95-ms', type=float, default=250.0, help="Maximum p95 latency.")
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        teacher = User.objects.create_user(username=f'benchmark-join-{run}')
+        course = Course.objects.create(name=f'benchmark-join-{run}', teacher=teacher)
+        classroom = Class.objects.create(course=course, teacher=teacher)
+        names = [f'benchmark-join-{run}-{i}' for i in range(options['students'])]
+        try:
+            latencies, statuses, elapsed = self._burst(classroom.code, names, options['concurrency'])
+        finally:
+            Student.objects.filter(full_name__in=names).delete()
+            teacher.delete()   # cascades to the course, class and enrollments
+
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+        rps = len(latencies) / elapsed
+        failed = sum(1 for code in statuses if code != 201)
+
+        self.stdout.write(
+            f"{connection.vendor}: {len(latencies)} joins in {elapsed:.2f}s "
+            f"({rps:.0f}/s), p50 {p50:.1f} ms, p95 {p95:.1f} ms, {failed} failed"
+        )
+        if failed or rps < options['target_rps'] or p95 > options['target_p95_ms']:
+            self.stdout.write(self.style.ERROR(
+                f"Target missed: >= {options['target_rps']:.0f}/s, "
+                f"p95 <= {options['target_p95_ms']:.0f} ms, no failures."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Targets met."))
+
+    @staticmethod
+    def _burst(code, names, concurrency):
+        factory = APIRequestFactory()
+        view = JoinClassView.as_view()
+
+        def join(name):
+            request = factory.post(
+                '/api/students/join/', {'full_name': name, 'class_code': code}, format='json'
+            )
+            started = time.perf_counter()
+            try:
+                response = view(request)
+            finally:
+                connections.close_all()
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(join, names))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], [code for _, code in results], elapsed
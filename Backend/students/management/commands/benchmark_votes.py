@@ -0,0 +1,92 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from rest_framework.test import APIRequestFactory
+
+from quickpolls.models import PollOption, QuickPoll
+from quickpolls.views import SubmitVoteView
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a burst of students voting in one quick poll through "
+        "SubmitVoteView against the configured database, report throughput "
+        "and latency, and check the stored counts. The rows it creates are "
+        "deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=500, help="Students in the burst.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Votes in flight at once.")
+        parser.add_argument('--target-p99-ms', type=float, default=250.0, help="Maximum p99 latency.")
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        poll = QuickPoll.objects.create(
+            name=f'benchmark-votes-{run}', question_type='custom', option_count=4
+        )
+        option_ids = list(poll.options.order_by('id').values_list('id', flat=True))
+        students = Student.objects.bulk_create(
+            Student(full_name=f'benchmark-votes-{run}-{i}', email=f'benchmark-votes-{run}-{i}@example.com')
+            for i in range(options['voters'])
+        )
+        votes = [
+            (student.full_name, student.email, option_ids[i % len(option_ids)])
+            for i, student in enumerate(students)
+        ]
+        try:
+            latencies, statuses, elapsed = self._burst(poll.code, votes, options['concurrency'])
+            counted = sum(PollOption.objects.filter(poll=poll).values_list('vote_count', flat=True))
+            stored = poll.votes.count()
+        finally:
+            poll.delete()   # cascades to the options and votes
+            Student.objects.filter(pk__in=[student.pk for student in students]).delete()
+
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+        rps = len(latencies) / elapsed
+        failed = sum(1 for code in statuses if code != 200)
+
+        self.stdout.write(
+            f"{connection.vendor}: {len(latencies)} votes in {elapsed:.2f}s "
+            f"({rps:.0f}/s), p50 {p50:.1f} ms, p99 {p99:.1f} ms, {failed} failed, "
+            f"{stored} stored, {counted} counted"
+        )
+        if failed or stored != len(votes) or counted != len(votes) or p99 > options['target_p99_ms']:
+            self.stdout.write(self.style.ERROR(
+                f"Target missed: p99 <= {options['target_p99_ms']:.0f} ms, "
+                "no failures, every vote stored and counted once."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Targets met."))
+
+    @staticmethod
+    def _burst(code, votes, concurrency):
+        factory = APIRequestFactory()
+        view = SubmitVoteView.as_view()
+
+        def vote(args):
+            name, email, option_id = args
+            request = factory.post(
+                f'/api/quickpolls/{code}/vote/',
+                {'option_id': option_id, 'student_name': name, 'student_email': email},
+                format='json',
+            )
+            started = time.perf_counter()
+            try:
+                response = view(request, code=code)
+            finally:
+                connections.close_all()
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(vote, votes))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], [code for _, code in results], elapsed
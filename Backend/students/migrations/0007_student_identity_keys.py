@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+BACKFILL_CHUNK = 2000
+
+
+def normalize(value):
+    # Same rule as Student.normalize; historical models have no methods
+    if value is None:
+        return None
+    return ' '.join(str(value).split()).casefold() or None
+
+
+def backfill_identity_keys(apps, schema_editor):
+    Student = apps.get_model('students', 'Student')
+    last_id = 0
+    while True:
+        chunk = list(
+            Student.objects.filter(id__gt=last_id).order_by('id')
+            .only('id', 'full_name', 'email')[:BACKFILL_CHUNK]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        for student in chunk:
+            student.name_key = normalize(student.full_name) or ''
+            student.email_key = normalize(student.email)
+        Student.objects.bulk_update(chunk, ['name_key', 'email_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0006_studenttoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='email_key',
+            field=models.CharField(blank=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        # Existing students must be findable as soon as the lookups switch over
+        migrations.RunPython(backfill_identity_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['name_key', 'email_key'], name='student_identity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['email_key'], name='student_email_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['name_key'], name='student_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -6,6 +6,15 @@ from django.core.exceptions import ValidationError
 from quizzes.helpers import QuizGradingHelper
 
 
+class StudentManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill the identity keys here
+        objs = list(objs)
+        for student in objs:
+            student.identity_keys()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Student(models.Model):
     """
     Represents a student who joins a class using a valid class code.
@@ -14,6 +23,44 @@ class Student(models.Model):
     email = models.EmailField(blank=True, null=True)
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    # Normalized copies of full_name and email used for every lookup; kept
+    # in sync by save() and bulk_create() (queryset updates must call
+    # identity_keys() themselves)
+    name_key = models.CharField(max_length=255, default='', editable=False)
+    email_key = models.CharField(max_length=254, blank=True, null=True, editable=False)
+
+    objects = StudentManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name_key', 'email_key'], name='student_identity_idx'),
+            models.Index(fields=['email_key'], name='student_email_key_idx'),
+            # Prefix searches (autocomplete); the opclass only applies on PostgreSQL
+            models.Index(
+                fields=['name_key'], name='student_name_prefix_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
+
+    @staticmethod
+    def normalize(value):
+        """Casefold and collapse whitespace; blank values become None."""
+        if value is None:
+            return None
+        return ' '.join(str(value).split()).casefold() or None
+
+    def identity_keys(self):
+        """Refresh name_key and email_key from full_name and email."""
+        self.name_key = Student.normalize(self.full_name) or ''
+        self.email_key = Student.normalize(self.email)
+
+    def save(self, *args, **kwargs):
+        self.identity_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'full_name', 'email'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'name_key', 'email_key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.full_name
 
@@ -4,17 +4,6 @@ from classes.models import Class
 from quizzes.models import Quiz
 
 
-def validate_no_duplicate_answer(quiz, request, serializer_instance):
-    """Helper function to check if student has already answered a quiz."""
-    if request and hasattr(request.user, 'student'):
-        existing_answer = StudentAnswer.objects.filter(
-            submission__student=request.user.student,
-            submission__quiz=quiz
-        ).exists()
-        if existing_answer:
-            raise serializers.ValidationError("You have already answered this quiz.")
-
-
 class StudentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Student
@@ -85,6 +74,19 @@ class BaseStudentAnswerSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['submitted_at']
 
+    def get_quiz(self, quiz_id):
+        """
+        The answered quiz. StudentAnswerViewSet loads it once per request and
+        passes it in the context; otherwise it is queried here.
+        """
+        quiz = self.context.get('quiz')
+        if quiz is not None and quiz.id == quiz_id:
+            return quiz
+        try:
+            return Quiz.objects.get(id=quiz_id)
+        except Quiz.DoesNotExist:
+            raise serializers.ValidationError("Invalid quiz ID")
+
 
 # Specific serializers for each quiz type
 class ShortAnswerSerializer(BaseStudentAnswerSerializer):
@@ -98,18 +100,11 @@ class ShortAnswerSerializer(BaseStudentAnswerSerializer):
         if not quiz_id:
             return data
         
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Invalid quiz ID")
+        quiz = self.get_quiz(quiz_id)
         
         if quiz.quiz_type != 'short_answer':
             raise serializers.ValidationError("This serializer is for short answer questions only")
         
-        # Check if student has already answered this quiz
-        request = self.context.get('request')
-        validate_no_duplicate_answer(quiz, request, self)
-        
         answer_text = data.get('answer_text', '').strip()
         if not answer_text:
             raise serializers.ValidationError("Answer text is required")
@@ -136,18 +131,11 @@ class WordCloudAnswerSerializer(BaseStudentAnswerSerializer):
         if not quiz_id:
             return data
         
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Invalid quiz ID")
+        quiz = self.get_quiz(quiz_id)
         
         if quiz.quiz_type != 'word_cloud':
             raise serializers.ValidationError("This serializer is for word cloud questions only")
         
-        # Check if student has already answered this quiz
-        request = self.context.get('request')
-        validate_no_duplicate_answer(quiz, request, self)
-        
         answer_text = data.get('answer_text', '').strip()
         if not answer_text:
             raise serializers.ValidationError("Answer text is required")
@@ -211,18 +199,11 @@ class MultipleChoiceAnswerSerializer(BaseStudentAnswerSerializer):
         if not quiz_id:
             return data
         
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Invalid quiz ID")
+        quiz = self.get_quiz(quiz_id)
         
         if quiz.quiz_type != 'multiple_choice':
             raise serializers.ValidationError("This serializer is for multiple choice questions only")
         
-        # Check if student has already answered this quiz
-        request = self.context.get('request')
-        validate_no_duplicate_answer(quiz, request, self)
-        
         selected_indices = data.get('selected_choice_indices', [])
         if not selected_indices:
             raise serializers.ValidationError("Selected choice indices are required")
@@ -274,18 +255,11 @@ class DrawingAnswerSerializer(BaseStudentAnswerSerializer):
         if not quiz_id:
             return data
         
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Invalid quiz ID")
+        quiz = self.get_quiz(quiz_id)
         
         if quiz.quiz_type != 'drawing':
             raise serializers.ValidationError("This serializer is for drawing questions only")
         
-        # Check if student has already answered this quiz
-        request = self.context.get('request')
-        validate_no_duplicate_answer(quiz, request, self)
-        
         if not data.get('uploaded_file'):
             raise serializers.ValidationError("Uploaded file is required for drawing questions")
         
@@ -322,18 +296,11 @@ class ImageUploadAnswerSerializer(BaseStudentAnswerSerializer):
         if not quiz_id:
             return data
         
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Invalid quiz ID")
+        quiz = self.get_quiz(quiz_id)
         
         if quiz.quiz_type != 'image_upload':
             raise serializers.ValidationError("This serializer is for image upload questions only")
         
-        # Check if student has already answered this quiz
-        request = self.context.get('request')
-        validate_no_duplicate_answer(quiz, request, self)
-        
         uploaded_file = data.get('uploaded_file')
         if not uploaded_file:
             raise serializers.ValidationError("Uploaded file is required for image upload questions")
@@ -385,17 +352,10 @@ class StudentAnswerSerializer(BaseStudentAnswerSerializer):
         if not quiz_id:
             return data
         
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Invalid quiz ID")
+        quiz = self.get_quiz(quiz_id)
         
         quiz_type = quiz.quiz_type
         
-        # Check if student has already answered this quiz
-        request = self.context.get('request')
-        validate_no_duplicate_answer(quiz, request, self)
-        
         # Validate based on quiz type
         if quiz_type == 'multiple_choice':
             selected_indices = data.get('answer_data', {}).get('selected_choice_indices', [])
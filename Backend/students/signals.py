@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from classes.models import Class
+
+from .enrollments import enrollment_cache
+from .models import StudentClassEnrollment
+
+
+@receiver(post_save, sender=Class)
+def forget_class_enrollments(sender, instance, created, **kwargs):
+    """Ending (or reactivating) a class must reach cached student tokens."""
+    if not created:
+        enrollment_cache.forget_class(instance.id)
+        # Again once committed: a read in between may have cached the old row
+        transaction.on_commit(lambda: enrollment_cache.forget_class(instance.id), robust=True)
+
+
+@receiver(post_delete, sender=StudentClassEnrollment)
+def forget_enrollment(sender, instance, **kwargs):
+    """A removed enrollment stops authenticating immediately."""
+    enrollment_id = instance.id   # the instance loses its pk once deleted
+    enrollment_cache.forget(enrollment_id)
+    transaction.on_commit(lambda: enrollment_cache.forget(enrollment_id), robust=True)
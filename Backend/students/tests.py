@@ -0,0 +1,479 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from classes.models import Class
+from courses.models import Course
+from quizzes.models import Quiz
+from students.authentication import (
+    BearerAuthentication, StudentClaimsAuthentication, StudentToken, StudentUser, verified_tokens,
+)
+from students.enrollments import EnrollmentCache, enrollment_cache
+from students.helpers import StudentLookup
+from students.models import (
+    Student, StudentAnswer, StudentClassEnrollment, StudentQuizSubmission,
+)
+
+
+def roster(text, encoding='utf-8'):
+    return SimpleUploadedFile('roster.csv', text.encode(encoding), content_type='text/csv')
+
+
+class RosterImportTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        course = Course.objects.create(name='Biology', teacher=self.teacher)
+        self.classroom = Class.objects.create(course=course, teacher=self.teacher)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.url = reverse('student-import')
+
+    def upload(self, text, client=None, **kwargs):
+        return (client or self.client).post(
+            self.url, {'file': roster(text, **kwargs), 'class_id': self.classroom.id}, format='multipart'
+        )
+
+    def test_rows_are_created_and_enrolled(self):
+        existing = Student.objects.create(full_name='Ada Lovelace', email='ada@example.com')
+        r = self.upload(
+            'full_name,email\n'
+            'ada  LOVELACE,ADA@example.com\n'
+            'Alan Turing,alan@example.com\n'
+            'alan turing,Alan@Example.com\n'
+            ',nobody@example.com\n'
+            'Grace Hopper,not-an-email\n'
+        )
+        self.assertEqual(r.status_code, 200)
+        summary = r.json()
+        self.assertEqual(
+            {k: summary[k] for k in ('rows', 'created', 'existing', 'enrolled', 'skipped')},
+            {'rows': 5, 'created': 1, 'existing': 1, 'enrolled': 2, 'skipped': 3},
+        )
+        self.assertEqual([e['line'] for e in summary['errors']], [4, 5, 6])
+        self.assertTrue(StudentClassEnrollment.objects.filter(student=existing, classroom=self.classroom).exists())
+
+        # A second import of the same file enrolls nobody twice
+        again = self.upload('full_name,email\nAlan Turing,alan@example.com\n').json()
+        self.assertEqual((again['enrolled'], again['already_enrolled']), (0, 1))
+        self.assertEqual(Student.objects.filter(name_key='alan turing').count(), 1)
+
+    def test_missing_column_is_rejected(self):
+        r = self.upload('name,email\nAda,ada@example.com\n')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('full_name', r.json()['error'])
+
+    def test_non_utf8_file_is_rejected(self):
+        r = self.upload('full_name\nJosé Müller\n', encoding='utf-16')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Student.objects.exists())
+
+    def test_other_teachers_class_is_forbidden(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(self.upload('full_name\nAda\n', client=other).status_code, 403)
+
+    def test_student_token_is_forbidden(self):
+        # A student whose id happens to match the teacher's user id
+        student = Student.objects.create(id=self.teacher.id, full_name='Eve')
+        enrollment = StudentClassEnrollment.objects.create(student=student, classroom=self.classroom)
+        client = APIClient()
+        client.force_authenticate(StudentUser(student, self.classroom, enrollment))
+        self.assertEqual(self.upload('full_name\nMallory\n', client=client).status_code, 403)
+        self.assertEqual(Student.objects.count(), 1)
+
+
+class StudentIdentityTests(TestCase):
+    def test_keys_ignore_case_and_spacing(self):
+        student = Student.objects.create(full_name='  Ada   LOVELACE ', email=' Ada@Example.COM')
+        self.assertEqual((student.name_key, student.email_key), ('ada lovelace', 'ada@example.com'))
+        self.assertEqual(list(StudentLookup.by_identity('ada lovelace', 'ADA@example.com')), [student])
+        self.assertEqual(list(StudentLookup.by_name('ADA  Lovelace')), [student])
+
+    def test_keys_follow_updates(self):
+        student = Student.objects.create(full_name='Ada Lovelace')
+        self.assertIsNone(student.email_key)
+        student.full_name, student.email = 'Ada King', 'ada@example.com'
+        student.save(update_fields=['full_name', 'email'])
+        student.refresh_from_db()
+        self.assertEqual((student.name_key, student.email_key), ('ada king', 'ada@example.com'))
+
+    def test_autocomplete_matches_prefixes_for_teachers(self):
+        teacher = User.objects.create_user('teacher')
+        for name in ('Ada Lovelace', 'adam smith', 'Alan Turing', 'Grace Hopper'):
+            Student.objects.create(full_name=name)
+        client = APIClient()
+        client.force_authenticate(teacher)
+        url = reverse('student-autocomplete')
+
+        names = [s['full_name'] for s in client.get(url, {'q': ' ADA'}).json()['results']]
+        self.assertEqual(names, ['Ada Lovelace', 'adam smith'])
+        self.assertEqual(len(client.get(url, {'q': 'a', 'limit': 2}).json()['results']), 2)
+        self.assertEqual(client.get(url, {'q': ''}).json()['results'], [])
+        self.assertEqual(client.get(url, {'limit': 'x'}).status_code, 400)
+
+    def test_autocomplete_refuses_student_tokens(self):
+        teacher = User.objects.create_user('teacher')
+        classroom = Class.objects.create(course=Course.objects.create(name='Biology', teacher=teacher), teacher=teacher)
+        student = Student.objects.create(full_name='Eve')
+        enrollment = StudentClassEnrollment.objects.create(student=student, classroom=classroom)
+        client = APIClient()
+        client.force_authenticate(StudentUser(student, classroom, enrollment))
+        self.assertEqual(client.get(reverse('student-autocomplete'), {'q': 'e'}).status_code, 403)
+
+
+class IdentityBackfillMigrationTests(TransactionTestCase):
+    before = [('students', '0006_studenttoken')]
+    after = [('students', '0007_student_identity_keys')]
+
+    def test_existing_students_are_backfilled(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldStudent = executor.loader.project_state(self.before).apps.get_model('students', 'Student')
+        OldStudent.objects.create(full_name=' Ada  Lovelace', email='ADA@example.com')
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+        self.assertEqual(list(StudentLookup.by_identity('ada lovelace', 'ada@example.com')
+                              .values_list('full_name', flat=True)), [' Ada  Lovelace'])
+
+
+class BearerAuthenticationTests(TestCase):
+    def setUp(self):
+        verified_tokens.clear()
+        enrollment_cache.clear()
+        self.teacher = User.objects.create_user('teacher')
+        self.classroom = Class.objects.create(
+            course=Course.objects.create(name='Biology', teacher=self.teacher), teacher=self.teacher
+        )
+        self.student = Student.objects.create(full_name='Ada Lovelace')
+        self.enrollment = StudentClassEnrollment.objects.create(student=self.student, classroom=self.classroom)
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, token, authenticator=None):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return (authenticator or BearerAuthentication()).authenticate(request)
+
+    def student_token(self, **claims):
+        payload = {
+            'student_id': self.student.id, 'class_id': self.classroom.id,
+            'enrollment_id': self.enrollment.id, 'token_type': 'student',
+            'exp': timezone.now() + timedelta(hours=1), **claims,
+        }
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+    def test_access_token_resolves_to_the_teacher(self):
+        user, _token = self.authenticate(str(AccessToken.for_user(self.teacher)))
+        self.assertEqual(user, self.teacher)
+
+    def test_student_token_resolves_to_the_enrollment(self):
+        token = StudentToken.generate_token(self.student.id, self.classroom.id, self.enrollment.id)
+        user, _token = self.authenticate(token)
+        self.assertIsInstance(user, StudentUser)
+        self.assertEqual((user.student.id, user.enrollment.id), (self.student.id, self.enrollment.id))
+
+        # Verified once: the repeat checks no signature and runs no query
+        with mock.patch('students.authentication.jwt.decode', side_effect=AssertionError), \
+                self.assertNumQueries(0):
+            user, _token = self.authenticate(token)
+        self.assertEqual(user.student.id, self.student.id)
+
+    def test_expired_tokens_are_rejected(self):
+        access = AccessToken.for_user(self.teacher)
+        access.set_exp(lifetime=-timedelta(minutes=1))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(str(access))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.student_token(exp=timezone.now() - timedelta(minutes=1)))
+
+    def test_wrong_type_and_forged_tokens_are_rejected(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(str(RefreshToken.for_user(self.teacher)))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.student_token(token_type='session'))
+        forged = jwt.encode(
+            {'student_id': 1, 'enrollment_id': self.enrollment.id, 'token_type': 'student',
+             'exp': timezone.now() + timedelta(hours=1)},
+            'not-the-secret-key-not-the-secret-key', algorithm='HS256',
+        )
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(forged)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('not-a-jwt')
+
+    def test_ended_class_is_rejected(self):
+        token = self.student_token()
+        self.classroom.active = False
+        self.classroom.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_claims_authentication_only_takes_student_tokens(self):
+        claims = StudentClaimsAuthentication()
+        self.assertIsNone(self.authenticate(str(AccessToken.for_user(self.teacher)), claims))
+        user, _token = self.authenticate(self.student_token(), claims)
+        self.assertEqual(user.enrollment_id, self.enrollment.id)
+
+
+class EnrollmentCacheTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.classroom = Class.objects.create(
+            course=Course.objects.create(name='Biology', teacher=self.teacher), teacher=self.teacher
+        )
+        self.student = Student.objects.create(full_name='Ada Lovelace')
+        self.enrollment = StudentClassEnrollment.objects.create(student=self.student, classroom=self.classroom)
+        self.cache = EnrollmentCache(max_size=2, ttl_seconds=60)
+
+    def test_second_lookup_is_a_hit(self):
+        with self.assertNumQueries(1):
+            first = self.cache.get(self.enrollment.id)
+        with self.assertNumQueries(0):
+            second = self.cache.get(self.enrollment.id)
+        self.assertEqual((second.student.full_name, second.classroom.id), ('Ada Lovelace', self.classroom.id))
+        self.assertIsNot(first, second)
+        self.assertEqual({k: self.cache.stats()[k] for k in ('hits', 'misses', 'size')},
+                         {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_missing_enrollment_is_none(self):
+        self.assertIsNone(self.cache.get(999999))
+
+    def test_forget_class_drops_its_enrollments(self):
+        self.cache.get(self.enrollment.id)
+        self.classroom.active = False
+        self.classroom.save()
+        self.cache.forget_class(self.classroom.id)
+        with self.assertNumQueries(1):
+            self.assertFalse(self.cache.get(self.enrollment.id).classroom.active)
+
+    def test_signals_reach_the_shared_cache(self):
+        enrollment_cache.clear()
+        enrollment_cache.get(self.enrollment.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.classroom.active = False
+            self.classroom.save()
+        self.assertFalse(enrollment_cache.get(self.enrollment.id).classroom.active)
+
+        enrollment_id = self.enrollment.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment.delete()
+        self.assertIsNone(enrollment_cache.get(enrollment_id))
+
+    def test_read_racing_an_invalidation_is_not_cached(self):
+        load = EnrollmentCache._load
+
+        def load_then_class_ends(enrollment_id):
+            enrollment = load(enrollment_id)       # still sees the active class
+            self.cache.forget_class(self.classroom.id)
+            return enrollment
+
+        with mock.patch.object(EnrollmentCache, '_load', side_effect=load_then_class_ends):
+            self.assertTrue(self.cache.get(self.enrollment.id).classroom.active)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_size_is_bounded(self):
+        for classroom_name in ('Chemistry', 'Physics'):
+            classroom = Class.objects.create(
+                course=Course.objects.create(name=classroom_name, teacher=self.teacher), teacher=self.teacher
+            )
+            self.cache.get(StudentClassEnrollment.objects.create(student=self.student, classroom=classroom).id)
+        self.cache.get(self.enrollment.id)
+        self.assertEqual((self.cache.stats()['size'], self.cache.stats()['evictions']), (2, 1))
+
+
+class JoinClassTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher')
+        self.classroom = Class.objects.create(
+            course=Course.objects.create(name='Biology', teacher=self.teacher), teacher=self.teacher
+        )
+        self.client = APIClient()
+        self.url = reverse('join-class')
+
+    def join(self, full_name='Ada Lovelace', code=None):
+        return self.client.post(
+            self.url, {'full_name': full_name, 'class_code': code or self.classroom.code}, format='json'
+        )
+
+    def test_new_student_joins_and_gets_a_working_token(self):
+        r = self.join()
+        self.assertEqual(r.status_code, 201)
+        body = r.json()
+        enrollment = StudentClassEnrollment.objects.get()
+        self.assertEqual((body['enrollment_id'], body['class_id']), (enrollment.id, self.classroom.id))
+
+        user, _token = BearerAuthentication().authenticate(
+            APIRequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {body['access_token']}")
+        )
+        self.assertEqual(user.enrollment.id, enrollment.id)
+
+    def test_existing_student_is_reused(self):
+        student = Student.objects.create(full_name='Ada Lovelace')
+        r = self.join('  ada   LOVELACE')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['student_id'], student.id)
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_rejoin_reports_already_enrolled(self):
+        first = self.join().json()
+        r = self.join()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {
+            'message': 'You are already enrolled in this class.',
+            'student_id': first['student_id'],
+            'class_id': self.classroom.id,
+        })
+        self.assertEqual(StudentClassEnrollment.objects.count(), 1)
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_bad_input_and_unknown_or_ended_classes(self):
+        self.assertEqual(self.client.post(self.url, {'full_name': 'Ada'}, format='json').status_code, 400)
+        self.assertEqual(self.join(code='ZZZZZZ').status_code, 404)
+
+        self.assertEqual(self.join().status_code, 201)   # caches the code
+        self.classroom.active = False
+        self.classroom.save()
+        self.assertEqual(self.join('Alan Turing').status_code, 404)
+
+    def test_stale_token_does_not_block_joining(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer expired.or.garbage')
+        self.assertEqual(self.join().status_code, 201)
+
+    def test_warm_join_of_a_new_student(self):
+        self.join('Warm up')
+        # student lookup, student insert, enrollment insert + savepoint/release
+        with self.assertNumQueries(5):
+            self.assertEqual(self.join().status_code, 201)
+
+
+class StudentExportTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.other_teacher = User.objects.create_user('other')
+        self.mine = self.make_class(self.teacher, 'Biology', 'Ada Lovelace')
+        self.theirs = self.make_class(self.other_teacher, 'Chemistry', 'Alan Turing')
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    @staticmethod
+    def make_class(teacher, course_name, student_name):
+        course = Course.objects.create(name=course_name, teacher=teacher)
+        classroom = Class.objects.create(course=course, teacher=teacher)
+        student = Student.objects.create(full_name=student_name)
+        enrollment = StudentClassEnrollment.objects.create(student=student, classroom=classroom)
+        quiz = Quiz.objects.create(course=course, title=f'{course_name} quiz', quiz_type='short_answer', created_by=teacher)
+        submission = StudentQuizSubmission.objects.create(student=student, quiz=quiz)
+        StudentAnswer.objects.create(submission=submission, answer_data={'answer_text': student_name})
+        return {'course': course, 'classroom': classroom, 'student': student, 'enrollment': enrollment}
+
+    def export(self, dataset, **params):
+        return self.client.get(reverse('student-export', args=[dataset]), params)
+
+    def test_csv_holds_only_the_teachers_rows(self):
+        r = self.export('enrollments')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        self.assertIn('enrollments', r['Content-Disposition'])
+        lines = b''.join(r.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,student_id,student_name,student_email,class_id,class_code,joined_at')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Ada Lovelace', lines[1])
+
+    def test_jsonl_answers_and_filters(self):
+        rows = [json.loads(line) for line in b''.join(
+            self.export('answers', fmt='jsonl').streaming_content
+        ).decode().splitlines()]
+        self.assertEqual([row['answer_data'] for row in rows], [{'answer_text': 'Ada Lovelace'}])
+
+        # Another teacher's course filters down to nothing, never to their rows
+        other = self.export('submissions', fmt='jsonl', course_id=self.theirs['course'].id)
+        self.assertEqual(b''.join(other.streaming_content), b'')
+        own = self.export('submissions', fmt='jsonl', course_id=self.mine['course'].id)
+        self.assertEqual(len(b''.join(own.streaming_content).decode().splitlines()), 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.export('grades').status_code, 404)
+        self.assertEqual(self.export('enrollments', fmt='xlsx').status_code, 400)
+        self.assertEqual(self.export('enrollments', class_id='1 OR 1=1').status_code, 400)
+        self.assertEqual(APIClient().get(reverse('student-export', args=['enrollments'])).status_code, 401)
+
+    def test_student_token_is_forbidden(self):
+        client = APIClient()
+        client.force_authenticate(
+            StudentUser(self.mine['student'], self.mine['classroom'], self.mine['enrollment'])
+        )
+        self.assertEqual(client.get(reverse('student-export', args=['answers'])).status_code, 403)
+
+
+class AnswerSubmitTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        course = Course.objects.create(name='Biology', teacher=self.teacher)
+        classroom = Class.objects.create(course=course, teacher=self.teacher)
+        self.student = Student.objects.create(full_name='Ada Lovelace')
+        enrollment = StudentClassEnrollment.objects.create(student=self.student, classroom=classroom)
+        self.quiz = Quiz.objects.create(
+            course=course, title='Cells', quiz_type='short_answer', created_by=self.teacher
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(StudentUser(self.student, classroom, enrollment))
+        self.url = reverse('answer-list')
+
+    def answer(self, text='Mitochondria'):
+        return self.client.post(self.url, {'quiz_id': self.quiz.id, 'answer_text': text}, format='json')
+
+    def test_answer_is_three_queries(self):
+        with self.assertNumQueries(5):  # quiz, submission, answer + savepoint/release
+            r = self.answer()
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['quiz_title'], 'Cells')
+        self.assertEqual(StudentAnswer.objects.get().answer_data, {'answer_text': 'Mitochondria'})
+
+    def test_existing_submission_is_reused(self):
+        submission = StudentQuizSubmission.objects.create(student=self.student, quiz=self.quiz)
+        self.assertEqual(self.answer().status_code, 201)
+        self.assertEqual(StudentAnswer.objects.get().submission, submission)
+
+    def test_second_answer_is_rejected(self):
+        self.assertEqual(self.answer().status_code, 201)
+        r = self.answer('Ribosome')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json(), {'non_field_errors': ['You have already answered this quiz.']})
+        self.assertEqual(StudentAnswer.objects.count(), 1)
+        self.assertEqual(StudentQuizSubmission.objects.count(), 1)
+
+    def test_rejected_upload_leaves_no_file(self):
+        quiz = Quiz.objects.create(
+            course=self.quiz.course, title='Cell sketch', quiz_type='image_upload', created_by=self.teacher
+        )
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            for name in ('first.png', 'second.png'):
+                r = self.client.post(self.url, {
+                    'quiz_id': quiz.id, 'uploaded_file': SimpleUploadedFile(name, b'\x89PNG', 'image/png'),
+                }, format='multipart')
+            self.assertEqual(r.status_code, 400)
+            self.assertEqual(os.listdir(os.path.join(media, 'student_uploads')), ['first.png'])
+        self.assertEqual(StudentAnswer.objects.count(), 1)
+
+    def test_unknown_quiz_is_rejected(self):
+        r = self.client.post(self.url, {'quiz_id': 999999, 'answer_data': {}}, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(StudentQuizSubmission.objects.exists())
@@ -6,6 +6,9 @@ from .views import (
     StudentQuizSubmissionViewSet,
     StudentAnswerViewSet,
     JoinClassView,
+    StudentAutocompleteView,
+    StudentImportView,
+    StudentExportView,
     StudentQuizListView,
     StudentMultiQuizListView,
     StudentMultiQuizQuestionsView
@@ -19,6 +22,9 @@ router.register('answers', StudentAnswerViewSet, basename='answer')
 
 urlpatterns = [
     path('join/', JoinClassView.as_view(), name='join-class'),
+    path('autocomplete/', StudentAutocompleteView.as_view(), name='student-autocomplete'),
+    path('import/', StudentImportView.as_view(), name='student-import'),
+    path('export/<str:dataset>/', StudentExportView.as_view(), name='student-export'),
     
     # Standalone quizzes
     path('quizzes/', StudentQuizListView.as_view(), name='student-quiz-list'),
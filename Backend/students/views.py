@@ -1,9 +1,21 @@
-from rest_framework import viewsets, permissions, status
+import codecs
+import csv
+
+from rest_framework import viewsets, permissions, serializers, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
+from classes.helpers import ClassCodeCache
 from classes.models import Class
+from quizzes.cache import QuizListCache
+from quizzes.helpers import MultiQuizHelper
 from quizzes.models import Quiz
+from quizzes.views import multi_quiz_response
+from .constants import ExportFormats, student_setting
+from .helpers import AnswerSubmission, RosterImport, StreamingExport, StudentLookup, StudentQuizAccess
 from .models import Student, StudentClassEnrollment, StudentQuizSubmission, StudentAnswer
 from .serializers import (
     StudentSerializer, StudentClassEnrollmentSerializer,
@@ -18,7 +30,7 @@ from .serializers import (
 #     CanViewStudentAnswers, CanCreateStudentAnswer, IsClassActive,
 #     StudentAnswerAccess
 # )
-from .authentication import StudentToken, StudentAuthentication, StudentUser
+from .authentication import StudentToken, StudentUser
 
 
 class StudentViewSet(viewsets.ModelViewSet):
@@ -119,28 +131,36 @@ class StudentAnswerViewSet(viewsets.ModelViewSet):
     # Dynamic: allow unauthenticated read when querying by student_id; otherwise require auth
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_quiz(self):
+        """The quiz named by quiz_id, loaded once per request."""
+        if not hasattr(self, '_quiz'):
+            self._quiz = AnswerSubmission.quiz(self.request.data.get('quiz_id'))
+        return self._quiz
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'create':
+            context['quiz'] = self.get_quiz()
+        return context
+
     def get_serializer_class(self):
         """Return appropriate serializer based on quiz type for creation."""
         if self.action == 'create':
-            quiz_id = self.request.data.get('quiz_id')
-            if quiz_id:
-                try:
-                    quiz = Quiz.objects.get(id=quiz_id)
-                    quiz_type = quiz.quiz_type
-                    
-                    # Return specific serializer based on quiz type
-                    if quiz_type == 'short_answer':
-                        return ShortAnswerSerializer
-                    elif quiz_type == 'word_cloud':
-                        return WordCloudAnswerSerializer
-                    elif quiz_type == 'multiple_choice':
-                        return MultipleChoiceAnswerSerializer
-                    elif quiz_type == 'drawing':
-                        return DrawingAnswerSerializer
-                    elif quiz_type == 'image_upload':
-                        return ImageUploadAnswerSerializer
-                except Quiz.DoesNotExist:
-                    pass
+            quiz = self.get_quiz()
+            if quiz is not None:
+                quiz_type = quiz.quiz_type
+                
+                # Return specific serializer based on quiz type
+                if quiz_type == 'short_answer':
+                    return ShortAnswerSerializer
+                elif quiz_type == 'word_cloud':
+                    return WordCloudAnswerSerializer
+                elif quiz_type == 'multiple_choice':
+                    return MultipleChoiceAnswerSerializer
+                elif quiz_type == 'drawing':
+                    return DrawingAnswerSerializer
+                elif quiz_type == 'image_upload':
+                    return ImageUploadAnswerSerializer
         
         # ALAA_SAJA_TODO: Handle multi-quiz submissions
         # Add logic to handle student answers for multi-quiz:
@@ -184,15 +204,15 @@ class StudentAnswerViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Ensure student can only create answers for their own submissions."""
         if isinstance(self.request.user, StudentUser):
-            quiz_id = self.request.data.get('quiz_id')
-            if quiz_id:
-                # Get or create the submission for this student and quiz
-                submission, created = StudentQuizSubmission.objects.get_or_create(
-                    student=self.request.user.student,
-                    quiz_id=quiz_id,
-                    defaults={'score': None, 'is_late': False}
-                )
-                serializer.save(submission=submission)
+            quiz = self.get_quiz()
+            if quiz is not None:
+                # Insert-first; the unique constraints reject a second answer
+                try:
+                    AnswerSubmission.submit(serializer, self.request.user.student, quiz)
+                except IntegrityError:
+                    raise serializers.ValidationError(
+                        {"non_field_errors": ["You have already answered this quiz."]}
+                    )
             else:
                 # If no quiz_id provided, use the provided submission
                 super().perform_create(serializer)
@@ -206,6 +226,7 @@ class JoinClassView(APIView):
     Allow students to join a class using a class code.
     Only works if the class is active.
     """
+    authentication_classes = []   # a stale token must not block joining
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
@@ -219,48 +240,48 @@ class JoinClassView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Check if class exists and is active
-        classroom = Class.objects.filter(code=class_code, active=True).first()
+        # Check if class exists and is active (cached by code)
+        classroom = ClassCodeCache.get(class_code)
         if not classroom:
             return Response(
                 {"error": "Invalid or inactive class code."},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Create or get the student
-        student, _ = Student.objects.get_or_create(full_name=full_name)
-
-        # Check if already enrolled
-        already_enrolled = StudentClassEnrollment.objects.filter(
-            student=student, classroom=classroom
-        ).exists()
-        if already_enrolled:
+        # Find the student, then write in one short transaction that holds
+        # the write lock only for the inserts. The enrollment is inserted
+        # without an exists() check; the (student, classroom) unique
+        # constraint reports a rejoin.
+        student = StudentLookup.by_name(full_name).order_by("id").first()
+        try:
+            with transaction.atomic():
+                if student is None:
+                    student = Student.objects.create(full_name=full_name)
+                enrollment = StudentClassEnrollment.objects.create(
+                    student=student, classroom_id=classroom["id"]
+                )
+        except IntegrityError:
             return Response(
                 {
                     "message": "You are already enrolled in this class.",
                     "student_id": student.id,
-                    "class_id": classroom.id,
+                    "class_id": classroom["id"],
                 },
                 status=status.HTTP_200_OK,
             )
 
-        # Enroll the student
-        enrollment = StudentClassEnrollment.objects.create(
-            student=student, classroom=classroom
-        )
-
         # Generate authentication token for the student
         token = StudentToken.generate_token(
             student_id=student.id,
-            class_id=classroom.id,
+            class_id=classroom["id"],
             enrollment_id=enrollment.id
         )
 
         return Response(
             {
-                "message": f"Successfully joined class {classroom.course.name} ({classroom.code})",
+                "message": f"Successfully joined class {classroom['course_name']} ({classroom['code']})",
                 "student_id": student.id,
-                "class_id": classroom.id,
+                "class_id": classroom["id"],
                 "enrollment_id": enrollment.id,
                 "access_token": token,
                 "token_type": "Bearer",
@@ -270,6 +291,172 @@ class JoinClassView(APIView):
         )
 
 
+class StudentAutocompleteView(APIView):
+    """
+    Name suggestions for the add-in's AddStudentForm.
+    GET ?q=<prefix>&limit=<n>, matched ignoring case and spacing.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if isinstance(request.user, StudentUser):
+            return Response(
+                {"error": "Teacher authentication required"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        prefix = request.query_params.get("q", "")
+        try:
+            limit = int(request.query_params.get("limit", student_setting("AUTOCOMPLETE_LIMIT")))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, student_setting("AUTOCOMPLETE_MAX_LIMIT")))
+
+        students = StudentLookup.autocomplete(prefix, limit).values("id", "full_name", "email")
+        return Response({"results": list(students)}, status=status.HTTP_200_OK)
+
+
+class StudentImportView(APIView):
+    """
+    Import a roster CSV into one of the teacher's classes.
+    POST multipart: file=<csv with full_name[,email] columns>, class_id=<id>
+    The file is parsed as a stream and written in chunks.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        if isinstance(request.user, StudentUser):
+            return Response(
+                {"error": "Teacher authentication required"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # 1️⃣ Validate input
+        upload = request.FILES.get("file")
+        class_id = request.data.get("class_id")
+        if upload is None or not class_id:
+            return Response(
+                {"error": "Both file and class_id are required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # 2️⃣ Only the class's teacher can import into it
+        classroom = Class.objects.filter(id=class_id, active=True).values("id", "teacher_id").first()
+        if classroom is None:
+            return Response(
+                {"error": "Invalid or inactive class."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if classroom["teacher_id"] != request.user.id:
+            return Response(
+                {"error": "You are not authorized to modify this class."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # 3️⃣ Stream the rows in
+        try:
+            summary = RosterImport(classroom["id"]).run(codecs.iterdecode(upload, "utf-8-sig"))
+        except ValidationError as exc:
+            return Response({"error": exc.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        except (UnicodeDecodeError, csv.Error):
+            return Response(
+                {"error": "The file must be a UTF-8 encoded CSV."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+class StudentExportView(APIView):
+    """
+    Bulk export of a teacher's data, streamed as CSV or JSON lines.
+    GET /api/students/export/<dataset>/?fmt=csv|jsonl plus optional filters.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    # dataset: (model, lookup of the owning teacher, {query param: lookup}, columns)
+    DATASETS = {
+        "enrollments": (
+            StudentClassEnrollment,
+            "classroom__teacher",
+            {"class_id": "classroom_id"},
+            [
+                ("id", "id"),
+                ("student_id", "student_id"),
+                ("student_name", "student__full_name"),
+                ("student_email", "student__email"),
+                ("class_id", "classroom_id"),
+                ("class_code", "classroom__code"),
+                ("joined_at", "joined_at"),
+            ],
+        ),
+        "submissions": (
+            StudentQuizSubmission,
+            "quiz__course__teacher",
+            {"quiz_id": "quiz_id", "course_id": "quiz__course_id"},
+            [
+                ("id", "id"),
+                ("student_id", "student_id"),
+                ("student_name", "student__full_name"),
+                ("quiz_id", "quiz_id"),
+                ("quiz_title", "quiz__title"),
+                ("submitted_at", "submitted_at"),
+                ("score", "score"),
+                ("is_late", "is_late"),
+            ],
+        ),
+        "answers": (
+            StudentAnswer,
+            "submission__quiz__course__teacher",
+            {"quiz_id": "submission__quiz_id", "course_id": "submission__quiz__course_id"},
+            [
+                ("id", "id"),
+                ("submission_id", "submission_id"),
+                ("student_id", "submission__student_id"),
+                ("student_name", "submission__student__full_name"),
+                ("quiz_id", "submission__quiz_id"),
+                ("answer_data", "answer_data"),
+                ("uploaded_file", "uploaded_file"),
+                ("submitted_at", "submitted_at"),
+            ],
+        ),
+    }
+
+    def get(self, request, dataset):
+        if isinstance(request.user, StudentUser):
+            return Response(
+                {"error": "Teacher authentication required"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        if dataset not in self.DATASETS:
+            return Response(
+                {"error": f"dataset must be one of: {', '.join(self.DATASETS)}."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        fmt = request.query_params.get("fmt", ExportFormats.CSV)
+        if fmt not in ExportFormats.ALL:
+            return Response(
+                {"error": f"fmt must be one of: {', '.join(ExportFormats.ALL)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Only rows from the teacher's own classes and courses
+        model, teacher_lookup, filters, columns = self.DATASETS[dataset]
+        rows = model.objects.filter(**{teacher_lookup: request.user})
+        for param, lookup in filters.items():
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            if not value.isdigit():
+                return Response(
+                    {"error": f"{param} must be an integer."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rows = rows.filter(**{lookup: int(value)})
+
+        return StreamingExport.response(rows.order_by("id"), columns, fmt, dataset)
+
+
 class StudentQuizListView(APIView):
     """
     Allow students to view available quizzes in their class.
@@ -288,31 +475,16 @@ class StudentQuizListView(APIView):
         
         classroom = request.user.classroom
         
-        # Get standalone quizzes only (exclude multi-quiz questions)
-        quizzes = Quiz.objects.filter(
-            course=classroom.course,
-            multi_question_id__isnull=True  # Only standalone quizzes
-        ).order_by('-created_at')
-        
-        # Serialize quiz data for students (without sensitive info)
-        quiz_data = []
-        for quiz in quizzes:
-            quiz_data.append({
-                'id': quiz.id,
-                'title': quiz.title,
-                'quiz_type': quiz.quiz_type,
-                'properties': quiz.properties,
-                'created_at': quiz.created_at,
-                'show_timer': quiz.show_timer,
-                'auto_close_after_seconds': quiz.auto_close_after_seconds,
-            })
+        # Standalone quizzes only, shared by every student of the course
+        # (cached; concurrent misses run a single query)
+        course_quizzes = QuizListCache.get(classroom.course_id)
         
         return Response({
-            'quizzes': quiz_data,
+            'quizzes': course_quizzes['quizzes'],
             'class_info': {
                 'id': classroom.id,
                 'code': classroom.code,
-                'course_name': classroom.course.name,
+                'course_name': course_quizzes['course_name'],
                 'active': classroom.active
             }
         })
@@ -323,26 +495,19 @@ class StudentMultiQuizListView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        """List all multi-quiz available to the student"""
+        """
+        List all multi-quiz available to the student, in one query.
+        Same ?limit=&after= keyset pages as the teacher list.
+        """
         # Get student ID from StudentUser
         student_id = request.user.student.id
         
-        # Get all unique multi_question_ids for quizzes in student's enrolled courses
-        multi_quiz_ids = Quiz.objects.filter(
-            multi_question_id__isnull=False,
-            course__classes__enrollments__student_id=student_id
-        ).values_list('multi_question_id', flat=True).distinct()
-        
-        # Build response with quizzes grouped by multi_question_id
-        result = {}
-        for multi_id in multi_quiz_ids:
-            quizzes = Quiz.objects.filter(multi_question_id=multi_id).order_by('question_order')
-            if quizzes.exists():
-                from quizzes.serializers import QuizSerializer
-                quiz_serializer = QuizSerializer(quizzes, many=True)
-                result[str(multi_id)] = quiz_serializer.data
-        
-        return Response(result)
+        # Multi-quiz groups of the student's enrolled courses
+        limit, after = MultiQuizHelper.page_params(request.query_params)
+        groups, next_after = MultiQuizHelper.grouped(
+            StudentQuizAccess.quizzes(student_id), limit=limit, after=after,
+        )
+        return multi_quiz_response(groups, next_after)
 
 
 class StudentMultiQuizQuestionsView(APIView):
@@ -351,18 +516,14 @@ class StudentMultiQuizQuestionsView(APIView):
     
     def get(self, request, multi_question_id):
         """Get all questions in a specific multi-quiz"""
-        # Get student's enrollments
         student_id = request.user.student.id
-        enrollments = StudentClassEnrollment.objects.filter(student_id=student_id)
-        enrolled_courses = [e.classroom.course for e in enrollments]
         
-        # Get questions from this multi-quiz that belong to enrolled courses
-        questions = Quiz.objects.filter(
-            multi_question_id=multi_question_id,
-            course__in=enrolled_courses
-        ).order_by('question_order')
+        # Questions from this multi-quiz that belong to enrolled courses
+        questions = list(StudentQuizAccess.quizzes(
+            student_id, Quiz.objects.filter(multi_question_id=multi_question_id)
+        ).order_by('question_order'))
         
-        if not questions.exists():
+        if not questions:
             return Response(
                 {'detail': 'Multi-quiz not found or not available'}, 
                 status=status.HTTP_404_NOT_FOUND
@@ -387,9 +548,8 @@ class StudentLoginView(APIView):
             return Response({"error": "Both email and full_name are required."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            student = Student.objects.get(email=email, full_name=full_name)
-        except Student.DoesNotExist:
+        student = StudentLookup.by_identity(full_name, email).order_by('id').first()
+        if student is None:
             return Response({"error": "Student not found. Contact your teacher to register."},
                             status=status.HTTP_404_NOT_FOUND)
 